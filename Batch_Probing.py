@@ -0,0 +1,280 @@
+import errno
+import os
+import random
+import select
+import selectors
+import socket
+import struct
+import threading
+import time
+from array import array
+
+
+ICMP_ECHO_REPLY = 0
+ICMP_DESTINATION_UNREACHABLE = 3
+ICMP_ECHO_REQUEST = 8
+ICMP_TIME_EXCEEDED = 11
+_ECHO_HEADER = struct.Struct("!BBHHH")
+
+UDP_OPEN = "open"
+UDP_CLOSED = "closed"
+UDP_NO_REPLY = "open|filtered"
+# A DNS query for the root name servers, and an NTP version 4 client request
+UDP_PAYLOADS = {7: b"network-monitoring",
+                53: b"\x4e\x4d\x00\x00\x00\x01\x00\x00\x00\x00\x00\x00\x00\x00\x02\x00\x01",
+                123: b"\x23" + b"\x00" * 47}
+UDP_PROTOCOLS = {7: "echo", 53: "DNS", 123: "NTP"}
+
+
+def icmp_checksum(data):
+    """
+    Returns the internet checksum of data. The words are summed in the machine's byte order, which gives the
+    checksum in that same byte order (RFC 1071), so it must be packed with the '=H' format.
+    """
+    if len(data) % 2:
+        data += b"\0"
+    total = sum(array("H", data))
+    total = (total >> 16) + (total & 0xffff)
+    total += total >> 16
+    return ~total & 0xffff
+
+
+def build_echo_request(identifier, sequence, payload=b"network-monitoring"):
+    """Returns an ICMP Echo Request packet with the given identifier, sequence number and payload"""
+    header = _ECHO_HEADER.pack(ICMP_ECHO_REQUEST, 0, 0, identifier, sequence)
+    checksum = icmp_checksum(header + payload)
+    return header[:2] + struct.pack("=H", checksum) + header[4:] + payload
+
+
+def new_icmp_identifier():
+    """Returns an ICMP identifier for this process and thread, so concurrent senders can tell replies apart"""
+    return (os.getpid() * 31 + threading.get_ident()) & 0xffff
+
+
+def icmp_echo_batch(addresses, timeout=1, identifier=None, before_send=None):
+    """
+    Send an ICMP Echo Request to every IPv4 address in addresses from one raw socket, without waiting between
+    them, then collect the replies for up to timeout seconds. Returns a list with the round trip time in
+    milliseconds for each address, or None where no reply came. before_send, if given, is called with each
+    address before it is sent to, and stops the batch if it returns False. At most 65536 addresses per batch.
+    """
+    if identifier is None:
+        identifier = new_icmp_identifier()
+    results = [None] * len(addresses)
+    sent_at = [0.0] * len(addresses)
+    pending = {}
+    with socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP) as sock:
+        for index, address in enumerate(addresses):
+            if before_send is not None and not before_send(address):
+                break
+            sequence = index & 0xffff
+            try:
+                sock.sendto(build_echo_request(identifier, sequence), (address, 0))
+            except OSError:
+                continue
+            sent_at[index] = time.perf_counter()
+            pending[(address, sequence)] = index
+        sock.setblocking(False)
+        deadline = time.perf_counter() + timeout
+        while pending:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            readable, _, _ = select.select([sock], [], [], remaining)
+            if not readable:
+                break
+            while True:
+                try:
+                    data, source = sock.recvfrom(2048)
+                except (BlockingIOError, InterruptedError):
+                    break
+                received_at = time.perf_counter()
+                header_length = (data[0] & 0x0f) * 4
+                if len(data) < header_length + _ECHO_HEADER.size:
+                    continue
+                icmp_type, _, _, reply_identifier, sequence = _ECHO_HEADER.unpack_from(data, header_length)
+                if icmp_type != ICMP_ECHO_REPLY or reply_identifier != identifier:
+                    continue
+                index = pending.pop((source[0], sequence), None)
+                if index is not None:
+                    results[index] = (received_at - sent_at[index]) * 1000
+    return results
+
+
+def icmp_trace(address, max_hops=30, timeout=2, identifier=None):
+    """
+    Trace the route to an IPv4 address by sending an ICMP Echo Request for every TTL from 1 to max_hops at once,
+    from one raw socket, then collecting the replies for up to timeout seconds. Time Exceeded and Destination
+    Unreachable replies carry the start of the request that caused them, so its sequence number tells which hop
+    answered. Returns a list with (responding address, round trip time in milliseconds) for each hop up to the
+    first that answered from the destination, or (None, None) for hops that did not answer.
+    """
+    if identifier is None:
+        identifier = new_icmp_identifier()
+    first_sequence = random.randrange(0x10000)
+    sent_at = {}
+    hops = {}
+    destination_ttl = None
+    with socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP) as sock:
+        for ttl in range(1, max_hops + 1):
+            sequence = (first_sequence + ttl) & 0xffff
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_TTL, ttl)
+            sock.sendto(build_echo_request(identifier, sequence), (address, 0))
+            sent_at[sequence] = (ttl, time.perf_counter())
+        sock.setblocking(False)
+        deadline = time.perf_counter() + timeout
+        while True:
+            # Once the destination has answered, only the hops before it are still worth waiting for
+            last_ttl = destination_ttl or max_hops
+            if all(ttl in hops for ttl in range(1, last_ttl + 1)):
+                break
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            readable, _, _ = select.select([sock], [], [], remaining)
+            if not readable:
+                break
+            while True:
+                try:
+                    data, source = sock.recvfrom(2048)
+                except (BlockingIOError, InterruptedError):
+                    break
+                received_at = time.perf_counter()
+                reply = _match_trace_reply(data, identifier)
+                if reply is None or reply[1] not in sent_at:
+                    continue
+                icmp_type, sequence = reply
+                ttl, started = sent_at[sequence]
+                if ttl not in hops:
+                    hops[ttl] = (source[0], (received_at - started) * 1000)
+                if icmp_type != ICMP_TIME_EXCEEDED and (destination_ttl is None or ttl < destination_ttl):
+                    destination_ttl = ttl
+    last_ttl = destination_ttl or max(hops, default=0)
+    return [hops.get(ttl, (None, None)) for ttl in range(1, last_ttl + 1)]
+
+
+def _match_trace_reply(data, identifier):
+    """
+    Returns (ICMP type, sequence number of our request) for an Echo Reply, Time Exceeded or Destination
+    Unreachable packet answering one of our requests with identifier, or None for any other packet.
+    """
+    header_length = (data[0] & 0x0f) * 4
+    if len(data) < header_length + _ECHO_HEADER.size:
+        return None
+    icmp_type, _, _, reply_identifier, sequence = _ECHO_HEADER.unpack_from(data, header_length)
+    if icmp_type == ICMP_ECHO_REPLY:
+        return (icmp_type, sequence) if reply_identifier == identifier else None
+    if icmp_type not in (ICMP_TIME_EXCEEDED, ICMP_DESTINATION_UNREACHABLE):
+        return None
+    # The error carries the IP header of our request, then at least the first 8 bytes of its ICMP header
+    inner_start = header_length + _ECHO_HEADER.size
+    if len(data) < inner_start + 1:
+        return None
+    inner_header_length = (data[inner_start] & 0x0f) * 4
+    if len(data) < inner_start + inner_header_length + _ECHO_HEADER.size:
+        return None
+    inner_type, _, _, inner_identifier, inner_sequence = _ECHO_HEADER.unpack_from(data, inner_start
+                                                                                  + inner_header_length)
+    if inner_type != ICMP_ECHO_REQUEST or inner_identifier != identifier:
+        return None
+    return icmp_type, inner_sequence
+
+
+def tcp_connect_batch(targets, timeout=1, before_send=None):
+    """
+    Start a non-blocking TCP connect to every (IPv4 address, port) in targets at once, and wait up to timeout
+    seconds for them to complete. Returns a list with the connect time in milliseconds for each target that
+    accepted the connection, or None where it was refused or did not answer. before_send, if given, is called
+    with each address before connecting to it, and stops the batch if it returns False.
+    """
+    results = [None] * len(targets)
+    started_at = {}
+    selector = selectors.DefaultSelector()
+    try:
+        for index, (address, port) in enumerate(targets):
+            if before_send is not None and not before_send(address):
+                break
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.setblocking(False)
+            error = sock.connect_ex((address, port))
+            if error not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK):
+                sock.close()
+                continue
+            started_at[index] = time.perf_counter()
+            selector.register(sock, selectors.EVENT_WRITE, index)
+        deadline = time.perf_counter() + timeout
+        while selector.get_map():
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            for key, _ in selector.select(remaining):
+                index = key.data
+                if key.fileobj.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) == 0:
+                    results[index] = (time.perf_counter() - started_at[index]) * 1000
+                selector.unregister(key.fileobj)
+                key.fileobj.close()
+    finally:
+        for key in list(selector.get_map().values()):
+            key.fileobj.close()
+        selector.close()
+    return results
+
+
+def get_udp_payload(port):
+    """Returns the payload that gets a reply from the usual service on port (DNS, NTP or echo), or b'' if none"""
+    return UDP_PAYLOADS.get(port, b"")
+
+
+def udp_probe_batch(targets, timeout=1, payloads=None, before_send=None):
+    """
+    Probe every (address, port) in targets over UDP at once, each from its own connected socket. A connected UDP
+    socket reports an ICMP Port Unreachable reply as ConnectionRefusedError, so closed ports are known after one
+    round trip instead of after the timeout. Each target is sent payloads[i] if given, otherwise the payload
+    from get_udp_payload for its port. Returns a list with (state, milliseconds) for each target, where state is
+    UDP_OPEN (a reply came), UDP_CLOSED (port unreachable) or UDP_NO_REPLY (nothing within timeout seconds, the
+    port is open and ignored the payload, or filtered), and milliseconds is None for UDP_NO_REPLY.
+    """
+    results = [(UDP_NO_REPLY, None)] * len(targets)
+    started_at = {}
+    selector = selectors.DefaultSelector()
+    try:
+        for index, (address, port) in enumerate(targets):
+            if before_send is not None and not before_send(address):
+                break
+            payload = payloads[index] if payloads is not None else get_udp_payload(port)
+            sock = socket.socket(socket.AF_INET6 if ":" in address else socket.AF_INET, socket.SOCK_DGRAM)
+            sock.setblocking(False)
+            started_at[index] = time.perf_counter()
+            try:
+                sock.connect((address, port))
+                sock.send(payload)
+            except ConnectionRefusedError:
+                results[index] = (UDP_CLOSED, (time.perf_counter() - started_at[index]) * 1000)
+                sock.close()
+                continue
+            except OSError:
+                sock.close()
+                continue
+            selector.register(sock, selectors.EVENT_READ, index)
+        deadline = time.perf_counter() + timeout
+        while selector.get_map():
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            for key, _ in selector.select(remaining):
+                index = key.data
+                elapsed = (time.perf_counter() - started_at[index]) * 1000
+                try:
+                    key.fileobj.recv(2048)
+                    results[index] = (UDP_OPEN, elapsed)
+                except ConnectionRefusedError:
+                    results[index] = (UDP_CLOSED, elapsed)
+                except OSError:
+                    pass
+                selector.unregister(key.fileobj)
+                key.fileobj.close()
+    finally:
+        for key in list(selector.get_map().values()):
+            key.fileobj.close()
+        selector.close()
+    return results
@@ -0,0 +1,184 @@
+import collections
+import selectors
+import socket
+import statistics
+import time
+import dns.exception
+import dns.flags
+import dns.message
+import dns.query
+import dns.rcode
+import dns.rdatatype
+
+
+DNS_PORT = 53
+RESOLVER_WINDOW = 20
+
+
+class ResolverAnswer:
+    """The reply of one resolver to a query: how long it took, its rcode and the records it answered with"""
+    def __init__(self, resolver, response_time=None, rcode=None, answers=(), used_tcp=False, error=None):
+        """Create an instance of ResolverAnswer with given parameters. Times are in milliseconds."""
+        self._resolver = resolver
+        self._response_time = response_time
+        self._rcode = rcode
+        self._answers = tuple(sorted(answers))
+        self._used_tcp = used_tcp
+        self._error = error
+
+    def get_resolver(self):
+        """Returns the address of the resolver"""
+        return self._resolver
+
+    def get_response_time(self):
+        """Returns the time from sending the query to the reply, in milliseconds, or None if there was no reply"""
+        return self._response_time
+
+    def get_rcode(self):
+        """Returns the rcode of the reply as text, such as 'NOERROR' or 'NXDOMAIN', or None if there was no reply"""
+        return self._rcode
+
+    def get_answers(self):
+        """Returns the records of the answer section as sorted text"""
+        return self._answers
+
+    def is_tcp(self):
+        """Returns True if the UDP reply was truncated and the answer was fetched again over TCP"""
+        return self._used_tcp
+
+    def get_error(self):
+        """Returns why there was no reply, or None"""
+        return self._error
+
+    def is_answered(self):
+        """Returns True if the resolver replied with NOERROR"""
+        return self._rcode == "NOERROR"
+
+
+def _read_answer(resolver, response, elapsed, used_tcp):
+    """Returns the ResolverAnswer for a reply"""
+    records = [str(rdata) for rrset in response.answer for rdata in rrset]
+    return ResolverAnswer(resolver, elapsed, dns.rcode.to_text(response.rcode()), records, used_tcp)
+
+
+def query_resolvers(resolvers, query, record_type="A", timeout=3, port=DNS_PORT):
+    """
+    Send the same query to every resolver in resolvers, a list of (family, address) pairs, all at once over UDP
+    to port, and wait up to timeout seconds for the replies. A resolver whose reply is truncated is asked again
+    over TCP, and its time includes both. Returns a ResolverAnswer for each resolver, in the order given.
+    """
+    message = dns.message.make_query(query, dns.rdatatype.from_text(record_type))
+    wire = message.to_wire()
+    results = [ResolverAnswer(address, error=f"no reply within {timeout} seconds") for _, address in resolvers]
+    truncated = []
+    selector = selectors.DefaultSelector()
+    start = time.perf_counter()
+    deadline = start + timeout
+    try:
+        for index, (family, address) in enumerate(resolvers):
+            sock = socket.socket(family, socket.SOCK_DGRAM)
+            sock.setblocking(False)
+            try:
+                sock.connect((address, port))
+                sock.send(wire)
+            except OSError as e:
+                results[index] = ResolverAnswer(address, error=str(e))
+                sock.close()
+                continue
+            selector.register(sock, selectors.EVENT_READ, (index, address, time.perf_counter()))
+
+        while selector.get_map():
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            for key, _ in selector.select(remaining):
+                index, address, sent_at = key.data
+                try:
+                    data = key.fileobj.recv(65535)
+                except BlockingIOError:
+                    continue
+                except OSError as e:
+                    # A socket that errors, such as with an ICMP error, would otherwise wake the loop until the deadline
+                    error = "port unreachable" if isinstance(e, ConnectionRefusedError) else str(e)
+                    results[index] = ResolverAnswer(address, error=error)
+                    selector.unregister(key.fileobj)
+                    key.fileobj.close()
+                    continue
+                elapsed = (time.perf_counter() - sent_at) * 1000
+                try:
+                    response = dns.message.from_wire(data, ignore_trailing=True)
+                except dns.exception.DNSException:
+                    continue
+                if not message.is_response(response):
+                    continue
+                selector.unregister(key.fileobj)
+                key.fileobj.close()
+                if response.flags & dns.flags.TC:
+                    truncated.append((index, address, sent_at))
+                else:
+                    results[index] = _read_answer(address, response, elapsed, False)
+    finally:
+        for key in list(selector.get_map().values()):
+            key.fileobj.close()
+        selector.close()
+
+    for index, address, sent_at in truncated:
+        try:
+            response = dns.query.tcp(message, address, timeout=max(0.1, deadline - time.perf_counter()), port=port)
+        except (OSError, dns.exception.DNSException) as e:
+            results[index] = ResolverAnswer(address, used_tcp=True, error=f"truncated, and TCP failed: {e}")
+            continue
+        results[index] = _read_answer(address, response, (time.perf_counter() - sent_at) * 1000, True)
+    return results
+
+
+def answers_agree(answers):
+    """Returns True if every resolver that answered NOERROR answered with the same records"""
+    return len({answer.get_answers() for answer in answers if answer.is_answered()}) <= 1
+
+
+class ResolverWindow:
+    """
+    The response times of a set of resolvers over their last window checks, so the resolvers can be compared on
+    how they performed over time rather than on a single query. A check a resolver did not answer counts as lost.
+    """
+    def __init__(self, window=RESOLVER_WINDOW):
+        """Create an empty window of the given number of checks"""
+        self._window = window
+        self._times = {}
+
+    def record(self, answers):
+        """Add the ResolverAnswers of one check"""
+        for answer in answers:
+            times = self._times.get(answer.get_resolver())
+            if times is None:
+                times = self._times[answer.get_resolver()] = collections.deque(maxlen=self._window)
+            times.append(answer.get_response_time() if answer.is_answered() else None)
+
+    def get_median(self, resolver):
+        """Returns the median response time of resolver over the window, in milliseconds, or None"""
+        times = [elapsed for elapsed in self._times.get(resolver, ()) if elapsed is not None]
+        return statistics.median(times) if times else None
+
+    def get_loss(self, resolver):
+        """Returns the fraction of checks in the window that resolver did not answer"""
+        times = self._times.get(resolver, ())
+        return sum(elapsed is None for elapsed in times) / len(times) if times else 0.0
+
+    def get_check_count(self, resolver):
+        """Returns the number of checks of resolver in the window"""
+        return len(self._times.get(resolver, ()))
+
+    def get_fastest(self):
+        """
+        Returns (resolver, median response time) for the resolver with the lowest median over the window, among
+        those that lost no more checks than the best of them, or None if no resolver has answered
+        """
+        medians = {resolver: self.get_median(resolver) for resolver in self._times}
+        answered = [resolver for resolver, median in medians.items() if median is not None]
+        if not answered:
+            return None
+        least_loss = min(self.get_loss(resolver) for resolver in answered)
+        fastest = min((resolver for resolver in answered if self.get_loss(resolver) == least_loss),
+                      key=lambda resolver: medians[resolver])
+        return fastest, medians[fastest]
@@ -0,0 +1,125 @@
+import errno
+import selectors
+import socket
+import time
+
+
+HAPPY_EYEBALLS_DELAY = 0.25
+
+
+def get_family_name(family):
+    """Returns 'IPv6' or 'IPv4' for an address family"""
+    return "IPv6" if family == socket.AF_INET6 else "IPv4"
+
+
+def get_address_family(address):
+    """Returns the address family of an ip address string"""
+    return socket.AF_INET6 if ":" in address else socket.AF_INET
+
+
+def interleave_addresses(addresses):
+    """
+    Order (family, address) pairs for connection attempts as RFC 8305 describes: IPv6 first, then alternating
+    between the families, keeping the order of the addresses within each family.
+    """
+    ipv6 = [address for address in addresses if address[0] == socket.AF_INET6]
+    ipv4 = [address for address in addresses if address[0] != socket.AF_INET6]
+    ordered = []
+    for index in range(max(len(ipv6), len(ipv4))):
+        ordered.extend(family[index] for family in (ipv6, ipv4) if index < len(family))
+    return ordered
+
+
+class RacedConnection:
+    """The connection that won a Happy Eyeballs race: its socket, address and how long connecting took"""
+    def __init__(self, sock, family, address, connect_time, attempts):
+        """Create an instance of RacedConnection with given parameters. Times are in milliseconds."""
+        self._sock = sock
+        self._family = family
+        self._address = address
+        self._connect_time = connect_time
+        self._attempts = attempts
+
+    def get_socket(self):
+        """Returns the connected socket, in blocking mode with the timeout the race was given"""
+        return self._sock
+
+    def get_family(self):
+        """Returns the address family of the connection"""
+        return self._family
+
+    def get_family_name(self):
+        """Returns 'IPv6' or 'IPv4'"""
+        return get_family_name(self._family)
+
+    def get_address(self):
+        """Returns the address that was connected to"""
+        return self._address
+
+    def get_connect_time(self):
+        """Returns the time from the first connection attempt to the winning connection, in milliseconds"""
+        return self._connect_time
+
+    def get_attempts(self):
+        """Returns the number of connection attempts that were started"""
+        return self._attempts
+
+
+def race_connect(addresses, port, timeout=3, delay=HAPPY_EYEBALLS_DELAY):
+    """
+    Connect to port on the first of addresses that accepts, as RFC 8305 (Happy Eyeballs) describes. addresses
+    is a list of (family, address) pairs, which are tried in interleave_addresses order. A new attempt starts
+    every delay seconds, or at once when an attempt fails, while earlier attempts keep going, and the first to
+    connect wins. Returns a RacedConnection. Raises socket.timeout if nothing connected within timeout seconds,
+    or the last error if every attempt failed.
+    """
+    pending = interleave_addresses(addresses)
+    if not pending:
+        raise socket.gaierror("No addresses to connect to")
+    selector = selectors.DefaultSelector()
+    start = time.perf_counter()
+    deadline = start + timeout
+    next_attempt = start
+    attempts = 0
+    last_error = None
+    try:
+        while True:
+            now = time.perf_counter()
+            if pending and (now >= next_attempt or not selector.get_map()):
+                family, address = pending.pop(0)
+                attempts += 1
+                sock = socket.socket(family, socket.SOCK_STREAM)
+                sock.setblocking(False)
+                error = sock.connect_ex((address, port))
+                if error in (0, errno.EINPROGRESS, errno.EWOULDBLOCK):
+                    selector.register(sock, selectors.EVENT_WRITE, (family, address))
+                else:
+                    last_error = OSError(error, errno.errorcode.get(error, "connect failed"))
+                    sock.close()
+                next_attempt = time.perf_counter() + delay
+                continue
+            if not selector.get_map():
+                raise last_error or OSError("Could not connect")
+            if now >= deadline:
+                raise socket.timeout(f"Could not connect within {timeout} seconds")
+            wait = deadline - now
+            if pending:
+                wait = min(wait, next_attempt - now)
+            for key, _ in selector.select(max(0.0, wait)):
+                sock = key.fileobj
+                selector.unregister(sock)
+                error = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                if error == 0:
+                    connect_time = (time.perf_counter() - start) * 1000
+                    sock.setblocking(True)
+                    sock.settimeout(timeout)
+                    family, address = key.data
+                    return RacedConnection(sock, family, address, connect_time, attempts)
+                last_error = OSError(error, errno.errorcode.get(error, "connect failed"))
+                sock.close()
+                # A failed attempt lets the next one start right away
+                next_attempt = time.perf_counter()
+    finally:
+        for key in list(selector.get_map().values()):
+            key.fileobj.close()
+        selector.close()
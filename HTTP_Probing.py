@@ -0,0 +1,217 @@
+import hashlib
+import http.client
+import select
+import socket
+import ssl
+import time
+from urllib.parse import urlsplit
+from TLS_Probing import get_tls_context
+from Dual_Stack import race_connect, get_family_name, get_address_family
+
+
+DEFAULT_MAX_BODY_BYTES = 65536
+_READ_CHUNK_BYTES = 16384
+
+
+class HTTPProbeError(Exception):
+    """Raised by timed_http_request when a phase of the request fails. The phase is 'connect', 'tls',
+    'first_byte' or 'body'."""
+    def __init__(self, phase, error):
+        """Create an HTTPProbeError for the phase that failed, with the error it failed with"""
+        super().__init__(f"{phase} failed: {error}")
+        self._phase = phase
+        self._error = error
+
+    def get_phase(self):
+        """Returns the phase of the request that failed"""
+        return self._phase
+
+    def get_error(self):
+        """Returns the error the phase failed with"""
+        return self._error
+
+    def is_timeout(self):
+        """Returns True if the phase failed because it timed out"""
+        return isinstance(self._error, (socket.timeout, TimeoutError))
+
+
+class TimedHTTPResponse:
+    """The status, headers and (at most max_body_bytes of) body of a response, with the time each phase took"""
+    def __init__(self, status, reason, headers, body, truncated, timings, family=socket.AF_INET):
+        """Create an instance of TimedHTTPResponse with given parameters"""
+        self._family = family
+        self._status = status
+        self._reason = reason
+        self._headers = headers
+        self._body = body
+        self._truncated = truncated
+        self._timings = timings
+
+    def get_status(self):
+        """Returns the response status code"""
+        return self._status
+
+    def get_reason(self):
+        """Returns the reason phrase that came with the status code"""
+        return self._reason
+
+    def get_header(self, name, default=None):
+        """Returns the value of a response header"""
+        return self._headers.get(name, default)
+
+    def get_body(self):
+        """Returns the part of the body that was read"""
+        return self._body
+
+    def is_truncated(self):
+        """Returns True if the body was longer than the read limit, and only the start of it was read"""
+        return self._truncated
+
+    def get_family_name(self):
+        """Returns 'IPv6' or 'IPv4', the address family the request was made over"""
+        return get_family_name(self._family)
+
+    def get_timings(self):
+        """
+        Returns the time, in milliseconds, of each phase: 'connect' (TCP handshake), 'tls' (TLS handshake, HTTPS
+        only), 'first_byte' (from sending the request to the first byte of the response) and 'body' (reading it)
+        """
+        return self._timings
+
+
+class ContentCache:
+    """
+    ContentCache remembers, for each url, the ETag and Last-Modified validators the server last sent and a hash
+    of the body. It turns a content check into a conditional request: a 304 Not Modified response means the page
+    is unchanged, and the body is only hashed and compared when the server sends it again.
+    """
+    def __init__(self):
+        """Create an empty cache"""
+        self._entries = {}
+
+    def get_conditional_headers(self, url):
+        """Returns the If-None-Match and If-Modified-Since headers to send for url, if its validators are known"""
+        entry = self._entries.get(url)
+        headers = {}
+        if entry is not None:
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def update(self, url, response):
+        """
+        Record the response to a conditional request for url. Returns 'unchanged' for a 304 response, and for a
+        200 response 'new' the first time the url is seen, then 'changed' or 'unchanged' by comparing body hashes.
+        Returns None for other status codes, which say nothing about the content.
+        """
+        entry = self._entries.get(url)
+        if response.get_status() == 304 and entry is not None:
+            return "unchanged"
+        if response.get_status() != 200:
+            return None
+        digest = hashlib.sha256(response.get_body()).hexdigest()
+        self._entries[url] = {"etag": response.get_header("ETag"),
+                              "last_modified": response.get_header("Last-Modified"), "digest": digest}
+        if entry is None:
+            return "new"
+        return "unchanged" if entry["digest"] == digest else "changed"
+
+
+def content_status_text(content_status, response):
+    """Returns the line describing a content check, to add to the result of an HTTP or HTTPS check"""
+    if content_status is None:
+        return ""
+    if response.get_status() == 304:
+        return "\nContent unchanged (304 Not Modified)."
+    truncated = f" (first {len(response.get_body())} bytes)" if response.is_truncated() else ""
+    if content_status == "new":
+        return f"\nContent recorded{truncated}."
+    if content_status == "changed":
+        return f"\nCONTENT CHANGED{truncated}."
+    return f"\nContent unchanged{truncated}."
+
+
+def timed_http_request(url, addresses, headers=None, timeout=5, max_body_bytes=DEFAULT_MAX_BODY_BYTES,
+                       tls_context=None):
+    """
+    Send a GET request for url to already resolved addresses, timing every phase with a high resolution clock.
+    addresses is a list of (family, address) pairs, or a single address. When there are IPv6 and IPv4 addresses
+    they are raced with race_connect, and the request goes to whichever connects first. Each phase (connect,
+    TLS handshake, first byte, and reading the body) may take at most timeout seconds, and no more than
+    max_body_bytes of the body are read, so a misbehaving server can never hold the caller for long. Raises
+    HTTPProbeError naming the phase that failed.
+    """
+    parts = urlsplit(url)
+    is_https = parts.scheme == "https"
+    host = parts.hostname
+    port = parts.port or (443 if is_https else 80)
+    path = parts.path or "/"
+    if parts.query:
+        path += "?" + parts.query
+    request_headers = {"Host": parts.netloc.rsplit("@", 1)[-1], "User-Agent": "Mozilla/5.0", "Accept": "*/*",
+                       "Connection": "close"}
+    if headers:
+        request_headers.update(headers)
+    timings = {}
+
+    phase = "connect"
+    start = time.perf_counter()
+    if isinstance(addresses, str):
+        addresses = [(get_address_family(addresses), addresses)]
+    try:
+        raced = race_connect(addresses, port, timeout)
+    except OSError as e:
+        raise HTTPProbeError(phase, e)
+    sock = raced.get_socket()
+    timings["connect"] = (time.perf_counter() - start) * 1000
+    connection = None
+    response = None
+    try:
+        if is_https:
+            phase = "tls"
+            start = time.perf_counter()
+            context = tls_context if tls_context is not None else get_tls_context()
+            sock = context.wrap_socket(sock, server_hostname=host)
+            timings["tls"] = (time.perf_counter() - start) * 1000
+
+        phase = "first_byte"
+        connection = http.client.HTTPConnection(host, port, timeout=timeout)
+        connection.sock = sock
+        start = time.perf_counter()
+        connection.request("GET", path, headers=request_headers)
+        if not (isinstance(sock, ssl.SSLSocket) and sock.pending()):
+            readable, _, _ = select.select([sock], [], [], timeout)
+            if not readable:
+                raise socket.timeout("no response from server")
+        timings["first_byte"] = (time.perf_counter() - start) * 1000
+        response = connection.getresponse()
+
+        phase = "body"
+        start = time.perf_counter()
+        body = bytearray()
+        truncated = False
+        while True:
+            chunk = response.read(min(_READ_CHUNK_BYTES, max_body_bytes - len(body) + 1))
+            if not chunk:
+                break
+            body += chunk
+            if time.perf_counter() - start > timeout:
+                raise socket.timeout("reading the body took longer than the timeout")
+            if len(body) > max_body_bytes:
+                del body[max_body_bytes:]
+                truncated = True
+                break
+        timings["body"] = (time.perf_counter() - start) * 1000
+        return TimedHTTPResponse(response.status, response.reason, response.headers, bytes(body), truncated,
+                                 timings, raced.get_family())
+    except (OSError, ssl.SSLError, http.client.HTTPException) as e:
+        raise HTTPProbeError(phase, e)
+    finally:
+        if response is not None:
+            response.close()
+        if connection is not None:
+            connection.close()
+        else:
+            sock.close()
@@ -0,0 +1,314 @@
+import heapq
+import random
+import socket
+import struct
+import threading
+import time
+from array import array
+from Monitoring_Configuration import MonitoringConfiguration
+from Batch_Probing import icmp_echo_batch, tcp_connect_batch
+from Probe_Scheduling import get_probe_rate_limiter
+from Monitoring_Stats import get_runtime_stats
+
+
+STATUS_UNKNOWN = -1
+STATUS_DOWN = 0
+STATUS_UP = 1
+
+
+class MonitorTable(MonitoringConfiguration):
+    """
+    MonitorTable is a child class of MonitoringConfiguration that monitors a very large set of lightweight ICMP or
+    TCP targets with a single thread. Instead of one object and thread per target, targets are stored column by
+    column in typed arrays (address, port, interval, next due time, last status and last latency), about 27
+    bytes per target. Due targets are collected from a timing wheel and probed in batches by icmp_echo_batch or
+    tcp_connect_batch. Only changes of status are reported.
+    """
+    def __init__(self, name, service, time_in_seconds, timeout=1, batch_size=256, tick=0.1):
+        """
+        Initialize an empty table for the given service ('ICMP' or 'TCP'). New targets are checked every
+        time_in_seconds seconds unless given their own interval, and each batch of at most batch_size targets
+        waits up to timeout seconds for replies. Due times are grouped into buckets of tick seconds.
+        """
+        super().__init__(name, time_in_seconds)
+        self._table_service = service.upper()
+        self._service = f"{self._table_service} table"
+        self._timeout = timeout
+        self._batch_size = batch_size
+        self._tick = tick
+        self._addresses = array("I")
+        self._ports = array("H")
+        self._intervals = array("f")
+        self._next_due = array("d")
+        self._status = array("b")
+        self._latency = array("f")
+        self._free_slots = array("I")
+        self._target_count = 0
+        self._wheel = {}
+        self._wheel_ticks = []
+        self._clock = time.monotonic
+        self._batch_function = None
+        self._lock = threading.Lock()
+
+    def __str__(self):
+        """Specify how this class should be printed to the CLI"""
+        return f"Service: {self._service}\nMonitoring: {self._target_count} targets in {self._name} at a time " \
+               f"interval of {self._time_interval} seconds."
+
+    def get_spec(self):
+        """
+        Returns the spec of the parent class, with the table's own arguments and every target as
+        [address, port, interval]. MonitorTable.from_spec builds the table again from it.
+        """
+        spec = super().get_spec()
+        spec["targets"] = [[address, port, interval] for address, port, interval, _, _ in self.iter_targets()]
+        return spec
+
+    def _spec_args(self):
+        """Returns the arguments the class was constructed with, in constructor order"""
+        return self._name, self._table_service, self._time_interval, self._timeout, self._batch_size, self._tick
+
+    @classmethod
+    def from_spec(cls, spec):
+        """Build an inactive table, with its targets, from a spec returned by get_spec"""
+        table = cls(*spec["args"])
+        table.set_start_jitter(spec.get("start_jitter", 1.0))
+        for address, port, interval in spec.get("targets", ()):
+            table.add_target(address, port, interval)
+        return table
+
+    def reports_changes_only(self):
+        """Returns True, as a table only reports targets whose status changed"""
+        return True
+
+    def get_target_host(self):
+        """Returns the name of the table, which stands in for a host since the table has many"""
+        return self._name
+
+    def get_table_service(self):
+        """Returns the service the targets are checked with, 'ICMP' or 'TCP'"""
+        return self._table_service
+
+    def get_target_count(self):
+        """Returns the number of targets in the table"""
+        return self._target_count
+
+    def set_clock(self, clock):
+        """
+        Use clock, a function returning seconds such as time.monotonic, for due times from now on. Targets
+        already in the table keep the time left until they are due.
+        """
+        with self._lock:
+            offset = clock() - self._clock()
+            self._clock = clock
+            self._wheel = {}
+            self._wheel_ticks = []
+            free_slots = set(self._free_slots)
+            for slot in range(len(self._next_due)):
+                if slot not in free_slots:
+                    self._next_due[slot] += offset
+                    self._schedule(slot, self._next_due[slot])
+
+    def stagger(self, random_source=random):
+        """
+        Spread the next checks of every target over its first interval from now again, drawing the points from
+        random_source, which may be a seeded random.Random to repeat the same schedule
+        """
+        with self._lock:
+            now = self._clock()
+            self._wheel = {}
+            self._wheel_ticks = []
+            free_slots = set(self._free_slots)
+            for slot in range(len(self._next_due)):
+                if slot not in free_slots:
+                    self._next_due[slot] = now + random_source.uniform(0, self._intervals[slot] * self._start_jitter)
+                    self._schedule(slot, self._next_due[slot])
+
+    def set_batch_function(self, batch_function):
+        """
+        Probe targets with batch_function instead of icmp_echo_batch or tcp_connect_batch. It is called with the
+        targets of a batch (addresses for ICMP, (address, port) pairs for TCP) and the timeout, and returns the
+        latency of each in milliseconds, or None. Passing None goes back to probing the network.
+        """
+        self._batch_function = batch_function
+
+    def get_status_counts(self):
+        """Returns the number of targets that are up, down, and not yet checked"""
+        with self._lock:
+            counts = {STATUS_UP: 0, STATUS_DOWN: 0, STATUS_UNKNOWN: 0}
+            for slot in range(len(self._status)):
+                if self._intervals[slot] > 0:
+                    counts[self._status[slot]] += 1
+        return counts[STATUS_UP], counts[STATUS_DOWN], counts[STATUS_UNKNOWN]
+
+    def add_target(self, address, port=0, interval=None):
+        """
+        Add a target by IPv4 address (and port, for TCP tables). Its first check happens at a random point in its
+        first interval, so targets added together are spread out. Returns the slot the target is stored in.
+        """
+        packed_address = struct.unpack("!I", socket.inet_aton(address))[0]
+        interval = interval or self._time_interval
+        due = self._clock() + random.uniform(0, interval * self._start_jitter)
+        with self._lock:
+            if self._free_slots:
+                slot = self._free_slots.pop()
+                self._addresses[slot] = packed_address
+                self._ports[slot] = port
+                self._intervals[slot] = interval
+                self._next_due[slot] = due
+                self._status[slot] = STATUS_UNKNOWN
+                self._latency[slot] = 0
+            else:
+                slot = len(self._addresses)
+                self._addresses.append(packed_address)
+                self._ports.append(port)
+                self._intervals.append(interval)
+                self._next_due.append(due)
+                self._status.append(STATUS_UNKNOWN)
+                self._latency.append(0)
+            self._target_count += 1
+            self._schedule(slot, due)
+        return slot
+
+    def remove_target(self, address, port=0):
+        """Remove the target with the given address and port. Returns True if it was in the table."""
+        packed_address = struct.unpack("!I", socket.inet_aton(address))[0]
+        with self._lock:
+            for slot in range(len(self._addresses)):
+                if self._addresses[slot] == packed_address and self._ports[slot] == port and self._intervals[slot] > 0:
+                    # The slot is freed once the timing wheel gets to it, so it is never scheduled twice
+                    self._intervals[slot] = 0
+                    self._target_count -= 1
+                    return True
+        return False
+
+    def get_target(self, slot):
+        """Returns (address, port, interval, status, latency in milliseconds) of the target in the given slot"""
+        with self._lock:
+            address = socket.inet_ntoa(struct.pack("!I", self._addresses[slot]))
+            return address, self._ports[slot], self._intervals[slot], self._status[slot], self._latency[slot]
+
+    def iter_targets(self):
+        """Yields (address, port, interval, status, latency) for every target in the table"""
+        for slot in range(len(self._addresses)):
+            if self._intervals[slot] > 0:
+                yield self.get_target(slot)
+
+    def _schedule(self, slot, due):
+        """Put a slot in the timing wheel bucket for its due time. Called with the lock held."""
+        bucket_tick = int(due / self._tick)
+        bucket = self._wheel.get(bucket_tick)
+        if bucket is None:
+            bucket = array("I")
+            self._wheel[bucket_tick] = bucket
+            heapq.heappush(self._wheel_ticks, bucket_tick)
+        bucket.append(slot)
+
+    def _pop_due(self, now):
+        """Returns the slots of every target that is due, freeing the slots of removed targets"""
+        now_tick = int(now / self._tick)
+        due = array("I")
+        with self._lock:
+            while self._wheel_ticks and self._wheel_ticks[0] <= now_tick:
+                for slot in self._wheel.pop(heapq.heappop(self._wheel_ticks)):
+                    if self._intervals[slot] > 0:
+                        due.append(slot)
+                    else:
+                        self._free_slots.append(slot)
+        return due
+
+    def get_next_due(self):
+        """Returns the time, on the table's clock, the next bucket of the timing wheel is due, or None if empty"""
+        with self._lock:
+            return self._wheel_ticks[0] * self._tick if self._wheel_ticks else None
+
+    def _time_until_next_due(self, now):
+        """Returns the seconds until the next bucket of the timing wheel is due"""
+        with self._lock:
+            if not self._wheel_ticks:
+                return self._tick * 10
+            return max(0.0, self._wheel_ticks[0] * self._tick - now)
+
+    def monitor(self):
+        """
+        The monitor method of a table runs the scheduler. It probes every due target in batches, reschedules them,
+        and hands changes of status to handle_result. It runs on one thread however many targets there are.
+        """
+        while not self._stop_event.is_set():
+            self.run_due(self._clock())
+            self._stop_event.wait(min(self._time_until_next_due(self._clock()), self._tick * 10))
+        return None
+
+    def run_due(self, now):
+        """
+        Probe every target due at now, in batches, and hand changes of status to handle_result. Returns the number
+        of targets probed.
+        """
+        due = self._pop_due(now)
+        probed = 0
+        for start in range(0, len(due), self._batch_size):
+            if self._stop_event.is_set():
+                break
+            batch = due[start:start + self._batch_size]
+            changes = self._probe_batch(batch)
+            probed += len(batch)
+            if changes:
+                self.handle_result(self._describe_changes(changes))
+        return probed
+
+    def _probe_batch(self, slots):
+        """
+        Probe the targets in slots, record their results, and return the (slot, new status) of changed ones. When
+        the table is stopping, the targets are only rescheduled, so a shutdown never reports them DOWN.
+        """
+        with self._lock:
+            addresses = [socket.inet_ntoa(struct.pack("!I", self._addresses[slot])) for slot in slots]
+            ports = [self._ports[slot] for slot in slots]
+        limiter = get_probe_rate_limiter()
+        before_send = None
+        if limiter is not None:
+            before_send = lambda address: limiter.acquire(address, self._stop_event)
+        start = time.perf_counter()
+        if self._batch_function is not None:
+            targets = addresses if self._table_service == "ICMP" else list(zip(addresses, ports))
+            latencies = self._batch_function(targets, self._timeout)
+        elif self._table_service == "ICMP":
+            latencies = icmp_echo_batch(addresses, self._timeout, before_send=before_send)
+        else:
+            latencies = tcp_connect_batch(list(zip(addresses, ports)), self._timeout, before_send=before_send)
+        self._metrics = {"batch": (time.perf_counter() - start) * 1000}
+        get_runtime_stats().record_probe(self._service, self._metrics["batch"], len(slots))
+        now = self._clock()
+        changes = []
+        # A batch cut short because the table is stopping left targets unsent, and their None is no answer
+        stopping = self._stop_event.is_set()
+        with self._lock:
+            for slot, latency in zip(slots, latencies):
+                if not stopping:
+                    status = STATUS_DOWN if latency is None else STATUS_UP
+                    if self._status[slot] != STATUS_UNKNOWN and self._status[slot] != status:
+                        changes.append((slot, status))
+                    self._status[slot] = status
+                    self._latency[slot] = latency or 0
+                if self._intervals[slot] > 0:
+                    self._next_due[slot] = now + self._intervals[slot]
+                    self._schedule(slot, self._next_due[slot])
+                else:
+                    self._free_slots.append(slot)
+        if not stopping:
+            self._is_up = all(latency is not None for latency in latencies)
+        return changes
+
+    def _describe_changes(self, changes):
+        """Returns the text reporting targets that went down or came back up"""
+        lines = []
+        for slot, status in changes:
+            address, port, _, _, latency = self.get_target(slot)
+            target = f"{address}:{port}" if self._table_service == "TCP" else address
+            if status == STATUS_UP:
+                lines.append(f"{target} is back up ({latency:.2f}ms)")
+            else:
+                lines.append(f"{target} went DOWN")
+        up, down, unknown = self.get_status_counts()
+        lines.append(f"{up} targets up, {down} down, {unknown} not yet checked")
+        return "\n".join(lines)
@@ -0,0 +1,438 @@
+import collections
+import json
+import selectors
+import socket
+import struct
+import threading
+import time
+from Monitoring_Configuration import monitor_from_spec
+from Monitor_Table import MonitorTable
+from Monitoring_Workers import pack_result, unpack_results
+
+
+# Every frame is a kind and the length of its payload, followed by the payload. HELLO, MONITOR and REMOVE carry
+# JSON, RESULTS carries records packed by pack_result.
+FRAME_HEADER = struct.Struct("!BI")
+FRAME_HELLO = 1
+FRAME_MONITOR = 2
+FRAME_REMOVE = 3
+FRAME_RESULTS = 4
+MAX_FRAME_BYTES = 16 * 1024 * 1024
+DEFAULT_COLLECTOR_PORT = 7017
+_SPEC_BUILDERS = {"MonitorTable": MonitorTable.from_spec}
+
+
+def pack_frame(kind, payload):
+    """Returns a frame of the given kind carrying payload, bytes or a JSON-able object"""
+    if not isinstance(payload, bytes):
+        payload = json.dumps(payload).encode()
+    return FRAME_HEADER.pack(kind, len(payload)) + payload
+
+
+def unpack_frames(buffer):
+    """
+    Yields (kind, payload) for every complete frame at the start of buffer, a bytearray, and removes them from
+    it, leaving any partial frame behind. Raises ValueError for a frame larger than MAX_FRAME_BYTES.
+    """
+    offset = 0
+    while len(buffer) - offset >= FRAME_HEADER.size:
+        kind, length = FRAME_HEADER.unpack_from(buffer, offset)
+        if length > MAX_FRAME_BYTES:
+            raise ValueError(f"A frame of {length} bytes is too large")
+        end = offset + FRAME_HEADER.size + length
+        if end > len(buffer):
+            break
+        yield kind, bytes(buffer[offset + FRAME_HEADER.size:end])
+        offset = end
+    del buffer[:offset]
+
+
+def parse_address(text, default_host="127.0.0.1", default_port=DEFAULT_COLLECTOR_PORT):
+    """Split 'host:port', 'host' or 'port' into (host, port)"""
+    host, _, port = text.rpartition(":")
+    if not host and not port.isdigit():
+        host, port = port, ""
+    if port and not port.isdigit():
+        raise ValueError(f"'{port}' is not a port number")
+    return host.strip("[]") or default_host, int(port) if port else default_port
+
+
+class MonitoringAgent:
+    """
+    MonitoringAgent streams the results of the monitors in this process to a collector over TCP, so monitors can
+    run on many machines, each a vantage point of its own, and be watched from one. The agent tells the collector
+    which monitors it runs, then sends their results as packed records, joined into one frame per send.
+
+    Results wait in a queue of at most max_pending records, and a thread of its own sends them, so checks are
+    never held up by the network. When the collector reads slower than results arrive, sends block and the
+    queue grows, and once it is full the oldest results are dropped. Monitors added and removed are announced
+    from a queue of their own, which is never dropped from and is sent ahead of the results. When the connection
+    is lost the agent reconnects with a growing delay and tells the collector about its monitors again.
+    """
+    def __init__(self, collector_address, name, max_pending=100000, max_batch=1024):
+        """Create an agent called name that sends to collector_address, a (host, port) pair"""
+        self._collector_address = collector_address
+        self._name = name
+        self._max_batch = max_batch
+        self._pending = collections.deque(maxlen=max_pending)
+        self._announcements = collections.deque()
+        self._specs = {}
+        self._condition = threading.Condition()
+        self._stop_event = threading.Event()
+        self._sock = None
+        self._sent = 0
+        self._dropped = 0
+        self._thread = None
+
+    def get_name(self):
+        """Returns the name the agent reports to the collector"""
+        return self._name
+
+    def get_sent_count(self):
+        """Returns the number of results sent to the collector"""
+        return self._sent
+
+    def get_dropped_count(self):
+        """Returns the number of results dropped because the queue was full, or they were too large to send"""
+        return self._dropped
+
+    def get_pending_count(self):
+        """Returns the number of results and announcements waiting to be sent"""
+        return len(self._pending) + len(self._announcements)
+
+    def is_connected(self):
+        """Returns True if the agent is connected to the collector"""
+        return self._sock is not None
+
+    def start(self):
+        """Start the thread that connects to the collector and sends results"""
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def add(self, monitor_id, monitor):
+        """Tell the collector about a monitor, and send its results from now on"""
+        spec = monitor.get_spec()
+        with self._condition:
+            self._specs[monitor_id] = spec
+            self._announce(FRAME_MONITOR, {"id": monitor_id, "spec": spec})
+        monitor.set_result_handler(lambda monitor, response: self.send_result(monitor_id, monitor, response))
+
+    def remove(self, monitor_id):
+        """Tell the collector a monitor was removed"""
+        with self._condition:
+            self._specs.pop(monitor_id, None)
+            self._announce(FRAME_REMOVE, {"id": monitor_id})
+
+    def send_result(self, monitor_id, monitor, function_response):
+        """Queue the result of a check to be sent"""
+        record = pack_result(monitor_id, time.time(), monitor.is_up(), monitor.get_metrics(), str(function_response))
+        with self._condition:
+            if len(record) > MAX_FRAME_BYTES:
+                # It could never be sent in a frame
+                self._dropped += 1
+                return
+            if len(self._pending) == self._pending.maxlen:
+                self._dropped += 1
+            self._pending.append(record)
+            self._condition.notify()
+
+    def _announce(self, kind, payload):
+        """Queue an announcement of a monitor, which is never dropped. Call with the condition held."""
+        self._announcements.append(pack_frame(kind, payload))
+        self._condition.notify()
+
+    def stop(self):
+        """Ask the agent to send what is queued, if it is connected, and stop"""
+        self._stop_event.set()
+        with self._condition:
+            self._condition.notify()
+
+    def join(self, timeout=None):
+        """Wait up to timeout seconds (forever if None) for the agent to stop. Returns True if it has stopped."""
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self._thread is None or not self._thread.is_alive()
+
+    def _connect(self):
+        """Connect to the collector and introduce the agent and its monitors. Returns False if it failed."""
+        with self._condition:
+            frames = [pack_frame(FRAME_HELLO, {"agent": self._name})]
+            frames.extend(pack_frame(FRAME_MONITOR, {"id": monitor_id, "spec": spec})
+                          for monitor_id, spec in self._specs.items())
+        try:
+            sock = socket.create_connection(self._collector_address, timeout=5)
+        except OSError as e:
+            print(f"Agent {self._name}: could not connect to the collector at {self._collector_address}: {e}")
+            return False
+        try:
+            sock.settimeout(None)
+            sock.sendall(b"".join(frames))
+        except OSError as e:
+            sock.close()
+            print(f"Agent {self._name}: could not connect to the collector at {self._collector_address}: {e}")
+            return False
+        print(f"Agent {self._name}: connected to the collector at {self._collector_address}")
+        self._sock = sock
+        return True
+
+    def _take_frames(self):
+        """
+        Wait for something to send, and return (frames, announcements, results): the announcements first, then up
+        to max_batch results joined into one frame of at most MAX_FRAME_BYTES. Nothing leaves the queues until
+        _remove_sent is called once they are sent, so what a failed send carried is sent again after reconnecting.
+        Results of a monitor announced as removed are ignored by the collector.
+        """
+        with self._condition:
+            while not self._pending and not self._announcements and not self._stop_event.is_set():
+                self._condition.wait()
+            announcements = list(self._announcements)
+            results = []
+            size = 0
+            for record in self._pending:
+                if len(results) == self._max_batch or size + len(record) > MAX_FRAME_BYTES:
+                    break
+                results.append(record)
+                size += len(record)
+            frames = list(announcements)
+            if results:
+                frames.append(pack_frame(FRAME_RESULTS, b"".join(results)))
+            return frames, announcements, results
+
+    def _remove_sent(self, announcements, results):
+        """Remove what _take_frames returned from the queues, once it is sent"""
+        with self._condition:
+            for _ in announcements:
+                self._announcements.popleft()
+            # The oldest results may have been dropped from a full queue during the send
+            for record in results:
+                if self._pending and self._pending[0] is record:
+                    self._pending.popleft()
+            self._sent += len(results)
+
+    def _run(self):
+        """Connect, and keep sending until stopped, reconnecting with a doubling delay"""
+        delay = 0.5
+        while not self._stop_event.is_set():
+            if not self._connect():
+                self._stop_event.wait(delay)
+                delay = min(delay * 2, 30)
+                continue
+            delay = 0.5
+            try:
+                while True:
+                    stopping = self._stop_event.is_set()
+                    frames, announcements, results = self._take_frames()
+                    if frames:
+                        # Blocks while the collector is behind, which is what holds the agent back
+                        self._sock.sendall(b"".join(frames))
+                        self._remove_sent(announcements, results)
+                    if stopping and not self._pending and not self._announcements:
+                        break
+            except OSError as e:
+                print(f"Agent {self._name}: lost the collector: {e}")
+            finally:
+                self._sock.close()
+                self._sock = None
+
+
+class RemoteMonitor:
+    """
+    RemoteMonitor stands in for a monitor that runs on an agent. Like ShardedMonitor, get methods are answered by
+    a local, inactive copy of the configuration, so the CLI can view it like any other. Its name says which
+    agent it runs on. It cannot be stopped from here; stopping it only stops handing on its results.
+    """
+    def __init__(self, agent, agent_monitor_id, monitor):
+        """Wrap the inactive monitor that runs on agent under agent_monitor_id"""
+        self._agent = agent
+        self._agent_monitor_id = agent_monitor_id
+        self._monitor = monitor
+        self._result_handler = None
+        self._stopped = False
+
+    def __getattr__(self, attribute):
+        """Answer everything that is not about running the monitor from the local copy"""
+        return getattr(self._monitor, attribute)
+
+    def __str__(self):
+        """Specify how this class should be printed to the CLI"""
+        return f"{self._monitor}\nRunning on agent {self._agent}."
+
+    def get_name(self):
+        """Returns the name of the monitor, followed by the agent it runs on"""
+        return f"{self._monitor.get_name()} ({self._agent})"
+
+    def get_agent(self):
+        """Returns the name of the agent the monitor runs on"""
+        return self._agent
+
+    def get_agent_monitor_id(self):
+        """Returns the id of the monitor on its agent"""
+        return self._agent_monitor_id
+
+    def set_result_handler(self, handler):
+        """Set a function that is called with (this monitor, function response) for every result received"""
+        self._result_handler = handler
+
+    def handle_result(self, function_response):
+        """Pass a result received from the agent to the result handler if one is set, otherwise print it"""
+        if self._stopped:
+            return
+        if self._result_handler is not None:
+            self._result_handler(self, function_response)
+        else:
+            self._monitor.report(function_response)
+
+    def activate(self):
+        """The monitor runs on its agent, so there is nothing to start here"""
+
+    def deactivate(self):
+        """Stop handing on results of the monitor"""
+        self.stop()
+
+    def stop(self):
+        """Stop handing on results of the monitor. It keeps running on its agent."""
+        self._stopped = True
+
+    def join(self, timeout=None):
+        """There is nothing to wait for here. Returns True."""
+        return True
+
+
+class AgentCollector:
+    """
+    AgentCollector accepts connections from MonitoringAgents and merges what they send into this process: a
+    RemoteMonitor for every monitor an agent runs, handed to add_monitor (which is expected to put it in the
+    registry and set its result handler), and their results, handed to those RemoteMonitors. remove_monitor is
+    called with a RemoteMonitor the agent no longer runs. One thread serves every agent. Each connection is only
+    read as fast as its results are handled, so a collector that falls behind slows its agents down rather than
+    buffering without bound.
+    """
+    def __init__(self, address, add_monitor, remove_monitor):
+        """Create a collector that will listen on address, a (host, port) pair"""
+        self._address = address
+        self._add_monitor = add_monitor
+        self._remove_monitor = remove_monitor
+        self._listen_sock = None
+        self._selector = None
+        self._monitors = {}
+        self._agents = {}
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Listen for agents, and start the thread that serves them. Raises OSError if it cannot listen."""
+        self._listen_sock = socket.create_server(self._address, reuse_port=False)
+        self._listen_sock.setblocking(False)
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self._listen_sock, selectors.EVENT_READ, None)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def get_address(self):
+        """Returns the (host, port) the collector listens on"""
+        return self._listen_sock.getsockname()[:2] if self._listen_sock is not None else self._address
+
+    def get_agents(self):
+        """Returns the names of the agents that are connected"""
+        return sorted(agent for agent in self._agents.values() if agent is not None)
+
+    def stop(self):
+        """Ask the collector to stop serving agents"""
+        self._stop_event.set()
+
+    def join(self, timeout=None):
+        """Wait up to timeout seconds (forever if None) for the collector to stop. Returns True if it has stopped."""
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self._thread is None or not self._thread.is_alive()
+
+    def _run(self):
+        """Accept agents and read their frames until stopped"""
+        buffers = {}
+        try:
+            while not self._stop_event.is_set():
+                for key, _ in self._selector.select(0.2):
+                    if key.fileobj is self._listen_sock:
+                        self._accept(buffers)
+                        continue
+                    sock = key.fileobj
+                    try:
+                        data = sock.recv(65536)
+                    except BlockingIOError:
+                        continue
+                    except OSError:
+                        data = b""
+                    if not data:
+                        self._disconnect(sock, buffers)
+                        continue
+                    buffers[sock] += data
+                    try:
+                        for kind, payload in unpack_frames(buffers[sock]):
+                            self._handle_frame(sock, kind, payload)
+                    except (ValueError, KeyError, TypeError, struct.error) as e:
+                        print(f"Collector: dropping agent {self._agents.get(sock)}: {e}")
+                        self._disconnect(sock, buffers)
+        finally:
+            for sock in list(buffers):
+                self._disconnect(sock, buffers)
+            self._selector.close()
+            self._listen_sock.close()
+
+    def _accept(self, buffers):
+        """Accept a new agent connection"""
+        try:
+            sock, _ = self._listen_sock.accept()
+        except OSError:
+            return
+        sock.setblocking(False)
+        buffers[sock] = bytearray()
+        self._agents[sock] = None
+        self._selector.register(sock, selectors.EVENT_READ, None)
+
+    def _disconnect(self, sock, buffers):
+        """Close an agent connection. Its monitors stay, with their last results, until it reconnects."""
+        agent = self._agents.pop(sock, None)
+        buffers.pop(sock, None)
+        try:
+            self._selector.unregister(sock)
+        except (KeyError, ValueError):
+            pass
+        sock.close()
+        if agent is not None:
+            print(f"Collector: agent {agent} disconnected")
+
+    def _handle_frame(self, sock, kind, payload):
+        """Act on one frame from an agent"""
+        agent = self._agents.get(sock)
+        if kind == FRAME_HELLO:
+            name = json.loads(payload)["agent"]
+            if name in self._agents.values():
+                raise ValueError(f"an agent called {name} is already connected")
+            self._agents[sock] = name
+            print(f"Collector: agent {name} connected")
+            return
+        if agent is None:
+            raise ValueError("the agent did not introduce itself")
+        if kind == FRAME_MONITOR:
+            message = json.loads(payload)
+            key = (agent, message["id"])
+            if key in self._monitors and self._monitors[key].get_spec() == message["spec"]:
+                return
+            if key in self._monitors:
+                self._remove_monitor(self._monitors.pop(key))
+            build = _SPEC_BUILDERS.get(message["spec"]["class"], monitor_from_spec)
+            remote_monitor = RemoteMonitor(agent, message["id"], build(message["spec"]))
+            self._monitors[key] = remote_monitor
+            self._add_monitor(remote_monitor)
+        elif kind == FRAME_REMOVE:
+            remote_monitor = self._monitors.pop((agent, json.loads(payload)["id"]), None)
+            if remote_monitor is not None:
+                self._remove_monitor(remote_monitor)
+        elif kind == FRAME_RESULTS:
+            for monitor_id, timestamp, is_up, metrics, message in unpack_results(payload):
+                remote_monitor = self._monitors.get((agent, monitor_id))
+                if remote_monitor is not None:
+                    remote_monitor.set_last_result(is_up, metrics)
+                    remote_monitor.handle_result(message)
+        else:
+            raise ValueError(f"unknown frame kind {kind}")
@@ -0,0 +1,366 @@
+import collections
+import datetime
+import json
+import threading
+import time
+import urllib.request
+
+
+STATE_UP = "UP"
+STATE_DEGRADED = "DEGRADED"
+STATE_DOWN = "DOWN"
+DEFAULT_DEGRADE_AFTER = 2
+DEFAULT_FAIL_AFTER = 3
+DEFAULT_RECOVER_AFTER = 2
+FLAP_WINDOW = 20
+FLAP_START = 0.5
+FLAP_STOP = 0.25
+
+
+class StateChange:
+    """A change of a monitor's state, or of whether it is flapping, to be sent to the alert sinks"""
+    def __init__(self, monitor_id, name, service, previous, state, changed_at, summary, flapping=False, kind="state"):
+        """
+        Create an instance of StateChange with given parameters. kind is 'state' for a change of state, or
+        'flapping' and 'stable' when the monitor starts and stops flapping.
+        """
+        self._monitor_id = monitor_id
+        self._name = name
+        self._service = service
+        self._previous = previous
+        self._state = state
+        self._changed_at = changed_at
+        self._summary = summary
+        self._flapping = flapping
+        self._kind = kind
+
+    def get_monitor_id(self):
+        """Returns the registry id of the monitor"""
+        return self._monitor_id
+
+    def get_name(self):
+        """Returns the name of the monitor"""
+        return self._name
+
+    def get_service(self):
+        """Returns the service the monitor checks"""
+        return self._service
+
+    def get_previous(self):
+        """Returns the state before the change, or None for the first state of a monitor"""
+        return self._previous
+
+    def get_state(self):
+        """Returns the state after the change"""
+        return self._state
+
+    def get_changed_at(self):
+        """Returns the time of the change, in seconds since the epoch"""
+        return self._changed_at
+
+    def get_summary(self):
+        """Returns the first line of the response of the check that caused the change"""
+        return self._summary
+
+    def is_flapping(self):
+        """Returns True if the monitor is flapping, so its changes of state are held back"""
+        return self._flapping
+
+    def get_kind(self):
+        """Returns 'state', 'flapping' or 'stable'"""
+        return self._kind
+
+    def to_dict(self):
+        """Returns the change as a plain dictionary, as written to files and webhooks"""
+        return {"monitor_id": self._monitor_id, "name": self._name, "service": self._service,
+                "previous": self._previous, "state": self._state, "changed_at": self._changed_at,
+                "summary": self._summary, "flapping": self._flapping, "kind": self._kind}
+
+    def get_text(self):
+        """Returns the change as one line of text"""
+        stamp = datetime.datetime.fromtimestamp(self._changed_at).strftime("%Y-%m-%d %H:%M:%S")
+        target = f"#{self._monitor_id} {self._service} {self._name}"
+        if self._kind == "flapping":
+            return f"{stamp} {target} is FLAPPING, changes of state are held back until it settles ({self._state})"
+        if self._kind == "stable":
+            return f"{stamp} {target} has stopped flapping and is {self._state}: {self._summary}"
+        previous = f"{self._previous} -> " if self._previous is not None else ""
+        return f"{stamp} {target} {previous}{self._state}: {self._summary}"
+
+
+class MonitorStateMachine:
+    """
+    The state of one monitor, worked out from its checks with hysteresis. degrade_after failed checks in a row
+    take an UP monitor to DEGRADED, and fail_after take it to DOWN. A passed check takes a DOWN monitor to
+    DEGRADED, and recover_after passed checks in a row take it back to UP. So one lost probe is not reported at
+    all, and one answered probe is not a recovery.
+
+    It also damps flapping: the share of the last FLAP_WINDOW checks that differed from the check before is
+    the flap rate. Once it reaches flap_start the monitor is flapping, and changes of state are held back until
+    it falls below flap_stop, when the state it settled in is reported once.
+    """
+    def __init__(self, fail_after=DEFAULT_FAIL_AFTER, recover_after=DEFAULT_RECOVER_AFTER, flap_start=FLAP_START,
+                 flap_stop=FLAP_STOP, flap_window=FLAP_WINDOW, degrade_after=DEFAULT_DEGRADE_AFTER):
+        """Create a state machine for a monitor that has not been checked yet"""
+        self._degrade_after = degrade_after
+        self._fail_after = fail_after
+        self._recover_after = recover_after
+        self._flap_start = flap_start
+        self._flap_stop = flap_stop
+        self._state = None
+        self._reported = None
+        self._failures = 0
+        self._successes = 0
+        self._checks = collections.deque(maxlen=flap_window)
+        self._transitions = 0
+        self._flapping = False
+
+    def get_state(self):
+        """Returns UP, DEGRADED or DOWN, or None before the first check"""
+        return self._state
+
+    def is_flapping(self):
+        """Returns True if the monitor is flapping"""
+        return self._flapping
+
+    def get_flap_rate(self):
+        """Returns the share of the recent checks whose result differed from the check before"""
+        if len(self._checks) < 2:
+            return 0.0
+        return self._transitions / (len(self._checks) - 1)
+
+    def update(self, is_up):
+        """
+        Add the result of a check. Returns (kind, previous state, state) when there is something to report, kind
+        being 'state', 'flapping' or 'stable', or None if there is not.
+        """
+        # The oldest check is about to leave the window, and the transition after it with it
+        if len(self._checks) == self._checks.maxlen and len(self._checks) > 1 and self._checks[0] != self._checks[1]:
+            self._transitions -= 1
+        if self._checks and self._checks[-1] != is_up:
+            self._transitions += 1
+        self._checks.append(is_up)
+
+        if is_up:
+            self._successes += 1
+            self._failures = 0
+        else:
+            self._failures += 1
+            self._successes = 0
+
+        if self._failures >= self._fail_after:
+            self._state = STATE_DOWN
+        elif self._successes >= self._recover_after or (self._state is None and is_up):
+            self._state = STATE_UP
+        elif not is_up and self._state != STATE_DOWN and \
+                (self._state != STATE_UP or self._failures >= self._degrade_after):
+            self._state = STATE_DEGRADED
+        elif is_up and self._state == STATE_DOWN:
+            self._state = STATE_DEGRADED
+
+        rate = self.get_flap_rate()
+        if not self._flapping and len(self._checks) == self._checks.maxlen and rate >= self._flap_start:
+            self._flapping = True
+            return "flapping", self._reported, self._state
+        if self._flapping:
+            if rate >= self._flap_stop:
+                return None
+            self._flapping = False
+            previous, self._reported = self._reported, self._state
+            return "stable", previous, self._state
+        if self._state != self._reported:
+            previous, self._reported = self._reported, self._state
+            return "state", previous, self._state
+        return None
+
+
+class ConsoleSink:
+    """Prints every change on a line of its own, unless muted returns True"""
+    def __init__(self, muted=None):
+        """Create a console sink. muted, if given, is called before printing, and nothing is printed if it is True."""
+        self._muted = muted
+
+    def send(self, change):
+        """Print a change"""
+        if self._muted is None or not self._muted():
+            print(change.get_text())
+
+    def stop(self):
+        """The console has nothing to stop"""
+
+    def join(self, timeout=None):
+        """The console has nothing to wait for. Returns True."""
+        return True
+
+
+class FileSink:
+    """Appends every change to a file, as one JSON object per line"""
+    def __init__(self, path):
+        """Create a sink that appends to the file at path"""
+        self._path = path
+        self._lock = threading.Lock()
+
+    def send(self, change):
+        """Append a change to the file"""
+        line = json.dumps(change.to_dict()) + "\n"
+        with self._lock:
+            try:
+                with open(self._path, "a") as alert_file:
+                    alert_file.write(line)
+            except OSError as e:
+                print(f"Could not write an alert to {self._path}: {e}")
+
+    def stop(self):
+        """The file is opened for each change, so there is nothing to stop"""
+
+    def join(self, timeout=None):
+        """Nothing is buffered. Returns True."""
+        return True
+
+
+class WebhookSink:
+    """
+    Posts changes to an HTTP webhook as JSON ({"alerts": [change, ...]}), from a thread of its own so a slow or
+    unreachable webhook never holds up a check. Changes that arrive together are sent together, in batches of
+    at most batch_size, waiting up to flush_interval seconds for a batch to fill. A batch that fails is retried
+    with a doubling delay, up to retries times, before it is dropped. At most max_pending changes wait to be
+    sent; beyond that the oldest are dropped.
+    """
+    def __init__(self, url, batch_size=50, flush_interval=1.0, retries=5, timeout=5, max_pending=10000):
+        """Create a webhook sink posting to url, and start its thread"""
+        self._url = url
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._retries = retries
+        self._timeout = timeout
+        self._pending = collections.deque(maxlen=max_pending)
+        self._condition = threading.Condition()
+        self._stop_event = threading.Event()
+        self._sent = 0
+        self._dropped = 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def send(self, change):
+        """Queue a change to be posted"""
+        with self._condition:
+            if len(self._pending) == self._pending.maxlen:
+                self._dropped += 1
+            self._pending.append(change.to_dict())
+            if len(self._pending) >= self._batch_size:
+                self._condition.notify()
+
+    def get_pending_count(self):
+        """Returns the number of changes waiting to be posted"""
+        return len(self._pending)
+
+    def get_sent_count(self):
+        """Returns the number of changes posted so far"""
+        return self._sent
+
+    def get_dropped_count(self):
+        """Returns the number of changes dropped, because the queue was full or every retry failed"""
+        return self._dropped
+
+    def stop(self):
+        """Ask the thread to post what is queued, once, and stop"""
+        self._stop_event.set()
+        with self._condition:
+            self._condition.notify()
+
+    def join(self, timeout=None):
+        """Wait up to timeout seconds (forever if None) for the thread to stop. Returns True if it has stopped."""
+        self._thread.join(timeout)
+        return not self._thread.is_alive()
+
+    def _take_batch(self):
+        """Wait for a batch to fill, the flush interval to pass or stop, and return the batch"""
+        with self._condition:
+            if len(self._pending) < self._batch_size and not self._stop_event.is_set():
+                self._condition.wait(self._flush_interval)
+            return [self._pending.popleft() for _ in range(min(self._batch_size, len(self._pending)))]
+
+    def _post(self, batch):
+        """Post a batch. Raises OSError if it was not accepted."""
+        request = urllib.request.Request(self._url, data=json.dumps({"alerts": batch}).encode(),
+                                         headers={"Content-Type": "application/json"}, method="POST")
+        with urllib.request.urlopen(request, timeout=self._timeout) as response:
+            response.read()
+
+    def _run(self):
+        """Post batches until stopped, retrying each with a doubling delay"""
+        while True:
+            stopping = self._stop_event.is_set()
+            batch = self._take_batch()
+            if not batch:
+                if stopping:
+                    return
+                continue
+            delay = 0.5
+            for attempt in range(1 if self._stop_event.is_set() else self._retries + 1):
+                try:
+                    self._post(batch)
+                    self._sent += len(batch)
+                    break
+                except (OSError, ValueError) as e:
+                    if attempt == self._retries or self._stop_event.wait(delay):
+                        print(f"Could not post {len(batch)} alerts to {self._url}: {e}")
+                        self._dropped += len(batch)
+                        break
+                    delay = min(delay * 2, 30)
+
+
+class AlertManager:
+    """
+    AlertManager runs a MonitorStateMachine for every monitor, from the results recorded on the ResultBoard,
+    and sends each change of state to every sink. So alerts grow with incidents rather than with checks.
+    """
+    def __init__(self, sinks=(), fail_after=DEFAULT_FAIL_AFTER, recover_after=DEFAULT_RECOVER_AFTER,
+                 degrade_after=DEFAULT_DEGRADE_AFTER):
+        """Create a manager sending changes to sinks, with the given hysteresis for every monitor"""
+        self._sinks = list(sinks)
+        self._degrade_after = degrade_after
+        self._fail_after = fail_after
+        self._recover_after = recover_after
+        self._machines = {}
+        self._lock = threading.Lock()
+
+    def add_sink(self, sink):
+        """Send changes to one more sink"""
+        self._sinks.append(sink)
+
+    def get_sinks(self):
+        """Returns the sinks changes are sent to"""
+        return list(self._sinks)
+
+    def get_state(self, monitor_id):
+        """Returns the state of a monitor, or None before its first check"""
+        machine = self._machines.get(monitor_id)
+        return machine.get_state() if machine is not None else None
+
+    def is_flapping(self, monitor_id):
+        """Returns True if the monitor is flapping"""
+        machine = self._machines.get(monitor_id)
+        return machine is not None and machine.is_flapping()
+
+    def record(self, monitor_id, name, service, is_up, summary, checked_at=None):
+        """Add the result of a check of a monitor, and send a StateChange to every sink if there is one"""
+        with self._lock:
+            machine = self._machines.get(monitor_id)
+            if machine is None:
+                machine = self._machines[monitor_id] = MonitorStateMachine(self._fail_after, self._recover_after,
+                                                                           degrade_after=self._degrade_after)
+            update = machine.update(is_up)
+        if update is None:
+            return None
+        kind, previous, state = update
+        change = StateChange(monitor_id, name, service, previous, state, checked_at or time.time(), summary,
+                             machine.is_flapping(), kind)
+        for sink in self._sinks:
+            sink.send(change)
+        return change
+
+    def forget(self, monitor_id):
+        """Drop the state of a monitor that was removed"""
+        with self._lock:
+            self._machines.pop(monitor_id, None)
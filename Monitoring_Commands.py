@@ -0,0 +1,236 @@
+import shlex
+import dns.rdatatype
+from urllib.parse import urlsplit
+from Monitoring_Configuration import MonitorDNS, MonitorNTP, MonitorHTTPS, MonitorTCP, MonitorHTTP, MonitorUDP, \
+    MonitorICMP, MonitorTLS, MonitorTraceroute, MonitorResolvers
+from HTTP_Probing import DEFAULT_MAX_BODY_BYTES
+
+
+DEFAULT_INTERVAL = 60
+COMMAND_VERBS = ("new", "delete", "edit")
+COMMAND_USAGE = "new <service> <target> [every <interval>] [option=value ...]\n" \
+                "    services and targets: http <url>, https <url>, icmp <host>, traceroute <host>, ntp <host>,\n" \
+                "    tcp <host:port>, udp <host:port>, tls <host[:port]>,\n" \
+                "    dns <nameserver> query=<name> [type=<record type>]\n" \
+                "    resolvers <resolver,resolver,...> query=<name> [type=<record type>]\n" \
+                "    http and https take content=yes to watch the page for changes\n" \
+                "delete <id>, or delete <service> <target>\n" \
+                "edit <id> every <interval>\n" \
+                "Intervals are in seconds, or end in s, m, h or d, such as 30s, 5m, 1h or 7d."
+_TIME_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+_SERVICES = ("HTTP", "HTTPS", "ICMP", "TRACEROUTE", "NTP", "TCP", "UDP", "TLS", "DNS", "RESOLVERS")
+_OPTIONS = {"DNS": ("query", "type"), "RESOLVERS": ("query", "type"), "HTTP": ("content",), "HTTPS": ("content",)}
+
+
+class CommandError(ValueError):
+    """Raised when a command line does not follow the command grammar"""
+
+
+def parse_interval(text):
+    """Returns the number of seconds in an interval such as '30', '30s', '5m', '1h' or '7d'"""
+    text = text.strip().lower()
+    multiplier = 1
+    if text and text[-1] in _TIME_UNITS:
+        multiplier = _TIME_UNITS[text[-1]]
+        text = text[:-1]
+    try:
+        seconds = int(text) * multiplier
+    except ValueError:
+        raise CommandError(f"'{text}' is not a time interval")
+    if seconds <= 0:
+        raise CommandError("The time interval must be at least one second")
+    return seconds
+
+
+def split_host_port(target, default_port=None):
+    """Split 'host:port' or '[ipv6 address]:port' into (host, port). Raises CommandError if there is no port."""
+    host, port = target, None
+    if target.startswith("["):
+        host, _, rest = target[1:].partition("]")
+        if rest.startswith(":"):
+            port = rest[1:]
+    elif target.count(":") == 1:
+        host, _, port = target.partition(":")
+    if port is None:
+        if default_port is None:
+            raise CommandError(f"'{target}' needs a port, as in host:port")
+        return host, default_port
+    if not port.isdigit() or not 0 < int(port) < 65536:
+        raise CommandError(f"'{port}' is not a port number")
+    return host, int(port)
+
+
+class MonitorCommand:
+    """
+    A parsed command line, in the grammar
+
+        new <service> <target> [every <interval>] [option=value ...]
+        delete <id> | delete <service> <target>
+        edit <id> every <interval>
+
+    which lets a monitor be added, removed or changed in one line, at the prompt or from a batch file.
+    """
+    def __init__(self, verb, service=None, name=None, port=None, interval=None, options=None, monitor_id=None):
+        """Create an instance of MonitorCommand with given parameters"""
+        self._verb = verb
+        self._service = service
+        self._name = name
+        self._port = port
+        self._interval = interval
+        self._options = options or {}
+        self._monitor_id = monitor_id
+
+    def get_verb(self):
+        """Returns 'new', 'delete' or 'edit'"""
+        return self._verb
+
+    def get_service(self):
+        """Returns the service named in the command, in upper case, or None"""
+        return self._service
+
+    def get_name(self):
+        """Returns the url, hostname or ip address the command is about, or None"""
+        return self._name
+
+    def get_port(self):
+        """Returns the port number given with the target, or None"""
+        return self._port
+
+    def get_target_host(self):
+        """Returns the hostname or ip address the command is about, taken from the url for HTTP and HTTPS"""
+        if self._name is not None and "://" in self._name:
+            return urlsplit(self._name).hostname
+        return self._name
+
+    def get_interval(self):
+        """Returns the time interval given after 'every', in seconds, or None"""
+        return self._interval
+
+    def get_monitor_id(self):
+        """Returns the registry id the command is about, or None"""
+        return self._monitor_id
+
+    def build_monitor(self, http_timeout=5, http_max_body=DEFAULT_MAX_BODY_BYTES):
+        """Returns a new, inactive, monitoring configuration for a 'new' command"""
+        interval = self._interval or DEFAULT_INTERVAL
+        if self._service == "HTTP":
+            return MonitorHTTP(self._name, interval, http_timeout, http_max_body, self._is_option_on("content"))
+        if self._service == "HTTPS":
+            return MonitorHTTPS(self._name, interval, http_timeout, http_max_body, self._is_option_on("content"))
+        if self._service == "ICMP":
+            return MonitorICMP(self._name, interval)
+        if self._service == "TRACEROUTE":
+            return MonitorTraceroute(self._name, interval)
+        if self._service == "NTP":
+            return MonitorNTP(self._name, interval)
+        if self._service == "TCP":
+            return MonitorTCP(self._name, interval, self._port)
+        if self._service == "UDP":
+            return MonitorUDP(self._name, interval, self._port)
+        if self._service == "TLS":
+            return MonitorTLS(self._name, interval, self._port)
+        if self._service == "RESOLVERS":
+            return MonitorResolvers(self._name, interval, self._options["query"],
+                                    self._options.get("type", "A").upper())
+        return MonitorDNS(self._name, interval, self._options["query"], self._options.get("type", "A").upper())
+
+    def _is_option_on(self, option):
+        """Returns True if a yes/no option was given as yes"""
+        return self._options.get(option, "no").lower() in ("yes", "y", "true", "on", "1")
+
+
+def is_command_line(line):
+    """Returns True if line is written in the command grammar, rather than being a single word menu command"""
+    words = line.split()
+    return len(words) > 1 and words[0].lower() in COMMAND_VERBS
+
+
+def parse_command(line):
+    """Parse one line of the command grammar into a MonitorCommand. Raises CommandError if it is not valid."""
+    try:
+        words = shlex.split(line, comments=True)
+    except ValueError as e:
+        raise CommandError(str(e))
+    if not words:
+        raise CommandError("Empty command")
+    verb = words[0].lower()
+    if verb == "new":
+        return _parse_new(words[1:])
+    if verb == "delete":
+        return _parse_delete(words[1:])
+    if verb == "edit":
+        return _parse_edit(words[1:])
+    raise CommandError(f"Unknown command '{words[0]}'. Commands are: {', '.join(COMMAND_VERBS)}")
+
+
+def _parse_service_target(words):
+    """Parse '<service> <target>' into (service, name, port)"""
+    if len(words) < 2:
+        raise CommandError("Expected a service and a target")
+    service = words[0].upper()
+    target = words[1]
+    if service not in _SERVICES:
+        raise CommandError(f"Unknown service '{words[0]}'. Services are: {', '.join(_SERVICES)}")
+    if service in ("HTTP", "HTTPS"):
+        scheme = service.lower() + "://"
+        if "://" not in target:
+            target = scheme + target
+        if not target.lower().startswith(scheme) or not urlsplit(target).hostname:
+            raise CommandError(f"'{target}' is not an {service} url")
+        return service, target, None
+    if service in ("TCP", "UDP"):
+        host, port = split_host_port(target)
+        return service, host, port
+    if service == "TLS":
+        host, port = split_host_port(target, 443)
+        return service, host, port
+    return service, target, None
+
+
+def _parse_new(words):
+    """Parse the words after 'new'"""
+    service, name, port = _parse_service_target(words)
+    interval = None
+    options = {}
+    rest = words[2:]
+    while rest:
+        word = rest.pop(0)
+        if word.lower() == "every":
+            if not rest:
+                raise CommandError("Expected a time interval after 'every'")
+            interval = parse_interval(rest.pop(0))
+        elif "=" in word:
+            option, _, value = word.partition("=")
+            option = option.lower()
+            if option not in _OPTIONS.get(service, ()):
+                raise CommandError(f"{service} monitors have no option '{option}'")
+            options[option] = value
+        else:
+            raise CommandError(f"Unexpected '{word}'")
+    if service in ("DNS", "RESOLVERS") and "query" not in options:
+        raise CommandError(f"{service} monitors need a query, as in query=example.com")
+    if "type" in options:
+        try:
+            dns.rdatatype.from_text(options["type"].upper())
+        except dns.rdatatype.UnknownRdatatype:
+            raise CommandError(f"'{options['type']}' is not a DNS record type, such as A, AAAA, MX or TXT")
+    return MonitorCommand("new", service, name, port, interval, options)
+
+
+def _parse_delete(words):
+    """Parse the words after 'delete'"""
+    if len(words) == 1:
+        if not words[0].isdigit():
+            raise CommandError(f"'{words[0]}' is not a monitor id")
+        return MonitorCommand("delete", monitor_id=int(words[0]))
+    if len(words) != 2:
+        raise CommandError("Expected a monitor id, or a service and a target")
+    service, name, port = _parse_service_target(words)
+    return MonitorCommand("delete", service, name, port)
+
+
+def _parse_edit(words):
+    """Parse the words after 'edit'"""
+    if len(words) != 3 or not words[0].isdigit() or words[1].lower() != "every":
+        raise CommandError("Expected edit <id> every <interval>")
+    return MonitorCommand("edit", interval=parse_interval(words[2]), monitor_id=int(words[0]))
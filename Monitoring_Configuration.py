@@ -1,18 +1,29 @@
 import os
+import selectors
 import socket
 import struct
 import zlib
 import random
 import string
-import requests
 import ntplib
 import dns.resolver
 import dns.exception
+import ssl
 import threading
 import time
 import datetime
 from socket import gaierror
 from time import ctime
+from urllib.parse import urlsplit
+from Probe_Scheduling import AdaptiveInterval, get_probe_rate_limiter, get_probe_coalescer
+from Name_Resolution import get_resolver_cache
+from Monitoring_Stats import get_runtime_stats
+from HTTP_Probing import timed_http_request, HTTPProbeError, ContentCache, content_status_text, \
+    DEFAULT_MAX_BODY_BYTES
+from TLS_Probing import get_tls_context, timed_tls_handshake
+from Dual_Stack import race_connect, get_family_name, get_address_family
+from DNS_Probing import query_resolvers, answers_agree, ResolverWindow
+from Batch_Probing import icmp_trace, udp_probe_batch, UDP_OPEN, UDP_CLOSED, UDP_PROTOCOLS
 
 
 class MonitoringConfiguration:
@@ -25,11 +36,35 @@ class MonitoringConfiguration:
         self._function = None
         self._stop_event = threading.Event()
         self._monitor_thread = None
+        self._result_handler = None
+        self._is_up = None
+        self._interval_policy = None
+        self._start_jitter = 1.0
+        self._metrics = {}
 
     def __str__(self):
         """Specify how this class should be printed to the CLI"""
         return f"Service: {self._service}\nMonitoring: {self._name} at a time interval of {self._time_interval} seconds."
 
+    def get_spec(self):
+        """
+        Returns a plain dictionary describing this monitoring configuration. monitor_from_spec can use it to build
+        an identical, inactive, configuration in another process.
+        """
+        policy = self._interval_policy.get_spec() if self._interval_policy is not None else None
+        return {"class": type(self).__name__, "args": list(self._spec_args()), "message": None, "client": False,
+                "policy": policy, "start_jitter": self._start_jitter}
+
+    def _spec_args(self):
+        """Returns the arguments the class was constructed with, in constructor order"""
+        return self._name, self._time_interval
+
+    def get_target_host(self):
+        """Returns the hostname or ip address being monitored, taken from the url for HTTP and HTTPS services"""
+        if "://" in self._name:
+            return urlsplit(self._name).hostname or self._name
+        return self._name
+
     def get_time_interval(self):
         """Returns the time interval for this monitoring configuration"""
         return self._time_interval
@@ -37,8 +72,73 @@ class MonitoringConfiguration:
     def set_time_interval(self, new_time_in_seconds):
         """Sets the _time_interval with the given new_time"""
         self._time_interval = new_time_in_seconds
+        if self._interval_policy is not None:
+            self._interval_policy.set_base_interval(new_time_in_seconds)
         return None
 
+    def get_current_interval(self):
+        """
+        Returns the time, in seconds, the monitor currently waits between checks. This is the time interval,
+        unless an interval policy has backed off or is re-checking a failure.
+        """
+        if self._interval_policy is not None:
+            return self._interval_policy.get_current_interval()
+        return self._time_interval
+
+    def set_interval_policy(self, policy):
+        """
+        Set a policy, such as AdaptiveInterval, that decides the wait before each check from the result of the
+        last one. Passing None goes back to checking at the fixed time interval.
+        """
+        self._interval_policy = policy
+
+    def get_interval_policy(self):
+        """Returns the interval policy of this monitoring configuration, or None"""
+        return self._interval_policy
+
+    def set_start_jitter(self, fraction):
+        """
+        Set how far into its first time interval the monitor may start, as a fraction of the interval. The start
+        is picked at random, so monitors activated together do not all check at the same moment. 0 starts at once.
+        """
+        self._start_jitter = fraction
+
+    def get_start_jitter(self):
+        """Returns how far into its first time interval the monitor may start, as a fraction of the interval"""
+        return self._start_jitter
+
+    def is_up(self):
+        """Returns True if the last check found the service up, False if it did not, and None before any check"""
+        return self._is_up
+
+    def get_metrics(self):
+        """
+        Returns the timings, in milliseconds, that the last check measured, by name. For example 'resolve' is the
+        time spent resolving the hostname, which is kept apart from the time the probe itself took.
+        """
+        return self._metrics
+
+    def set_last_result(self, is_up, metrics):
+        """Set the outcome of the last check, for results that were measured somewhere else"""
+        self._is_up = is_up
+        self._metrics = metrics
+
+    def resolve_host(self, host, family=socket.AF_UNSPEC):
+        """
+        Resolve host through the resolver cache shared by every probe, record the time spent as the 'resolve'
+        metric, and return the first address of the given family. Raises socket.gaierror if it does not resolve.
+        """
+        return self.resolve_addresses(host, family)[0][1]
+
+    def resolve_addresses(self, host, family=socket.AF_UNSPEC):
+        """
+        Resolve host like resolve_host, but return every address as a (family, address) pair, IPv4 and IPv6 alike
+        unless a family is given
+        """
+        addresses, seconds = get_resolver_cache().resolve(host, family)
+        self._metrics["resolve"] = seconds * 1000
+        return addresses
+
     def get_name(self):
         """Returns the name of this monitoring configuration"""
         return self._name
@@ -51,32 +151,131 @@ class MonitoringConfiguration:
         """Set a new function for the Monitoring Configuration"""
         self._function = new_func
 
+    def set_result_handler(self, handler):
+        """
+        Set a function that is called with (monitoring configuration, function response) after every check,
+        instead of printing the result to the CLI. Passing None restores printing.
+        """
+        self._result_handler = handler
+
     def monitor(self):
         """The Monitor method is the principal method of the MonitoringConfiguration class. It is responsible
-        for calling the method that monitors the given service, and prints out a time stamped result. It uses
+        for calling the method that monitors the given service, and hands the result to handle_result. It uses
         threading so that multiple classes can call monitor at the same time."""
-        while not self._stop_event.is_set():
-            print("")
-            function_response = self._function()
-            print(f"{self.timestamped_print()}\nService: {self._service}\nMonitoring: {self._name} at a time"
-                  f" interval of {self._time_interval} seconds.\n{function_response}")
-            print("")
-            time.sleep(self._time_interval)
-        return None
+        delay = random.uniform(0, self._time_interval * self._start_jitter)
+        coalescer = get_probe_coalescer()
+        if coalescer is not None:
+            delay = coalescer.get_start_delay(self.get_probe_key(), self._time_interval, delay)
+        stats = get_runtime_stats()
+        due = time.monotonic() + delay
+        try:
+            if self._stop_event.wait(delay):
+                return None
+            while not self._stop_event.is_set():
+                # How late the check starts, compared to when it was due, shows whether the threads are keeping up
+                stats.record_lag(self._service, (time.monotonic() - due) * 1000)
+                outcome = self.run_check()
+                if outcome is None:
+                    due = time.monotonic()
+                    continue
+                function_response, self._is_up, self._metrics = outcome
+                self.handle_result(function_response)
+                if self._interval_policy is not None:
+                    wait = self._interval_policy.next_interval(self._is_up)
+                else:
+                    wait = self._time_interval
+                due = time.monotonic() + wait
+                self._stop_event.wait(wait)
+            return None
+        finally:
+            # The coalescer would otherwise keep the phase of every probe key that was ever monitored
+            if coalescer is not None:
+                coalescer.forget(self.get_probe_key())
+
+    def get_probe_key(self):
+        """
+        Returns what identifies the probe this monitor sends. Monitors with equal probe keys send identical probes,
+        so they can share one.
+        """
+        return self._service, self._name, getattr(self._function, "__name__", None)
+
+    def run_check(self):
+        """
+        Run one check and return (function response, whether the service is up, metrics). Monitors with the same
+        probe key share one check through the probe coalescer of the process, if one is set. Returns None if the
+        monitor was stopped while waiting on the probe rate limiter.
+        """
+        coalescer = get_probe_coalescer()
+        if coalescer is not None:
+            return coalescer.run(self.get_probe_key(), self._check)
+        return self._check()
+
+    def _check(self):
+        """Wait for the probe rate limiter of the process, if one is set, then call the monitoring function"""
+        limiter = get_probe_rate_limiter()
+        if limiter is not None and not limiter.acquire(self.get_target_host(), self._stop_event):
+            return None
+        self._metrics = {}
+        start = time.perf_counter()
+        function_response = self._function()
+        elapsed = (time.perf_counter() - start) * 1000
+        self._metrics.setdefault("total", elapsed)
+        get_runtime_stats().record_probe(self._service, elapsed)
+        return function_response, self._is_up, self._metrics
+
+    def handle_result(self, function_response):
+        """Pass the response of a check to the result handler if one is set, otherwise print it"""
+        if self._result_handler is not None:
+            self._result_handler(self, function_response)
+        else:
+            self.report(function_response)
+
+    def reports_changes_only(self):
+        """
+        Returns True if the monitor only hands changes to handle_result, so each result is worth reporting as it
+        is. Other monitors hand over every check, and only changes of their state are alerted.
+        """
+        return False
+
+    def report(self, function_response):
+        """Prints out a time stamped result of a check to the CLI"""
+        print("")
+        print(f"{self.timestamped_print()}\nService: {self._service}\nMonitoring: {self._name} at a time"
+              f" interval of {self._time_interval} seconds.\n{function_response}")
+        if self._metrics:
+            print("Timings: " + ", ".join(f"{name} {value:.2f}ms" for name, value in self._metrics.items()))
+        print("")
 
     def activate(self):
         """When the activate method is called, the _monitor_thread private data member is updated to be a
         thread that uses the monitor method. The monitor thread is then started."""
-        self._monitor_thread: threading.Thread = threading.Thread(target=self.monitor)
+        self._monitor_thread: threading.Thread = threading.Thread(target=self.monitor, daemon=True)
         self._monitor_thread.start()
 
     def deactivate(self):
         """The deactivate method sets the stop event, and thus stops the monitor method."""
         if self._monitor_thread is not None:
-            self._stop_event.set()
-            self._monitor_thread.join()
+            self.stop()
+            self.join()
         return
 
+    def stop(self):
+        """
+        Ask the monitor method to stop, without waiting for it. A monitor waiting for its next check stops at once,
+        and one in the middle of a check stops when the check ends.
+        """
+        self._stop_event.set()
+
+    def join(self, timeout=None):
+        """Wait up to timeout seconds (forever if None) for the monitor to stop. Returns True if it has stopped."""
+        if self._monitor_thread is not None:
+            self._monitor_thread.join(timeout)
+        return not self.is_running()
+
+    def is_running(self):
+        """Returns True if the monitor thread is running"""
+        return self._monitor_thread is not None and self._monitor_thread.is_alive()
+
     def calculate_icmp_checksum(self, data: bytes) -> int:
         """
         Calculate the checksum for the ICMP packet.
@@ -105,50 +304,96 @@ class MonitoringConfiguration:
 
         icmp_id = zlib.crc32(f"{thread_id}{process_id}".encode()) & 0xffff
 
-        header: bytes = struct.pack('bbHHh', icmp_type, icmp_code, 0, icmp_id, sequence_number)
+        header: bytes = struct.pack('BBHHh', icmp_type, icmp_code, 0, icmp_id, sequence_number)
 
         random_char: str = random.choice(string.ascii_letters + string.digits)
         data: bytes = (random_char * data_size).encode()
 
         chksum: int = self.calculate_icmp_checksum(header + data)
 
-        header = struct.pack('bbHHh', icmp_type, icmp_code, socket.htons(chksum), icmp_id, sequence_number)
+        header = struct.pack('BBHHh', icmp_type, icmp_code, socket.htons(chksum), icmp_id, sequence_number)
 
         return header + data
 
     def ping(self, host=None, ttl: int = 64, timeout: int = 1, sequence_number: int = 1):
         """
-        Send an ICMP Echo Request to a specified host and measure the round-trip time.
+        Send an ICMP Echo Request to a specified host and measure the round-trip time. IPv6 addresses are pinged
+        with ICMPv6. If a host has both IPv4 and IPv6 addresses and the first family does not answer, the other
+        family is tried too, so a host is only down if neither answers.
         """
         if not host:
             host = self._name
-
-        with socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP) as sock:
-
+        try:
+            addresses = self.resolve_addresses(host)
+        except socket.gaierror as e:
+            self._is_up = False
+            return f"Failed to ping {self._name}. Could not resolve host: {e}"
+
+        # One address of each family, in the order the resolver gave them
+        attempts = []
+        for family, address in addresses:
+            if family not in [attempt[0] for attempt in attempts]:
+                attempts.append((family, address))
+        failures = []
+        for family, address in attempts:
+            try:
+                reply_address, total_ping_time = self._send_echo_request(family, address, ttl, timeout,
+                                                                         sequence_number)
+            except OSError as e:
+                failures.append(f"{get_family_name(family)}: {e}")
+                continue
+            if reply_address is None:
+                failures.append(f"{get_family_name(family)}: no reply")
+                continue
+            self._is_up = True
+            self._metrics["rtt"] = total_ping_time
+            if reply_address == self._name:
+                return f"Successfully pinged {reply_address}, with a time of {total_ping_time}ms"
+            return f"Successfully pinged {self._name} at {reply_address} over {get_family_name(family)}, with a " \
+                   f"time of {total_ping_time}ms"
+        self._is_up = False
+        return f"Failed to ping {self._name} ({', '.join(failures)})"
+
+    def _send_echo_request(self, family, address, ttl, timeout, sequence_number):
+        """
+        Send one Echo Request to address over ICMP or ICMPv6, and wait up to timeout seconds for the matching
+        Echo Reply. Returns (address the reply came from, round trip time in milliseconds), or (None, None).
+        """
+        if family == socket.AF_INET6:
+            sock = socket.socket(socket.AF_INET6, socket.SOCK_RAW, socket.IPPROTO_ICMPV6)
+            sock.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_UNICAST_HOPS, ttl)
+            echo_request, echo_reply = 128, 129
+        else:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP)
             sock.setsockopt(socket.IPPROTO_IP, socket.IP_TTL, ttl)
+            echo_request, echo_reply = 8, 0
 
-            sock.settimeout(timeout)
-
-            packet: bytes = self.create_icmp_packet(icmp_type=8, icmp_code=0, sequence_number=sequence_number)
+        with sock:
+            # The kernel fills in the checksum of ICMPv6 packets itself
+            packet: bytes = self.create_icmp_packet(icmp_type=echo_request, icmp_code=0,
+                                                    sequence_number=sequence_number)
 
-            sock.sendto(packet, (host, 1))
-
-            start: float = time.time()
-
-            try:
+            sock.sendto(packet, (address, 0))
 
-                data, addr = sock.recvfrom(1024)
+            start: float = time.perf_counter()
+            deadline = start + timeout
 
-                end: float = time.time()
-
-                total_ping_time = (end - start) * 1000
+            while True:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    return None, None
+                sock.settimeout(remaining)
+                try:
+                    data, addr = sock.recvfrom(2048)
+                except socket.timeout:
+                    return None, None
+                end: float = time.perf_counter()
 
-                if addr[0] == self._name:
-                    return f"Successfully pinged {addr[0]}, with a time of {total_ping_time}ms"
-                else:
-                    return f"Successfully pinged {self._name} at {addr[0]}, with a time of {total_ping_time}ms"
-            except socket.timeout:
-                return f"Failed to ping {self._name}"
+                # IPv4 raw sockets receive the IP header too, IPv6 raw sockets do not
+                icmp_start = (data[0] & 0x0f) * 4 if family == socket.AF_INET else 0
+                reply = data[icmp_start:icmp_start + 8]
+                if len(reply) == 8 and reply[0] == echo_reply and reply[4:8] == packet[4:8]:
+                    return addr[0], (end - start) * 1000
 
     def timestamped_print(self):
         """
@@ -168,31 +413,66 @@ class MonitorHTTP(MonitoringConfiguration):
     MonitorHTTP is a child class of MonitoringConfiguration, and as such inherits its methods. MonitorHTTP
     has a child class specific method of check_server_http, for monitoring http servers.
     """
-    def __init__(self, name, time_in_seconds):
+    def __init__(self, name, time_in_seconds, timeout=5, max_body_bytes=DEFAULT_MAX_BODY_BYTES, check_content=False):
         """
         Initialize an instance of the class with super, set _service and _function private data members to be
-        MonitorHTTP class specific
+        MonitorHTTP class specific. Every phase of a request may take at most timeout seconds, and at most
+        max_body_bytes of the response body are read. With check_content, requests are conditional and the
+        check reports whether the content of the page changed.
         """
         super().__init__(name, time_in_seconds)
         self._service = "HTTP"
         self._function = self.check_server_http
+        self._timeout = timeout
+        self._max_body_bytes = max_body_bytes
+        self._check_content = check_content
+        self._content_cache = ContentCache()
+
+    def _spec_args(self):
+        """Returns the arguments the class was constructed with, in constructor order"""
+        return self._name, self._time_interval, self._timeout, self._max_body_bytes, self._check_content
+
+    def get_probe_key(self):
+        """Returns the probe key of the parent class, with whether the content is checked added"""
+        return super().get_probe_key() + (self._check_content,)
+
+    def is_checking_content(self):
+        """Returns True if the check reports changes to the content of the page"""
+        return self._check_content
 
     def check_server_http(self, url=None):
         """
-        Check if an HTTP server is up by making a request to the provided URL.
+        Check if an HTTP server is up by making a request to the provided URL. The time taken by name resolution,
+        the TCP connect, the first byte of the response and the whole request are recorded as metrics.
         """
         if url is None:
             url = self._name
+        start = time.perf_counter()
         try:
+            addresses = self.resolve_addresses(urlsplit(url).hostname or url)
 
-            response: requests.Response = requests.get(url)
+            headers = self._content_cache.get_conditional_headers(url) if self._check_content else None
+            response = timed_http_request(url, addresses, headers, self._timeout, self._max_body_bytes)
 
-            is_up: bool = response.status_code < 400
+            self._metrics.update(response.get_timings())
+            self._metrics["total"] = (time.perf_counter() - start) * 1000
+            self._is_up = response.get_status() < 400
+            content = ""
+            if self._check_content:
+                content = content_status_text(self._content_cache.update(url, response), response)
 
-            return f"{self._name} is active. Response code: {response.status_code}"
+            return f"{self._name} is active over {response.get_family_name()}. Response code: " \
+                   f"{response.get_status()}{content}"
 
-        except requests.RequestException:
-            return f"Failed to connect to {self._name}"
+        except HTTPProbeError as e:
+            self._is_up = False
+            if e.is_timeout():
+                return f"Failed to connect to {self._name}. Timeout during {e.get_phase()}"
+            return f"Failed to connect to {self._name}. Error during {e.get_phase()}: {e.get_error()}"
+
+        except socket.gaierror as e:
+            self._is_up = False
+            return f"Failed to connect to {self._name}. Could not resolve host: {e}"
 
 
 class MonitorHTTPS(MonitoringConfiguration):
@@ -200,38 +480,169 @@ class MonitorHTTPS(MonitoringConfiguration):
     MonitorHTTPS is a child class of MonitoringConfiguration, and as such inherits its methods. MonitorHTTPS
     has a child class specific method of check_server_https, for monitoring https servers.
     """
-    def __init__(self, name, time_in_seconds):
+    def __init__(self, name, time_in_seconds, timeout=5, max_body_bytes=DEFAULT_MAX_BODY_BYTES, check_content=False):
         """
         Initialize an instance of the class with super, set _service and _function private data members to be
-        MonitorHTTPS class specific
+        MonitorHTTPS class specific. Every phase of a request may take at most timeout seconds, and at most
+        max_body_bytes of the response body are read. With check_content, requests are conditional and the
+        check reports whether the content of the page changed.
         """
         super().__init__(name, time_in_seconds)
         self._service = "HTTPS"
         self._function = self.check_server_https
+        self._timeout = timeout
+        self._max_body_bytes = max_body_bytes
+        self._check_content = check_content
+        self._content_cache = ContentCache()
+
+    def _spec_args(self):
+        """Returns the arguments the class was constructed with, in constructor order"""
+        return self._name, self._time_interval, self._timeout, self._max_body_bytes, self._check_content
+
+    def get_probe_key(self):
+        """Returns the probe key of the parent class, with whether the content is checked added"""
+        return super().get_probe_key() + (self._check_content,)
+
+    def is_checking_content(self):
+        """Returns True if the check reports changes to the content of the page"""
+        return self._check_content
 
-    def check_server_https(self, url=None, timeout: int = 5):
+    def check_server_https(self, url=None, timeout=None):
         """
-        Check if an HTTPS server is up by making a request to the provided URL.
+        Check if an HTTPS server is up by making a request to the provided URL. The time taken by name resolution,
+        the TCP connect, the TLS handshake, the first byte of the response and the whole request are recorded as
+        metrics.
         """
         if url is None:
             url = self._name
+        if timeout is None:
+            timeout = self._timeout
+        start = time.perf_counter()
         try:
-            headers: dict = {'User-Agent': 'Mozilla/5.0'}
+            addresses = self.resolve_addresses(urlsplit(url).hostname or url)
+
+            headers = self._content_cache.get_conditional_headers(url) if self._check_content else None
+            response = timed_http_request(url, addresses, headers, timeout, self._max_body_bytes)
+
+            self._metrics.update(response.get_timings())
+            self._metrics["total"] = (time.perf_counter() - start) * 1000
+            self._is_up = response.get_status() < 400
+
+            if self._is_up:
+                content = ""
+                if self._check_content:
+                    content = content_status_text(self._content_cache.update(url, response), response)
+                return f"{self._name} is active over {response.get_family_name()}. Server is up. Response code: " \
+                       f"{response.get_status()}{content}"
+            return f"{self._name} is active, but returned an error. Response code: {response.get_status()}"
+
+        except HTTPProbeError as e:
+            self._is_up = False
+            if e.is_timeout():
+                return f"Failed to connect to {self._name}. Timeout occurred during {e.get_phase()}"
+            if e.get_phase() == "connect":
+                return f"Failed to connect to {self._name}. Connection error"
+            return f"Failed to connect to {self._name}. Error during {e.get_phase()}: {e.get_error()}"
+
+        except socket.gaierror as e:
+            self._is_up = False
+            return f"Failed to connect to {self._name}. Could not resolve host: {e}"
+
 
-            response: requests.Response = requests.get(url, headers=headers, timeout=timeout)
+class MonitorTLS(MonitoringConfiguration):
+    """
+    MonitorTLS is a child class of MonitoringConfiguration, and as such inherits its methods. MonitorTLS has a
+    child class specific method of check_tls, which checks the TLS handshake of a server without making an HTTP
+    request. It reports the protocol version, cipher and when the certificate chain expires, and measures a full
+    handshake against one that resumes the session of the first.
+    """
+    def __init__(self, name, time_in_seconds, port=443, verify=True, warning_days=14, timeout=5):
+        """
+        Initialize an instance of the class with super, set _service, _port and _function private data members to
+        be MonitorTLS class specific. With verify False, certificates are not checked against trusted authorities.
+        Certificates that expire within warning_days days are warned about.
+        """
+        super().__init__(name, time_in_seconds)
+        self._service = "TLS"
+        self._port = port
+        self._verify = verify
+        self._warning_days = warning_days
+        self._timeout = timeout
+        self._function = self.check_tls
+        self._certificate_days_left = None
 
-            is_up: bool = response.status_code < 400
+    def _spec_args(self):
+        """Returns the arguments the class was constructed with, in constructor order"""
+        return self._name, self._time_interval, self._port, self._verify, self._warning_days, self._timeout
 
-            return f"{self._name} is active. Server is up. Response code: {response.status_code}"
+    def get_probe_key(self):
+        """Returns the probe key of the parent class, with the port and verification setting added"""
+        return super().get_probe_key() + (self._port, self._verify)
 
-        except requests.ConnectionError:
-            return f"Failed to connect to {self._name}. Connection error"
+    def get_port(self):
+        """Returns the port number"""
+        return self._port
+
+    def get_certificate_days_left(self):
+        """Returns the number of days until the certificate chain expires, as of the last check, or None"""
+        return self._certificate_days_left
 
-        except requests.Timeout:
-            return f"Failed to connect to {self._name}. Timeout occurred"
+    def check_tls(self, host=None, port=None):
+        """
+        Perform a full TLS handshake with the server, then a second one resuming its session. The connect, full
+        handshake and resumed handshake times are recorded as metrics. The server is up if the handshake succeeds
+        and no certificate in the chain has expired.
+        """
+        if host is None:
+            host = self._name
+        if port is None:
+            port = self._port
+        context = get_tls_context(self._verify)
+        try:
+            address = self.resolve_host(host, socket.AF_UNSPEC)
+            full = timed_tls_handshake(address, port, host, context, timeout=self._timeout)
+            self._metrics["connect"] = full.get_connect_time()
+            self._metrics["tls_full"] = full.get_handshake_time()
+            resumption = "The server sent no session to resume."
+            if full.get_session() is not None:
+                resumed = timed_tls_handshake(address, port, host, context, full.get_session(), self._timeout)
+                self._metrics["tls_resumed"] = resumed.get_handshake_time()
+                resumption = "Session resumed." if resumed.is_resumed() else "The server refused to resume the session."
+
+        except socket.gaierror as e:
+            self._is_up = False
+            return f"TLS check of {host} at port {port} failed. Could not resolve host: {e}"
+
+        except ssl.SSLCertVerificationError as e:
+            self._is_up = False
+            return f"TLS check of {host} at port {port} failed. Certificate verification failed: {e.verify_message}"
 
-        except requests.RequestException as e:
-            return f"Failed to connect to {self._name}. Error during request: {e}"
+        except socket.timeout:
+            self._is_up = False
+            return f"TLS check of {host} at port {port} timed out."
+
+        except OSError as e:
+            self._is_up = False
+            return f"TLS check of {host} at port {port} failed: {e}"
+
+        expiry = full.get_chain_expiry()
+        if expiry is None:
+            self._certificate_days_left = None
+            self._is_up = True
+            expiry_text = "The certificate expiry could not be read."
+        else:
+            self._certificate_days_left = (expiry - time.time()) / 86400
+            self._is_up = self._certificate_days_left > 0
+            expires = datetime.datetime.fromtimestamp(expiry).strftime("%Y-%m-%d")
+            if not self._is_up:
+                expiry_text = f"A certificate in the chain EXPIRED on {expires}!"
+            elif self._certificate_days_left < self._warning_days:
+                expiry_text = f"WARNING! The certificate chain expires in {self._certificate_days_left:.1f} days, " \
+                              f"on {expires}."
+            else:
+                expiry_text = f"The certificate chain expires in {self._certificate_days_left:.0f} days, on {expires}."
+        return f"TLS on {host} at port {port} is up. {full.get_version()} with {full.get_cipher()}.\n" \
+               f"{expiry_text} {resumption}"
 
 
 class MonitorICMP(MonitoringConfiguration):
@@ -249,6 +660,128 @@ class MonitorICMP(MonitoringConfiguration):
         self._function = super().ping
 
 
+class MonitorTraceroute(MonitoringConfiguration):
+    """
+    MonitorTraceroute is a child class of MonitoringConfiguration, and as such inherits its methods.
+    MonitorTraceroute has a child class specific method of check_traceroute, which traces the route to a host
+    with ICMP Echo Requests sent for every TTL at once, so a full trace takes one timeout rather than one per hop.
+    It keeps the latency and loss of each hop over time, and reports changes of path. Traces go over IPv4 only, so
+    a host with only IPv6 addresses is reported as such rather than traced.
+    """
+    def __init__(self, name, time_in_seconds, max_hops=30, timeout=2):
+        """
+        Initialize an instance of the class with super, set _service, _max_hops, _timeout and _function private
+        data members to be MonitorTraceroute class specific
+        """
+        super().__init__(name, time_in_seconds)
+        self._service = "Traceroute"
+        self._max_hops = max_hops
+        self._timeout = timeout
+        self._function = self.check_traceroute
+        self._path = None
+        self._hop_statistics = []
+
+    def _spec_args(self):
+        """Returns the arguments the class was constructed with, in constructor order"""
+        return self._name, self._time_interval, self._max_hops, self._timeout
+
+    def get_probe_key(self):
+        """Returns the probe key of the parent class, with the most hops added"""
+        return super().get_probe_key() + (self._max_hops,)
+
+    def get_path(self):
+        """Returns the addresses of the hops found by the last trace, with None for hops that did not answer"""
+        return self._path
+
+    def get_hop_statistics(self):
+        """
+        Returns, for each hop, a dictionary of the probes sent and answered since the hop's address last changed,
+        and the last, lowest, highest and total latency in milliseconds
+        """
+        return self._hop_statistics
+
+    def check_traceroute(self, host=None):
+        """
+        Trace the route to the host, update the statistics of each hop, and compare the path with the previous
+        trace. A hop that did not answer this time is not counted as a change. The host is up if the trace reached
+        it.
+        """
+        if host is None:
+            host = self._name
+        try:
+            addresses = self.resolve_addresses(host)
+            ipv4_addresses = [address for family, address in addresses if family == socket.AF_INET]
+            if not ipv4_addresses:
+                self._is_up = False
+                return f"Traceroute to {host} failed. It only has IPv6 addresses, and traceroute only traces IPv4."
+            address = ipv4_addresses[0]
+            hops = icmp_trace(address, self._max_hops, self._timeout)
+        except socket.gaierror as e:
+            self._is_up = False
+            return f"Traceroute to {host} failed. Could not resolve host: {e}"
+        except OSError as e:
+            self._is_up = False
+            return f"Traceroute to {host} failed: {e}"
+
+        self._is_up = bool(hops) and hops[-1][0] == address
+        if self._is_up:
+            self._metrics["destination"] = hops[-1][1]
+        elif self._path is not None and len(hops) < len(self._path):
+            # Hops beyond the last one that answered were probed too, and count as lost
+            hops += [(None, None)] * (len(self._path) - len(hops))
+        events = self._update_path([hop_address for hop_address, _ in hops])
+        lines = []
+        for ttl, (hop_address, latency) in enumerate(hops, 1):
+            statistics = self._hop_statistics[ttl - 1]
+            statistics["sent"] += 1
+            if latency is None:
+                lines.append(f"{ttl:>3}  *")
+                continue
+            statistics["received"] += 1
+            statistics["last"] = latency
+            statistics["min"] = min(statistics["min"], latency)
+            statistics["max"] = max(statistics["max"], latency)
+            statistics["total"] += latency
+            loss = 100 * (1 - statistics["received"] / statistics["sent"])
+            lines.append(f"{ttl:>3}  {hop_address:<15}  {latency:.2f}ms  (avg "
+                         f"{statistics['total'] / statistics['received']:.2f}ms, loss {loss:.0f}%)")
+        if self._is_up:
+            summary = f"Traceroute to {host} ({address}) reached it in {len(hops)} hops."
+        else:
+            summary = f"Traceroute to {host} ({address}) did not reach it within {self._max_hops} hops."
+        return "\n".join(events + [summary] + lines)
+
+    def _update_path(self, path):
+        """
+        Record the path found by a trace, and return a line describing each hop that changed since the last one.
+        The statistics of a hop start again when its address changes.
+        """
+        events = []
+        previous = self._path or []
+        if self._path is not None and len(path) != len(previous) and self._is_up:
+            events.append(f"PATH CHANGED: the route is now {len(path)} hops long, was {len(previous)}.")
+        merged = []
+        for ttl, hop_address in enumerate(path, 1):
+            previous_address = previous[ttl - 1] if ttl <= len(previous) else None
+            if ttl > len(self._hop_statistics):
+                self._hop_statistics.append(self._new_hop_statistics())
+            if hop_address is None:
+                merged.append(previous_address)
+                continue
+            if previous_address is not None and hop_address != previous_address:
+                events.append(f"PATH CHANGED: hop {ttl} is now {hop_address}, was {previous_address}.")
+                self._hop_statistics[ttl - 1] = self._new_hop_statistics()
+            merged.append(hop_address)
+        del self._hop_statistics[len(path):]
+        self._path = merged
+        return events
+
+    @staticmethod
+    def _new_hop_statistics():
+        """Returns the statistics of a hop that has not been probed yet"""
+        return {"sent": 0, "received": 0, "last": None, "min": float("inf"), "max": 0.0, "total": 0.0}
+
+
 class MonitorDNS(MonitoringConfiguration):
     """
     MonitorDNS is a child class of MonitoringConfiguration, and as such inherits its methods. MonitorDNS
@@ -279,18 +812,28 @@ class MonitorDNS(MonitoringConfiguration):
         try:
 
             resolver = dns.resolver.Resolver()
-            resolver.nameservers = [socket.gethostbyname(server)]
+            resolver.nameservers = [self.resolve_host(server, socket.AF_UNSPEC)]
 
             query_results = resolver.resolve(query, record_type)
             results = [str(rdata) for rdata in query_results]
             result_str = ' '.join(results)
+            self._is_up = True
             return f"Server at server: {server}\nquery: {query} is up.\n" \
                    f"Query results of record type {record_type} returned {result_str}"
 
         except (dns.exception.Timeout, dns.resolver.NoNameservers, dns.resolver.NoAnswer, socket.gaierror) as e:
+            self._is_up = False
             return f"DNS server status check to server: {server}\nquery: {query}\nrecord_type: {record_type}\n" \
                    f"FAILED!\n{str(e)}"
 
+    def _spec_args(self):
+        """Returns the arguments the class was constructed with, in constructor order"""
+        return self._name, self._time_interval, self._query, self._record_type
+
+    def get_probe_key(self):
+        """Returns the probe key of the parent class, with the query and record type added"""
+        return super().get_probe_key() + (self._query, self._record_type)
+
     def get_query(self):
         """Returns query being monitored"""
         return self._query
@@ -300,6 +843,89 @@ class MonitorDNS(MonitoringConfiguration):
         return self._record_type
 
 
+class MonitorResolvers(MonitoringConfiguration):
+    """
+    MonitorResolvers is a child class of MonitoringConfiguration, and as such inherits its methods. It sends the
+    same query to several DNS resolvers at once, given as a comma separated list, and compares them: the response
+    time and rcode of each, whether their answers agree, and which has been fastest over recent checks.
+    """
+    def __init__(self, name, time_in_seconds, query, record_type):
+        """
+        Initialize an instance of the class with super, set _service, _query, _record_type, and _function
+        private data members to be MonitorResolvers class specific
+        """
+        super().__init__(name, time_in_seconds)
+        self._service = "RESOLVERS"
+        self._query = query
+        self._record_type = record_type
+        self._function = self.check_dns_resolvers
+        self._window = ResolverWindow()
+
+    def check_dns_resolvers(self, timeout=3):
+        """
+        Query every resolver concurrently, falling back to TCP for truncated replies, and return a line per
+        resolver with its rcode and response time. The resolvers are up if any of them answered.
+        """
+        resolvers = []
+        lines = []
+        for resolver in self.get_resolvers():
+            try:
+                resolvers.append(self.resolve_addresses(resolver)[0])
+            except (socket.gaierror, IndexError) as e:
+                lines.append(f"  {resolver}: could not be resolved: {e}")
+        answers = query_resolvers(resolvers, self._query, self._record_type, timeout)
+        self._window.record(answers)
+
+        for answer in answers:
+            resolver = answer.get_resolver()
+            if answer.get_rcode() is None:
+                lines.append(f"  {resolver}: FAILED, {answer.get_error()}")
+                continue
+            self._metrics[resolver] = answer.get_response_time()
+            transport = " over TCP" if answer.is_tcp() else ""
+            lines.append(f"  {resolver}: {answer.get_rcode()} in {answer.get_response_time():.2f}ms{transport}: "
+                         f"{' '.join(answer.get_answers())}")
+
+        self._is_up = any(answer.is_answered() for answer in answers)
+        agreement = "The answers agree." if answers_agree(answers) else "The answers DIFFER."
+        status = "up" if self._is_up else "FAILED"
+        fastest = self._window.get_fastest()
+        summary = ""
+        if fastest is not None:
+            summary = f"\nFastest over the last {self._window.get_check_count(fastest[0])} checks: {fastest[0]} " \
+                      f"(median {fastest[1]:.2f}ms)"
+        return f"Query {self._query} {self._record_type} to {len(self.get_resolvers())} resolvers: {status}. " \
+               f"{agreement}\n" + "\n".join(lines) + summary
+
+    def _spec_args(self):
+        """Returns the arguments the class was constructed with, in constructor order"""
+        return self._name, self._time_interval, self._query, self._record_type
+
+    def get_probe_key(self):
+        """Returns the probe key of the parent class, with the query and record type added"""
+        return super().get_probe_key() + (self._query, self._record_type)
+
+    def get_resolvers(self):
+        """Returns the resolvers being compared"""
+        return [resolver.strip() for resolver in self._name.split(",") if resolver.strip()]
+
+    def get_target_host(self):
+        """Returns the first resolver, which stands for the set of them when rate limiting probes"""
+        return self.get_resolvers()[0] if self.get_resolvers() else self._name
+
+    def get_query(self):
+        """Returns query being monitored"""
+        return self._query
+
+    def get_record_type(self):
+        """Returns DNS record type"""
+        return self._record_type
+
+    def get_window(self):
+        """Returns the ResolverWindow of recent response times"""
+        return self._window
+
+
 class MonitorNTP(MonitoringConfiguration):
     """
     MonitorNTP is a child class of MonitoringConfiguration, and as such inherits its methods. MonitorNTP
@@ -324,10 +950,12 @@ class MonitorNTP(MonitoringConfiguration):
         client = ntplib.NTPClient()
 
         try:
-            response = client.request(server, version=3)
+            response = client.request(self.resolve_host(server, socket.AF_UNSPEC), version=3)
 
+            self._is_up = True
             return f"Server at {server} is up. Response time: {ctime(response.tx_time)}"
         except (ntplib.NTPException, gaierror):
+            self._is_up = False
             return f"Couldn't reach server at {server}"
 
 
@@ -348,6 +976,22 @@ class MonitorTCP(MonitoringConfiguration):
         self._port = port
         self._function = self.check_tcp_port
         self._message = None
+        self._client_mode = False
+
+    def get_spec(self):
+        """Returns the spec of the parent class, including the echo message and whether the client is used"""
+        spec = super().get_spec()
+        spec["message"] = self._message
+        spec["client"] = self._client_mode
+        return spec
+
+    def _spec_args(self):
+        """Returns the arguments the class was constructed with, in constructor order"""
+        return self._name, self._time_interval, self._port
+
+    def get_probe_key(self):
+        """Returns the probe key of the parent class, with the port and echo message added"""
+        return super().get_probe_key() + (self._port, self._message)
 
     def get_port(self):
         """Returns the port number"""
@@ -371,35 +1015,45 @@ class MonitorTCP(MonitoringConfiguration):
         if port is None:
             port = self._port
         try:
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                s.settimeout(3)
-
-                s.connect((ip_address, port))
-                return f"Port {port} on {ip_address} is open."
+            addresses = self.resolve_addresses(ip_address)
+            connection = race_connect(addresses, port, timeout=3)
+            with connection.get_socket():
+                self._metrics["connect"] = connection.get_connect_time()
+                self._is_up = True
+                return f"Port {port} on {ip_address} is open over {connection.get_family_name()} " \
+                       f"({connection.get_address()})."
 
         except socket.timeout:
+            self._is_up = False
             return f"Port {port} on {ip_address} timed out."
 
+        except socket.gaierror as e:
+            self._is_up = False
+            return f"Could not resolve {ip_address}: {e}"
+
         except socket.error:
+            self._is_up = False
             return f"Port {port} on {ip_address} is closed or not reachable."
 
         except Exception as e:
+            self._is_up = False
             return f"Failed to check port {port} on {ip_address} due to an error: {e}"
 
     def switch_to_client(self):
         """Changes the classes default function to tcp_client"""
         self._function = self.tcp_client
+        self._client_mode = True
         return None
 
     def tcp_client(self):
         """Basic TCP client method for testing an echo server"""
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock = None
 
         server_address = self._name
         server_port = self._port
         response = None
         try:
-            sock.connect((server_address, server_port))
+            sock = race_connect(self.resolve_addresses(server_address), server_port, timeout=3).get_socket()
 
             message = self._message
             print(f"TCP Client: Sending: {message}")
@@ -409,7 +1063,9 @@ class MonitorTCP(MonitoringConfiguration):
             print(f"TCP Client: Received: {response.decode()}")
 
         finally:
-            sock.close()
+            if sock is not None:
+                sock.close()
+            self._is_up = response is not None
             return f"TCP client sent {self._message} to {server_address} at port {server_port}, and received " \
                    f"the following response: {response}"
 
@@ -430,6 +1086,22 @@ class MonitorUDP(MonitoringConfiguration):
         self._port = port
         self._function = self.check_udp_port
         self._message = None
+        self._client_mode = False
+
+    def get_spec(self):
+        """Returns the spec of the parent class, including the echo message and whether the client is used"""
+        spec = super().get_spec()
+        spec["message"] = self._message
+        spec["client"] = self._client_mode
+        return spec
+
+    def _spec_args(self):
+        """Returns the arguments the class was constructed with, in constructor order"""
+        return self._name, self._time_interval, self._port
+
+    def get_probe_key(self):
+        """Returns the probe key of the parent class, with the port and echo message added"""
+        return super().get_probe_key() + (self._port, self._message)
 
     def get_port(self):
         """Returns the port number"""
@@ -447,55 +1119,72 @@ class MonitorUDP(MonitoringConfiguration):
     def switch_to_client(self):
         """Changes the classes default function to udp_client"""
         self._function = self.udp_client
+        self._client_mode = True
         return None
 
     def check_udp_port(self, ip_address=None, port=None, timeout: int = 3) -> (bool, str):
         """
-        This function attempts to send a UDP packet to the specified port on the given IP address.
+        This function sends a UDP datagram to the specified port on the given IP address, from a connected socket,
+        so an ICMP Port Unreachable reply is seen at once. Ports with a known service (DNS, NTP or echo) are sent a
+        real request of that protocol, so they are only up if the service answers. For other ports, no reply means
+        the port is open or filtered, which counts as up.
         """
         if ip_address is None:
             ip_address = self._name
         if port is None:
             port = self._port
         try:
-            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
-                s.settimeout(timeout)
-
-                s.sendto(b'', (ip_address, port))
-
-                try:
-
-                    s.recvfrom(1024)
-
-                    return f"Port {port} on {ip_address} is closed."
-
-                except socket.timeout:
-
-                    return f"Port {port} on {ip_address} is open or no response received."
+            address = self.resolve_host(ip_address)
+            state, elapsed = udp_probe_batch([(address, port)], timeout)[0]
         except Exception as e:
 
+            self._is_up = False
             return f"Failed to check UDP port {port} on {ip_address} due to an error: {e}"
 
+        protocol = UDP_PROTOCOLS.get(port)
+        if state == UDP_OPEN:
+            self._metrics["reply"] = elapsed
+            self._is_up = True
+            service = f"{protocol} " if protocol else ""
+            return f"Port {port} on {ip_address} is open. The {service}service replied in {elapsed:.2f}ms."
+        if state == UDP_CLOSED:
+            self._metrics["reply"] = elapsed
+            self._is_up = False
+            return f"Port {port} on {ip_address} is closed (ICMP port unreachable after {elapsed:.2f}ms)."
+        if protocol:
+            self._is_up = False
+            return f"Port {port} on {ip_address} did not answer a {protocol} request within {timeout} seconds."
+        self._is_up = True
+        return f"Port {port} on {ip_address} is open or filtered (no reply within {timeout} seconds)."
+
     def udp_client(self):
         """Basic UDP client method for testing local server"""
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock = None
 
         server_address = self._name
         server_port = self._port
         response = None
 
         try:
-            sock.connect((server_address, server_port))
+            address = self.resolve_host(server_address)
+            sock = socket.socket(get_address_family(address), socket.SOCK_DGRAM)
+            sock.settimeout(3)
+            sock.connect((address, server_port))
 
             message = self._message
             print(f"UDP client:\nSending: {message}")
-            sock.sendto(message.encode(), (server_address, server_port))
+            sock.send(message.encode())
 
-            response, server = sock.recvfrom(1024)
-            print(f"UDP Client: Received: {response.decode()} from {server}")
+            response = sock.recv(1024)
+            print(f"UDP Client: Received: {response.decode()} from {(address, server_port)}")
+
+        except OSError as e:
+            print(f"UDP Client: No response from {server_address} at port {server_port}: {e}")
 
         finally:
-            sock.close()
+            if sock is not None:
+                sock.close()
+            self._is_up = response is not None
             return f"UDP client sent {self._message} to {server_address} at port {server_port}, and received " \
                    f"the following response: {response}"
 
@@ -505,31 +1194,64 @@ class Server:
     The Server class is a parent class to TCP and UDP servers, and holds all mutually necessary data members and methods
     """
     def __init__(self, name, port):
-        """Initialize and instance of the Server class with the given name and port"""
+        """
+        Initialize and instance of the Server class with the given name and port. Servers listen on the IPv4 and
+        the IPv6 loopback address, so clients reach them over either family.
+        """
         self._name = name
-        self._server = "127.0.0.1"
+        self._addresses = ["127.0.0.1", "::1"]
         self._port = port
         self._service = None
         self._function = None
         self._stop_event = threading.Event()
         self._run_thread = None
         self._timeout = 10
+        self._server_socks = []
+        self._bytes_received = 0
+        self._bytes_sent = 0
+        self._requests = 0
 
     def activate(self):
         """
         When the activate method is called, the _run_thread private data member is updated to be a
         thread that uses the run method of the child class. The run thread is then started.
         """
-        self._run_thread: threading.Thread = threading.Thread(target=self._function)
+        self._run_thread: threading.Thread = threading.Thread(target=self._function, daemon=True)
         self._run_thread.start()
 
     def deactivate(self):
         """The deactivate method sets the stop event, and thus stops the run method of the child class"""
         if self._run_thread is not None:
-            self._stop_event.set()
-            self._run_thread.join()
+            self.stop()
+            self.join()
         return
 
+    def stop(self):
+        """
+        Ask the server to stop, without waiting for it. Every server socket is woken, so the run method does not
+        stay blocked waiting for a client until the socket timeout.
+        """
+        self._stop_event.set()
+        for server_sock in list(self._server_socks):
+            self._wake(server_sock)
+
+    def _wake(self, server_sock):
+        """Wake the run method if it is waiting on server_sock, by shutting the socket down"""
+        try:
+            server_sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def join(self, timeout=None):
+        """Wait up to timeout seconds (forever if None) for the server to stop. Returns True if it has stopped."""
+        if self._run_thread is not None:
+            self._run_thread.join(timeout)
+        return not self.is_running()
+
+    def is_running(self):
+        """Returns True if the server thread is running"""
+        return self._run_thread is not None and self._run_thread.is_alive()
+
     def get_name(self):
         """Returns the custom name of the server"""
         return self._name
@@ -542,6 +1264,51 @@ class Server:
         """Returns the service of server"""
         return self._service
 
+    def get_bytes_received(self):
+        """Returns the number of bytes the server has received from clients"""
+        return self._bytes_received
+
+    def get_bytes_sent(self):
+        """Returns the number of bytes the server has sent to clients"""
+        return self._bytes_sent
+
+    def get_request_count(self):
+        """Returns the number of messages the server has answered"""
+        return self._requests
+
+    def get_addresses(self):
+        """Returns the addresses the server is listening on"""
+        return [server_sock.getsockname()[0] for server_sock in self._server_socks]
+
+    def _bind_sockets(self, socket_type):
+        """
+        Returns a socket of socket_type bound to the port on each loopback address. IPv6 is skipped if this host
+        has no IPv6 loopback, but failing to bind the IPv4 address raises OSError.
+        """
+        server_socks = []
+        for address in self._addresses:
+            family = get_address_family(address)
+            server_sock = socket.socket(family, socket_type)
+            try:
+                if family == socket.AF_INET6:
+                    server_sock.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_V6ONLY, 1)
+                server_sock.bind((address, self._port))
+            except OSError:
+                server_sock.close()
+                if family == socket.AF_INET6:
+                    continue
+                for bound_sock in server_socks:
+                    bound_sock.close()
+                raise
+            server_socks.append(server_sock)
+        return server_socks
+
+    def _close_sockets(self):
+        """Close every server socket"""
+        server_socks, self._server_socks = self._server_socks, []
+        for server_sock in server_socks:
+            server_sock.close()
+
 
 class TCPServer(Server):
     """
@@ -562,41 +1329,45 @@ class TCPServer(Server):
         """
         The method run_tcp_server is the principal method of the TCPServer class. It creates a new TCP server
         at local host with the user inputted port number. It then uses threading to remain active and accept
-        incoming messages, and echoes back the same message as a response. The method sets a timeout for the socket
-        to enable the server to shut down when asked to.
+        incoming messages, and echoes back the same message as a response. The method waits on all of its
+        sockets at once, with a timeout, to enable the server to shut down when asked to.
         """
-        server_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        server_sock.settimeout(self._timeout)
-        server_address = self._server
-        server_port = self._port
-        server_sock.bind((server_address, server_port))
+        self._server_socks = self._bind_sockets(socket.SOCK_STREAM)
+        selector = selectors.DefaultSelector()
+        for server_sock in self._server_socks:
+            server_sock.listen(5)
+            selector.register(server_sock, selectors.EVENT_READ)
 
-        server_sock.listen(5)
-
-        print(f"TCP server {self._name}: Listening for incoming connections!")
+        print(f"TCP server {self._name}: Listening for incoming connections on {', '.join(self.get_addresses())}!")
 
         try:
             while not self._stop_event.is_set():
 
-                try:
-                    client_sock, client_address = server_sock.accept()
-                    print(f"TCP server {self._name}: Connection from {client_address}")
-                    message = client_sock.recv(1024)
-                    print(f"TCP server {self._name}: Received message {message.decode()}")
-
-                    response = message.decode()
-                    client_sock.sendall(response.encode())
-
-                except socket.timeout:
+                for key, _ in selector.select(self._timeout):
                     if self._stop_event.is_set():
-                        if client_sock:
-                            client_sock.close()
-                            print(f"TCP server {self._name}: Connection with {client_address} closed")
                         break
-                    pass
-
-                finally:
-                    client_sock.close()
+                    try:
+                        client_sock, client_address = key.fileobj.accept()
+                    except OSError:
+                        # stop() shut the socket down to wake the selector
+                        if self._stop_event.is_set():
+                            break
+                        raise
+
+                    with client_sock:
+                        client_sock.settimeout(self._timeout)
+                        print(f"TCP server {self._name}: Connection from {client_address}")
+                        try:
+                            message = client_sock.recv(1024)
+                            self._bytes_received += len(message)
+                            print(f"TCP server {self._name}: Received message {message.decode()}")
+
+                            response = message.decode().encode()
+                            client_sock.sendall(response)
+                            self._bytes_sent += len(response)
+                            self._requests += 1
+                        except (OSError, UnicodeDecodeError):
+                            pass
                     print(f"TCP server {self._name}: Connection with {client_address} closed")
 
         except KeyboardInterrupt:
@@ -604,7 +1375,8 @@ class TCPServer(Server):
 
         finally:
             print(f"TCP server {self._name}: Server is shutting down")
-            server_sock.close()
+            selector.close()
+            self._close_sockets()
             print(f"TCP server {self._name}: Server socket closed")
 
 
@@ -620,60 +1392,76 @@ class UDPServer(Server):
         and _function to be run_udp_server
         """
         super().__init__(name, port)
-        self._service = "TCP Server"
+        self._service = "UDP Server"
         self._function = self.run_udp_server
 
+    def _wake(self, server_sock):
+        """Shutting down a UDP socket does not wake a waiting reader, so send an empty datagram to it instead"""
+        try:
+            with socket.socket(server_sock.family, socket.SOCK_DGRAM) as wakeup_sock:
+                wakeup_sock.sendto(b"", server_sock.getsockname()[:2])
+        except OSError:
+            pass
+
     def run_udp_server(self):
         """
         The method run_udp_server is the principal method of the UDPServer class. It creates a new UDP server
         at local host with the user inputted port number. It then uses threading to remain active and accept
-        incoming messages. The method sets a timeout for the socket
+        incoming messages. The method waits on all of its sockets at once, with a timeout,
         to enable the server to shut down when asked to.
         """
-        server_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        server_sock.settimeout(self._timeout)
-        server_address = self._server
-        server_port = self._port
-        server_sock.bind((server_address, server_port))
+        self._server_socks = self._bind_sockets(socket.SOCK_DGRAM)
+        selector = selectors.DefaultSelector()
+        for server_sock in self._server_socks:
+            selector.register(server_sock, selectors.EVENT_READ)
 
-        print("UDP Server is ready to receive messages...")
+        print(f"UDP Server is ready to receive messages on {', '.join(self.get_addresses())}...")
 
         try:
             while not self._stop_event.is_set():
 
-                try:
-                    message, client_address = server_sock.recvfrom(1024)
-                    print(f"Received message: {message.decode()} from {client_address}")
-                    response = "Message received"
-                    server_sock.sendto(response.encode(), client_address)
-                except socket.timeout:
+                for key, _ in selector.select(self._timeout):
                     if self._stop_event.is_set():
                         break
-                    pass
+                    try:
+                        message, client_address = key.fileobj.recvfrom(1024)
+                        self._bytes_received += len(message)
+                        print(f"Received message: {message.decode()} from {client_address}")
+                        response = "Message received".encode()
+                        self._bytes_sent += key.fileobj.sendto(response, client_address)
+                        self._requests += 1
+                    except UnicodeDecodeError:
+                        pass
+                    except OSError:
+                        if self._stop_event.is_set():
+                            break
+                        raise
 
         except KeyboardInterrupt:
             print("Server is shutting down")
 
         finally:
-            server_sock.close()
+            selector.close()
+            self._close_sockets()
             print("Server socket closed")
 
 
+MONITOR_CLASSES = {"MonitorHTTP": MonitorHTTP, "MonitorHTTPS": MonitorHTTPS, "MonitorTLS": MonitorTLS,
+                   "MonitorICMP": MonitorICMP, "MonitorTraceroute": MonitorTraceroute, "MonitorDNS": MonitorDNS,
+                   "MonitorResolvers": MonitorResolvers, "MonitorNTP": MonitorNTP, "MonitorTCP": MonitorTCP,
+                   "MonitorUDP": MonitorUDP}
 
 
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
+def monitor_from_spec(spec):
+    """
+    Build an inactive monitoring configuration from a spec returned by MonitoringConfiguration.get_spec.
+    """
+    monitor = MONITOR_CLASSES[spec["class"]](*spec["args"])
+    if spec.get("message") is not None:
+        monitor.set_message(spec["message"])
+    if spec.get("client"):
+        monitor.switch_to_client()
+    monitor.set_start_jitter(spec.get("start_jitter", 1.0))
+    if spec.get("policy") is not None:
+        monitor.set_interval_policy(AdaptiveInterval.from_spec(spec["policy"]))
+    return monitor
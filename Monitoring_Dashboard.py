@@ -0,0 +1,252 @@
+import threading
+import time
+from prompt_toolkit.application import Application
+from prompt_toolkit.application.current import get_app
+from prompt_toolkit.buffer import Buffer
+from prompt_toolkit.filters import Condition
+from prompt_toolkit.key_binding import KeyBindings
+from prompt_toolkit.layout import Layout, HSplit, VSplit, Window
+from prompt_toolkit.layout.controls import BufferControl, FormattedTextControl
+
+
+SPARK_CHARACTERS = "▁▂▃▄▅▆▇█"
+SORT_KEYS = ("id", "status", "latency", "service", "name")
+_HEADER_LINES = 2
+_FOOTER_LINES = 2
+
+
+def sparkline(history):
+    """Returns one character per latency in history, scaled to the largest, with '!' for checks that were down"""
+    latencies = [latency for latency in history if latency is not None]
+    top = max(latencies) if latencies else 0
+    characters = []
+    for latency in history:
+        if latency is None:
+            characters.append("!")
+        elif top <= 0:
+            characters.append(SPARK_CHARACTERS[0])
+        else:
+            characters.append(SPARK_CHARACTERS[min(len(SPARK_CHARACTERS) - 1,
+                                                   int(latency / top * len(SPARK_CHARACTERS)))])
+    return "".join(characters)
+
+
+class MonitoringDashboard:
+    """
+    MonitoringDashboard is a full screen view of every monitor in the registry: its state, last latency, and a
+    sparkline of its recent latencies. It only reads snapshots from the ResultBoard, so it never holds up a
+    check. The screen is redrawn when results change, at most frame_rate times a second, and each row is only
+    formatted again when its monitor reports a new result. Printing of results is muted while it is open.
+
+    Keys: s changes the sort column, r reverses it, / edits the filter, arrows and page keys scroll, q exits.
+    """
+    def __init__(self, monitor_registry, result_board, frame_rate=10):
+        """Create a dashboard of the monitors in monitor_registry, showing the results recorded on result_board"""
+        self._registry = monitor_registry
+        self._board = result_board
+        self._frame_rate = frame_rate
+        self._sort_index = 0
+        self._reverse = False
+        self._scroll = 0
+        self._row_cache = {}
+        self._order_cache = None
+        self._order_key = None
+        self._filter_buffer = Buffer(multiline=False, on_text_changed=lambda _: self._reset_scroll())
+        self._table_control = FormattedTextControl(self._get_table, focusable=True, show_cursor=False)
+        self._filter_control = BufferControl(buffer=self._filter_buffer)
+        self._stop_event = threading.Event()
+        self._application = Application(layout=self._build_layout(), key_bindings=self._build_key_bindings(),
+                                         full_screen=True, min_redraw_interval=1 / frame_rate)
+
+    def run(self):
+        """Show the dashboard until the user exits it. Printing of results is muted in the meantime."""
+        was_muted = self._board.is_muted()
+        self._board.set_muted(True)
+        watcher = threading.Thread(target=self._watch, daemon=True)
+        watcher.start()
+        try:
+            self._application.run()
+        finally:
+            self._stop_event.set()
+            watcher.join()
+            self._board.set_muted(was_muted)
+
+    def _watch(self):
+        """Ask for a redraw whenever the board or the registry has changed, at most frame_rate times a second"""
+        seen = None
+        while not self._stop_event.wait(1 / self._frame_rate):
+            state = (self._board.get_version(), len(self._registry))
+            if state != seen:
+                seen = state
+                self._application.invalidate()
+
+    def _build_layout(self):
+        """Returns the layout: header, table of monitors, filter input and a line of key help"""
+        header = Window(FormattedTextControl(self._get_header), height=_HEADER_LINES)
+        table = Window(self._table_control)
+        filter_line = VSplit([Window(FormattedTextControl("Filter: "), width=8, height=1),
+                              Window(self._filter_control, height=1)])
+        help_line = Window(FormattedTextControl(
+            "s: sort  r: reverse  /: filter (enter to finish)  arrows, pgup, pgdn: scroll  q: exit"),
+            height=1, style="reverse")
+        return Layout(HSplit([header, table, filter_line, help_line]), focused_element=table)
+
+    def _build_key_bindings(self):
+        """Returns the key bindings of the dashboard"""
+        key_bindings = KeyBindings()
+        browsing = Condition(lambda: not self._application.layout.has_focus(self._filter_buffer))
+
+        @key_bindings.add("q", filter=browsing)
+        @key_bindings.add("c-c")
+        def _exit(event):
+            event.app.exit()
+
+        @key_bindings.add("s", filter=browsing)
+        def _sort(event):
+            self._sort_index = (self._sort_index + 1) % len(SORT_KEYS)
+            self._reset_scroll()
+
+        @key_bindings.add("r", filter=browsing)
+        def _reverse(event):
+            self._reverse = not self._reverse
+            self._reset_scroll()
+
+        @key_bindings.add("/", filter=browsing)
+        def _edit_filter(event):
+            event.app.layout.focus(self._filter_buffer)
+
+        @key_bindings.add("enter", filter=~browsing)
+        @key_bindings.add("escape", filter=~browsing)
+        def _finish_filter(event):
+            event.app.layout.focus(self._table_control)
+
+        @key_bindings.add("up", filter=browsing)
+        def _up(event):
+            self._scroll_by(-1)
+
+        @key_bindings.add("down", filter=browsing)
+        def _down(event):
+            self._scroll_by(1)
+
+        @key_bindings.add("pageup", filter=browsing)
+        def _page_up(event):
+            self._scroll_by(-self._get_visible_rows())
+
+        @key_bindings.add("pagedown", filter=browsing)
+        def _page_down(event):
+            self._scroll_by(self._get_visible_rows())
+
+        return key_bindings
+
+    def _reset_scroll(self):
+        """Go back to the top of the table"""
+        self._scroll = 0
+
+    def _scroll_by(self, rows):
+        """Scroll the table by the given number of rows"""
+        last = max(0, len(self._get_order()) - self._get_visible_rows())
+        self._scroll = min(max(0, self._scroll + rows), last)
+
+    def _get_visible_rows(self):
+        """Returns the number of table rows that fit on the screen"""
+        return max(1, get_app().output.get_size().rows - _HEADER_LINES - _FOOTER_LINES)
+
+    def _get_header(self):
+        """Returns the title line, with the number of monitors in each state, and the column headings"""
+        results = self._board.snapshot()[1]
+        up = down = waiting = 0
+        for monitor_id, _ in self._registry.items():
+            result = results.get(monitor_id)
+            if result is None or result.is_up() is None:
+                waiting += 1
+            elif result.is_up():
+                up += 1
+            else:
+                down += 1
+        direction = "descending" if self._reverse else "ascending"
+        title = f" Network monitoring: {len(self._registry)} monitors, {up} up, {down} down, {waiting} waiting. " \
+                f"Sorted by {SORT_KEYS[self._sort_index]} ({direction}) "
+        columns = f"{'#':>6} {'STATE':<6} {'SERVICE':<10} {'NAME':<40} {'LATENCY':>10} {'CHECKED':<8}  HISTORY"
+        return [("reverse", title.ljust(get_app().output.get_size().columns)), ("", "\n"), ("bold", columns)]
+
+    def _get_order(self):
+        """
+        Returns the ids of the monitors to show, filtered and sorted. The order is only worked out again when a
+        result, the registry, the sort or the filter has changed.
+        """
+        version, results = self._board.snapshot()
+        text = self._filter_buffer.text.strip().lower()
+        order_key = (version, len(self._registry), self._sort_index, self._reverse, text)
+        if order_key == self._order_key:
+            return self._order_cache
+        rows = []
+        for monitor_id, monitor in self._registry.items():
+            result = results.get(monitor_id)
+            state = self._get_state(result)
+            name = str(monitor.get_name())
+            service = str(monitor.get_service())
+            if text and text not in name.lower() and text not in service.lower() and text not in state.lower():
+                continue
+            latency = result.get_latency() if result is not None else None
+            rows.append((monitor_id, state, latency, service, name))
+        sort_key = SORT_KEYS[self._sort_index]
+        if sort_key == "status":
+            ranks = {"DOWN": 0, "WAIT": 1, "UP": 2}
+            rows.sort(key=lambda row: (ranks[row[1]], row[0]), reverse=self._reverse)
+        elif sort_key == "latency":
+            rows.sort(key=lambda row: (row[2] is None, row[2] or 0, row[0]), reverse=self._reverse)
+        else:
+            column = SORT_KEYS.index(sort_key)
+            rows.sort(key=lambda row: (row[column], row[0]), reverse=self._reverse)
+        self._order_key = order_key
+        self._order_cache = [row[0] for row in rows]
+        return self._order_cache
+
+    @staticmethod
+    def _get_state(result):
+        """Returns the state shown for a result: UP, DOWN, or WAIT before the first check"""
+        if result is None or result.is_up() is None:
+            return "WAIT"
+        return "UP" if result.is_up() else "DOWN"
+
+    def _get_table(self):
+        """Returns the rows that fit on the screen, formatting only those whose monitor has reported since"""
+        order = self._get_order()
+        results = self._board.snapshot()[1]
+        visible = order[self._scroll:self._scroll + self._get_visible_rows()]
+        fragments = []
+        for monitor_id in visible:
+            result = results.get(monitor_id)
+            version = result.get_version() if result is not None else 0
+            cached = self._row_cache.get(monitor_id)
+            if cached is None or cached[0] != version:
+                cached = (version, self._format_row(monitor_id, result))
+                self._row_cache[monitor_id] = cached
+            fragments.extend(cached[1])
+        if len(self._row_cache) > 2 * len(self._registry) + 100:
+            self._row_cache = {monitor_id: row for monitor_id, row in self._row_cache.items()
+                               if monitor_id in self._registry}
+        if not fragments:
+            fragments.append(("italic", "No monitors to show"))
+        return fragments
+
+    def _format_row(self, monitor_id, result):
+        """Returns the formatted text of one table row"""
+        monitor = self._registry.get(monitor_id)
+        name = str(monitor.get_name()) if monitor is not None else ""
+        service = str(monitor.get_service()) if monitor is not None else ""
+        state = self._get_state(result)
+        style = {"UP": "fg:ansigreen", "DOWN": "fg:ansired bold", "WAIT": "fg:ansiyellow"}[state]
+        latency = ""
+        checked = ""
+        history = ""
+        if result is not None:
+            if result.get_latency() is not None:
+                latency = f"{result.get_latency():.2f}ms"
+            checked = time.strftime("%H:%M:%S", time.localtime(result.get_checked_at()))
+            history = sparkline(result.get_history())
+        if len(name) > 40:
+            name = name[:39] + "…"
+        return [("", f"{monitor_id:>6} "), (style, f"{state:<6}"),
+                ("", f" {service[:10]:<10} {name:<40} {latency:>10} {checked:<8}  "), ("fg:ansicyan", history),
+                ("", "\n")]
@@ -0,0 +1,372 @@
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+
+
+HISTORY_MAGIC = b"NMHIST1\n"
+BLOCK_HEADER = struct.Struct("!ddIIffIH")
+DEFAULT_BLOCK_SIZE = 1024
+DEFAULT_SEAL_AFTER = 3600
+DEFAULT_MAX_AGE = 180 * 86400
+LATENCY_STEP = 0.1
+RAW_SAMPLE_BYTES = 17
+
+
+def _write_varint(out, value):
+    """Append a non-negative integer to out, seven bits per byte"""
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data, position):
+    """Returns (the integer written by _write_varint at position, the position after it)"""
+    value = shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, position
+        shift += 7
+
+
+def _zigzag(value):
+    """Map a signed integer to a non-negative one, small magnitudes to small numbers: 0, -1, 1, -2 to 0, 1, 2, 3"""
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+
+def _unzigzag(value):
+    """Undo _zigzag"""
+    return value // 2 if value % 2 == 0 else -(value + 1) // 2
+
+
+def history_key(monitor):
+    """
+    Returns what a monitor's history is kept under: its class and the arguments it was built with, apart from its
+    interval, so the key stays the same across restarts and edits, and monitors of one host on different ports
+    keep histories of their own. Monitors that run on an agent are kept apart by the agent's name.
+    """
+    spec = monitor.get_spec()
+    key = f"{spec['class']} {json.dumps(spec['args'][:1] + spec['args'][2:])}"
+    get_agent = getattr(monitor, "get_agent", None)
+    return f"{key} {get_agent()}" if get_agent is not None else key
+
+
+def encode_block(samples):
+    """
+    Pack samples, (checked at in seconds since the epoch, is up, latency in milliseconds or None) oldest first,
+    into compressed bytes. Times are kept to the millisecond as the change of the difference from the sample
+    before, which is nearly always 0 for a monitor checking at a fixed interval. Statuses take one bit each.
+    Latencies, only kept for samples that were up, are rounded to LATENCY_STEP milliseconds.
+    """
+    out = bytearray()
+    _write_varint(out, len(samples))
+    times = [round(checked_at * 1000) for checked_at, _, _ in samples]
+    _write_varint(out, times[0])
+    previous_delta = 0
+    for index in range(1, len(times)):
+        delta = times[index] - times[index - 1]
+        _write_varint(out, _zigzag(delta - previous_delta))
+        previous_delta = delta
+    status = bytearray((len(samples) + 7) // 8)
+    for index, (_, is_up, _) in enumerate(samples):
+        if is_up:
+            status[index >> 3] |= 1 << (index & 7)
+    out += status
+    for _, is_up, latency in samples:
+        if is_up:
+            # 0 stands for a check that was up without a measured latency
+            _write_varint(out, 0 if latency is None else round(latency / LATENCY_STEP) + 1)
+    return zlib.compress(bytes(out), 6)
+
+
+def decode_block(data):
+    """Returns the samples packed by encode_block, oldest first. Raises ValueError if data is damaged."""
+    try:
+        raw = zlib.decompress(data)
+        count, position = _read_varint(raw, 0)
+        checked_at, position = _read_varint(raw, position)
+        times = [checked_at]
+        delta = 0
+        for _ in range(count - 1):
+            change, position = _read_varint(raw, position)
+            delta += _unzigzag(change)
+            checked_at += delta
+            times.append(checked_at)
+        status = raw[position:position + (count + 7) // 8]
+        position += len(status)
+        samples = []
+        for index, checked_at in enumerate(times):
+            is_up = bool(status[index >> 3] & (1 << (index & 7)))
+            latency = None
+            if is_up:
+                quantized, position = _read_varint(raw, position)
+                latency = (quantized - 1) * LATENCY_STEP if quantized else None
+            samples.append((checked_at / 1000, is_up, latency))
+        return samples
+    except (zlib.error, IndexError) as e:
+        raise ValueError(f"History block is damaged: {e}")
+
+
+class HistoryStore:
+    """
+    HistoryStore keeps the result of every check of every monitor for months, under the monitor's history_key.
+    The latest results of a monitor are kept as they are, and every block_size of them are packed by
+    encode_block into a block, about a byte or two per check. Results are also packed once the oldest of them is
+    seal_after seconds old (about twice that for a monitor that stopped checking), so a monitor checking rarely
+    does not keep them unpacked, and unsaved, for days. Each block is indexed by its first and last time,
+    its up and down counts and its lowest and highest latency, so a query only unpacks the blocks it covers in
+    part, and summaries of whole blocks come from the index alone.
+
+    With a path, blocks are appended to that file, read back from it when queried, and indexed again when the
+    store is opened, so history outlives the process. Without one, blocks are kept in memory. Blocks older than
+    max_age seconds are dropped.
+    """
+    def __init__(self, path=None, block_size=DEFAULT_BLOCK_SIZE, max_age=DEFAULT_MAX_AGE,
+                 seal_after=DEFAULT_SEAL_AFTER):
+        """Create a store, opening the history file at path if one is given. Raises OSError if it cannot."""
+        self._path = path
+        self._block_size = block_size
+        self._seal_after = seal_after
+        self._next_sweep = None
+        self._max_age = max_age
+        self._recent = {}
+        self._blocks = {}
+        self._stored_bytes = 0
+        self._block_count = 0
+        self._sample_count = 0
+        self._blocks_read = 0
+        self._file = None
+        self._lock = threading.Lock()
+        if path is not None:
+            self._open()
+
+    def _open(self):
+        """Index the blocks of the history file, and open it for appending. Rewrites it if most of it is expired."""
+        valid_length = len(HISTORY_MAGIC)
+        expired_bytes = 0
+        oldest = time.time() - self._max_age
+        if os.path.exists(self._path) and os.path.getsize(self._path) > 0:
+            with open(self._path, "rb") as history_file:
+                if history_file.read(len(HISTORY_MAGIC)) != HISTORY_MAGIC:
+                    raise OSError(f"{self._path} is not a monitoring history file")
+                while True:
+                    header = history_file.read(BLOCK_HEADER.size)
+                    if len(header) < BLOCK_HEADER.size:
+                        break
+                    first, last, up, down, lowest, highest, length, key_length = BLOCK_HEADER.unpack(header)
+                    key = history_file.read(key_length).decode(errors="replace")
+                    offset = history_file.tell()
+                    history_file.seek(length, os.SEEK_CUR)
+                    if history_file.tell() > os.path.getsize(self._path):
+                        break
+                    valid_length = history_file.tell()
+                    if last < oldest:
+                        expired_bytes += BLOCK_HEADER.size + key_length + length
+                        continue
+                    self._add_block(key, (first, last, up, down, lowest, highest, offset, length))
+            # A block cut short by a crash while it was written is dropped
+            with open(self._path, "r+b") as history_file:
+                history_file.truncate(valid_length)
+        else:
+            with open(self._path, "wb") as history_file:
+                history_file.write(HISTORY_MAGIC)
+        if expired_bytes > self._stored_bytes:
+            self._compact()
+        self._file = open(self._path, "ab")
+
+    def _compact(self):
+        """Rewrite the history file with only the blocks still indexed, replacing it in one step"""
+        temporary_path = f"{self._path}.tmp"
+        with open(self._path, "rb") as source, open(temporary_path, "wb") as target:
+            target.write(HISTORY_MAGIC)
+            for key, blocks in self._blocks.items():
+                encoded_key = key.encode()
+                for index, (first, last, up, down, lowest, highest, offset, length) in enumerate(blocks):
+                    source.seek(offset)
+                    target.write(BLOCK_HEADER.pack(first, last, up, down, lowest, highest, length, len(encoded_key)))
+                    target.write(encoded_key)
+                    blocks[index] = (first, last, up, down, lowest, highest, target.tell(), length)
+                    target.write(source.read(length))
+            target.flush()
+            os.fsync(target.fileno())
+        os.replace(temporary_path, self._path)
+
+    def _add_block(self, key, block):
+        """Index a block of a monitor. Blocks are (first, last, up, down, lowest, highest, offset or data, length)."""
+        self._blocks.setdefault(key, []).append(block)
+        self._stored_bytes += BLOCK_HEADER.size + len(key.encode()) + block[7]
+        self._block_count += 1
+        self._sample_count += block[2] + block[3]
+
+    def _drop_block(self, key, index):
+        """Remove a block of a monitor from the index. Called with the lock held."""
+        block = self._blocks[key].pop(index)
+        self._stored_bytes -= BLOCK_HEADER.size + len(key.encode()) + block[7]
+        self._block_count -= 1
+        self._sample_count -= block[2] + block[3]
+
+    def record(self, key, checked_at, is_up, latency):
+        """
+        Add the result of a check of the monitor with the given history_key, packing its latest results into a
+        block once there are enough or the oldest of them is old enough. Now and then the latest results of every
+        other monitor are packed too if they are old enough.
+        """
+        with self._lock:
+            recent = self._recent.get(key)
+            if recent is None:
+                recent = self._recent[key] = []
+            recent.append((checked_at, is_up, latency))
+            self._sample_count += 1
+            if len(recent) >= self._block_size or checked_at - recent[0][0] >= self._seal_after:
+                self._seal(key)
+            if self._next_sweep is None:
+                self._next_sweep = checked_at + self._seal_after
+            elif checked_at >= self._next_sweep:
+                self._next_sweep = checked_at + self._seal_after
+                for other_key, samples in list(self._recent.items()):
+                    if checked_at - samples[0][0] >= self._seal_after:
+                        self._seal(other_key)
+
+    def _seal(self, key):
+        """Pack the latest results of a monitor into a block, and drop its expired blocks. Called with the lock held."""
+        samples = self._recent.pop(key, None)
+        if not samples:
+            return
+        self._sample_count -= len(samples)
+        data = encode_block(samples)
+        latencies = [latency for _, is_up, latency in samples if is_up and latency is not None]
+        up = sum(1 for _, is_up, _ in samples if is_up)
+        first, last = min(sample[0] for sample in samples), max(sample[0] for sample in samples)
+        lowest, highest = (min(latencies), max(latencies)) if latencies else (-1.0, -1.0)
+        if self._file is not None:
+            encoded_key = key.encode()
+            self._file.write(BLOCK_HEADER.pack(first, last, up, len(samples) - up, lowest, highest, len(data),
+                                               len(encoded_key)) + encoded_key)
+            offset = self._file.tell()
+            self._file.write(data)
+            self._file.flush()
+            self._add_block(key, (first, last, up, len(samples) - up, lowest, highest, offset, len(data)))
+        else:
+            self._add_block(key, (first, last, up, len(samples) - up, lowest, highest, data, len(data)))
+        blocks = self._blocks[key]
+        while blocks and blocks[0][1] < last - self._max_age:
+            self._drop_block(key, 0)
+
+    def _read_blocks(self, blocks):
+        """Returns the samples of blocks, oldest first, reading them from the history file if there is one"""
+        samples = []
+        history_file = None
+        try:
+            for block in blocks:
+                data = block[6]
+                if not isinstance(data, bytes):
+                    if history_file is None:
+                        history_file = open(self._path, "rb")
+                    history_file.seek(block[6])
+                    data = history_file.read(block[7])
+                samples.extend(decode_block(data))
+                self._blocks_read += 1
+        finally:
+            if history_file is not None:
+                history_file.close()
+        return samples
+
+    def _select(self, key, start, end):
+        """
+        Returns (blocks within start and end, blocks partly within them, latest results within them), start being
+        included and end not
+        """
+        start = float("-inf") if start is None else start
+        end = float("inf") if end is None else end
+        with self._lock:
+            whole, partial = [], []
+            for block in self._blocks.get(key, ()):
+                if block[1] < start or block[0] >= end:
+                    continue
+                (whole if start <= block[0] and block[1] < end else partial).append(block)
+            recent = [sample for sample in self._recent.get(key, ()) if start <= sample[0] < end]
+        return whole, partial, recent
+
+    def query(self, key, start=None, end=None):
+        """
+        Returns every (checked at, is up, latency) of a monitor from start up to, but not including, end, in
+        seconds since the epoch (the beginning and the end of its history if None), oldest first, so periods that
+        follow each other never count a check twice. Only the blocks covering the range are unpacked. Latencies
+        come back rounded to LATENCY_STEP milliseconds.
+        """
+        whole, partial, recent = self._select(key, start, end)
+        blocks = sorted(whole + partial, key=lambda block: block[0])
+        low = float("-inf") if start is None else start
+        high = float("inf") if end is None else end
+        samples = [sample for sample in self._read_blocks(blocks) if low <= sample[0] < high]
+        return samples + recent
+
+    def summarize(self, key, start=None, end=None):
+        """
+        Returns (checks up, checks down, lowest latency, highest latency) of a monitor from start up to, but not
+        including, end, the latencies being None if there were none. Blocks wholly within the range are summed
+        from the index, and only those partly within it are unpacked.
+        """
+        whole, partial, recent = self._select(key, start, end)
+        up = sum(block[2] for block in whole)
+        down = sum(block[3] for block in whole)
+        latencies = [value for block in whole for value in (block[4], block[5]) if value >= 0]
+        low = float("-inf") if start is None else start
+        high = float("inf") if end is None else end
+        samples = [sample for sample in self._read_blocks(partial) if low <= sample[0] < high] + recent
+        for _, is_up, latency in samples:
+            if is_up:
+                up += 1
+                if latency is not None:
+                    latencies.append(latency)
+            else:
+                down += 1
+        if not latencies:
+            return up, down, None, None
+        return up, down, min(latencies), max(latencies)
+
+    def get_sample_count(self):
+        """Returns the number of checks in the history"""
+        return self._sample_count
+
+    def get_block_count(self):
+        """Returns the number of packed blocks"""
+        return self._block_count
+
+    def get_stored_bytes(self):
+        """Returns the bytes the packed blocks take, headers included"""
+        return self._stored_bytes
+
+    def get_raw_bytes(self):
+        """Returns the bytes the packed checks would take unpacked, at RAW_SAMPLE_BYTES each"""
+        with self._lock:
+            recent = sum(len(samples) for samples in self._recent.values())
+        return (self._sample_count - recent) * RAW_SAMPLE_BYTES
+
+    def get_blocks_read(self):
+        """Returns the number of blocks unpacked by queries so far"""
+        return self._blocks_read
+
+    def flush(self):
+        """Pack the latest results of every monitor into blocks, however few there are"""
+        with self._lock:
+            for key in list(self._recent):
+                self._seal(key)
+
+    def stop(self):
+        """Pack what is left and close the history file"""
+        self.flush()
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def join(self, timeout=None):
+        """Nothing runs on a thread of its own. Returns True."""
+        return True
@@ -0,0 +1,104 @@
+import threading
+
+
+class MonitorRegistry:
+    """
+    MonitorRegistry holds every monitoring configuration the application runs. Each one gets a stable id when it
+    is added, and the registry keeps indexes by service type, host and port, so adding, removing, looking up and
+    filtering monitors take the same time with ten monitors as with tens of thousands.
+    """
+    def __init__(self):
+        """Create an empty registry"""
+        self._monitors = {}
+        self._ids = {}
+        self._by_service = {}
+        self._by_host = {}
+        self._by_port = {}
+        self._next_id = 1
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        """Returns the number of monitors in the registry"""
+        return len(self._monitors)
+
+    def __iter__(self):
+        """Iterate over a snapshot of the monitors, in the order they were added"""
+        with self._lock:
+            return iter(list(self._monitors.values()))
+
+    def __contains__(self, monitor_id):
+        """Returns True if a monitor with the given id is in the registry"""
+        return monitor_id in self._monitors
+
+    def items(self):
+        """Returns a snapshot of (id, monitor) pairs, in the order the monitors were added"""
+        with self._lock:
+            return list(self._monitors.items())
+
+    def add(self, monitor, monitor_id=None):
+        """Add a monitor, and return its id. An unused monitor_id can be given to keep an id from elsewhere."""
+        with self._lock:
+            if monitor_id is None or monitor_id in self._monitors:
+                monitor_id = self._next_id
+            self._next_id = max(self._next_id, monitor_id + 1)
+            self._monitors[monitor_id] = monitor
+            self._ids[id(monitor)] = monitor_id
+            for index, key in self._index_keys(monitor):
+                index.setdefault(key, {})[monitor_id] = None
+            return monitor_id
+
+    def remove(self, monitor_id):
+        """Remove the monitor with the given id from the registry, and return it. Returns None if there is none."""
+        with self._lock:
+            monitor = self._monitors.pop(monitor_id, None)
+            if monitor is None:
+                return None
+            self._ids.pop(id(monitor), None)
+            for index, key in self._index_keys(monitor):
+                members = index.get(key)
+                if members is not None:
+                    members.pop(monitor_id, None)
+                    if not members:
+                        del index[key]
+            return monitor
+
+    def get(self, monitor_id):
+        """Returns the monitor with the given id, or None"""
+        return self._monitors.get(monitor_id)
+
+    def get_id(self, monitor):
+        """Returns the id of a monitor in the registry, or None"""
+        return self._ids.get(id(monitor))
+
+    def find(self, service=None, host=None, port=None):
+        """
+        Returns (id, monitor) pairs for every monitor matching all the given filters, in the order they were
+        added. Only the smallest matching index is scanned.
+        """
+        with self._lock:
+            candidates = []
+            if service is not None:
+                candidates.append(self._by_service.get(service.upper(), {}))
+            if host is not None:
+                candidates.append(self._by_host.get(host.lower(), {}))
+            if port is not None:
+                candidates.append(self._by_port.get(port, {}))
+            if not candidates:
+                return list(self._monitors.items())
+            smallest = min(candidates, key=len)
+            return [(monitor_id, self._monitors[monitor_id]) for monitor_id in smallest
+                    if all(monitor_id in members for members in candidates)]
+
+    def count_by_service(self):
+        """Returns the number of monitors of each service type"""
+        with self._lock:
+            return {service: len(members) for service, members in self._by_service.items()}
+
+    def _index_keys(self, monitor):
+        """Returns the (index, key) pairs a monitor is filed under"""
+        keys = [(self._by_service, str(monitor.get_service()).upper()),
+                (self._by_host, str(monitor.get_target_host()).lower())]
+        port = monitor.get_port() if hasattr(monitor, "get_port") else None
+        if port is not None:
+            keys.append((self._by_port, port))
+        return keys
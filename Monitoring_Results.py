@@ -0,0 +1,226 @@
+import threading
+import time
+from Monitoring_Uptime import UptimeTracker
+from Monitoring_History import history_key
+
+
+HISTORY_LENGTH = 32
+
+
+class MonitorResult:
+    """The latest result of one monitor, with the latencies of its last few checks. Instances are never changed."""
+    __slots__ = ("_monitor_id", "_name", "_service", "_is_up", "_latency", "_checked_at", "_summary", "_history",
+                 "_version")
+
+    def __init__(self, monitor_id, name, service, is_up, latency, checked_at, summary, history, version):
+        """Create an instance of MonitorResult with given parameters. Latencies are in milliseconds."""
+        self._monitor_id = monitor_id
+        self._name = name
+        self._service = service
+        self._is_up = is_up
+        self._latency = latency
+        self._checked_at = checked_at
+        self._summary = summary
+        self._history = history
+        self._version = version
+
+    def get_monitor_id(self):
+        """Returns the registry id of the monitor"""
+        return self._monitor_id
+
+    def get_name(self):
+        """Returns the name of the monitor"""
+        return self._name
+
+    def get_service(self):
+        """Returns the service the monitor checks"""
+        return self._service
+
+    def is_up(self):
+        """Returns True if the last check found the service up, False if it did not"""
+        return self._is_up
+
+    def get_latency(self):
+        """Returns how long the last check took in milliseconds, or None if it is not known"""
+        return self._latency
+
+    def get_checked_at(self):
+        """Returns the time of the last check, in seconds since the epoch"""
+        return self._checked_at
+
+    def get_summary(self):
+        """Returns the first line of the last check's response"""
+        return self._summary
+
+    def get_history(self):
+        """Returns the latencies of the last checks, oldest first, with None for checks that found it down"""
+        return self._history
+
+    def get_version(self):
+        """Returns a number that grows every time the monitor reports a result"""
+        return self._version
+
+
+class ResultBoard:
+    """
+    ResultBoard keeps the latest result of every monitor, so views such as the dashboard can read a snapshot
+    without ever blocking the threads that run checks. Recording a result replaces the monitor's MonitorResult
+    with a new one, so a reader holding a result never sees it change. Every check is also counted in the
+    monitor's UptimeTracker, so its uptime over the last hour, day and month is known without keeping its
+    history. With a HistoryStore set, every check is kept in it for the long term as well. With an AlertManager
+    set, each check goes to it too, and only the changes of state it finds are announced, unless the board is
+    verbose. While the board is muted, results are only recorded, not printed.
+    """
+    def __init__(self):
+        """Create an empty, unmuted board"""
+        self._results = {}
+        self._uptime = {}
+        self._version = 0
+        self._muted = False
+        self._verbose = False
+        self._alerts = None
+        self._clock = time.time
+        self._history = None
+        self._history_keys = {}
+        self._lock = threading.Lock()
+
+    def get_handler(self, monitor_id):
+        """Returns a result handler, for set_result_handler, that records results under monitor_id"""
+        return lambda monitor, function_response: self.record(monitor_id, monitor, function_response)
+
+    def record(self, monitor_id, monitor, function_response):
+        """
+        Record the result of a check of monitor, and hand it to the alert manager, if one is set. The result is
+        printed unless the board is muted, but only if there is no alert manager, the board is verbose or the
+        monitor reports nothing but changes.
+        """
+        metrics = monitor.get_metrics()
+        latency = metrics.get("total") if metrics else None
+        is_up = monitor.is_up()
+        summary = str(function_response).strip().split("\n", 1)[0]
+        checked_at = self._clock()
+        with self._lock:
+            previous = self._results.get(monitor_id)
+            history = previous.get_history() if previous is not None else ()
+            history = (history + (latency if is_up else None,))[-HISTORY_LENGTH:]
+            self._version += 1
+            self._results[monitor_id] = MonitorResult(monitor_id, monitor.get_name(), monitor.get_service(), is_up,
+                                                      latency, checked_at, summary, history, self._version)
+            if is_up is not None:
+                tracker = self._uptime.get(monitor_id)
+                if tracker is None:
+                    tracker = self._uptime[monitor_id] = UptimeTracker()
+                tracker.record(is_up, checked_at)
+            muted = self._muted
+        alerts = self._alerts
+        changes_only = monitor.reports_changes_only()
+        if self._history is not None and is_up is not None and not changes_only:
+            # Worked out from the monitor's spec once, rather than on every check
+            key = self._history_keys.get(monitor_id)
+            if key is None:
+                key = self._history_keys[monitor_id] = history_key(monitor)
+            self._history.record(key, checked_at, is_up, latency)
+        if alerts is not None and is_up is not None and not changes_only:
+            alerts.record(monitor_id, monitor.get_name(), monitor.get_service(), is_up, summary, checked_at)
+        if not muted and (alerts is None or self._verbose or changes_only):
+            monitor.report(function_response)
+
+    def forget(self, monitor_id):
+        """Drop the results of a monitor that was removed"""
+        with self._lock:
+            self._results.pop(monitor_id, None)
+            self._uptime.pop(monitor_id, None)
+            self._history_keys.pop(monitor_id, None)
+            self._version += 1
+        if self._alerts is not None:
+            self._alerts.forget(monitor_id)
+
+    def get(self, monitor_id):
+        """Returns the latest MonitorResult of a monitor, or None if it has not reported yet"""
+        return self._results.get(monitor_id)
+
+    def get_uptime(self, monitor_id, window, objective=None):
+        """
+        Returns the uptime percentage of a monitor over the named window, such as '24h', or None if it has not been
+        checked within it. With an objective, in percent, returns (uptime, error budget left) instead.
+        """
+        with self._lock:
+            tracker = self._uptime.get(monitor_id)
+            if tracker is None:
+                return None if objective is None else (None, None)
+            now = self._clock()
+            if objective is None:
+                return tracker.get_uptime(window, now)
+            return tracker.get_uptime(window, now), tracker.get_error_budget(window, objective, now)
+
+    def get_state(self, monitor_id):
+        """
+        Returns what the board knows about a monitor as a plain dictionary (its last result, latency history and
+        uptime counts), which restore_state can load again, for example after a restart. Returns None if the
+        monitor has not reported.
+        """
+        with self._lock:
+            result = self._results.get(monitor_id)
+            tracker = self._uptime.get(monitor_id)
+            if result is None:
+                return None
+            return {"is_up": result.is_up(), "latency": result.get_latency(), "checked_at": result.get_checked_at(),
+                    "summary": result.get_summary(), "history": list(result.get_history()),
+                    "uptime": tracker.get_state() if tracker is not None else None}
+
+    def restore_state(self, monitor_id, monitor, state):
+        """Load the state of a monitor saved by get_state, under monitor_id, without printing or alerting it"""
+        with self._lock:
+            self._version += 1
+            self._results[monitor_id] = MonitorResult(monitor_id, monitor.get_name(), monitor.get_service(),
+                                                      state["is_up"], state["latency"], state["checked_at"],
+                                                      state["summary"], tuple(state["history"])[-HISTORY_LENGTH:],
+                                                      self._version)
+            if state.get("uptime") is not None:
+                tracker = self._uptime[monitor_id] = UptimeTracker()
+                tracker.set_state(state["uptime"])
+
+    def get_version(self):
+        """Returns a number that grows every time any result is recorded or forgotten"""
+        return self._version
+
+    def snapshot(self):
+        """Returns (version, a copy of the results by monitor id)"""
+        with self._lock:
+            return self._version, dict(self._results)
+
+    def set_clock(self, clock):
+        """Time results with clock, a function returning seconds since the epoch, instead of time.time"""
+        self._clock = clock
+
+    def get_clock(self):
+        """Returns the function results are timed with"""
+        return self._clock
+
+    def set_history(self, history):
+        """Keep every check in history, a HistoryStore, as well. Monitors that only report changes are left out."""
+        self._history = history
+
+    def get_history(self):
+        """Returns the HistoryStore checks are kept in, or None"""
+        return self._history
+
+    def set_muted(self, muted):
+        """Stop (True) or resume (False) printing results as they are recorded"""
+        self._muted = muted
+
+    def set_alert_manager(self, alert_manager):
+        """Hand every check to alert_manager, and print only changes of state unless the board is verbose"""
+        self._alerts = alert_manager
+
+    def get_alert_manager(self):
+        """Returns the AlertManager checks are handed to, or None"""
+        return self._alerts
+
+    def set_verbose(self, verbose):
+        """Print every result (True), or only changes of state when there is an alert manager (False)"""
+        self._verbose = verbose
+
+    def is_muted(self):
+        """Returns True if results are being recorded without being printed"""
+        return self._muted
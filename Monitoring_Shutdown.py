@@ -0,0 +1,44 @@
+import time
+
+
+DEFAULT_SHUTDOWN_TIMEOUT = 1.0
+
+
+class ShutdownCoordinator:
+    """
+    ShutdownCoordinator stops monitors and servers together, against one deadline. Stopping one after another
+    lets every wait add up. Instead, every one of them is asked to stop first, which wakes waiting monitors and
+    blocked server sockets at once. Then they are all joined until a single deadline. Monitor and server threads
+    are daemon threads, so anything still finishing a check when the deadline passes does not hold up exit.
+    """
+    def __init__(self, timeout=DEFAULT_SHUTDOWN_TIMEOUT):
+        """Create a coordinator that waits at most timeout seconds in total for everything it stops"""
+        self._timeout = timeout
+        self._members = []
+
+    def add(self, member):
+        """Add a monitor or server, or anything else with stop() and join(timeout) methods, to be shut down"""
+        self._members.append(member)
+
+    def add_all(self, members):
+        """Add every monitor or server in members"""
+        self._members.extend(members)
+
+    def get_timeout(self):
+        """Returns the most seconds shutdown waits in total"""
+        return self._timeout
+
+    def shutdown(self):
+        """
+        Ask everything to stop, then wait until it has or the deadline has passed. Returns the members that were
+        still running at the deadline.
+        """
+        deadline = time.monotonic() + self._timeout
+        for member in self._members:
+            member.stop()
+        still_running = []
+        for member in self._members:
+            if not member.join(max(0.0, deadline - time.monotonic())):
+                still_running.append(member)
+        self._members = []
+        return still_running
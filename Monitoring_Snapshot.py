@@ -0,0 +1,140 @@
+import json
+import os
+import threading
+import time
+import zlib
+from Monitoring_Configuration import TCPServer, UDPServer, monitor_from_spec
+from Monitor_Table import MonitorTable
+from Monitoring_Agents import RemoteMonitor
+from Name_Resolution import get_resolver_cache
+
+
+SNAPSHOT_MAGIC = b"NMSNAP1\n"
+_SERVER_CLASSES = {"TCPServer": TCPServer, "UDPServer": UDPServer}
+_SPEC_BUILDERS = {"MonitorTable": MonitorTable.from_spec}
+
+
+def build_snapshot(monitor_registry, server_list, result_board=None):
+    """
+    Returns a plain dictionary of everything needed to set this process up again: the spec and id of every
+    monitor, every server, and cached state (the resolved addresses of hosts, and each monitor's last result,
+    latency history and uptime counts on result_board). Monitors without a spec, such as those of agents, are
+    left out.
+    """
+    monitors = []
+    for monitor_id, monitor in monitor_registry.items():
+        if isinstance(monitor, RemoteMonitor):
+            continue
+        spec = monitor.get_spec()
+        state = result_board.get_state(monitor_id) if result_board is not None else None
+        monitors.append({"id": monitor_id, "spec": spec, "state": state})
+    servers = [{"class": type(server).__name__, "name": server.get_name(), "port": server.get_port()}
+               for server in server_list if type(server).__name__ in _SERVER_CLASSES]
+    return {"saved_at": time.time(), "monitors": monitors, "servers": servers,
+            "resolver": get_resolver_cache().export_entries()}
+
+
+def write_snapshot(path, snapshot):
+    """
+    Write a snapshot to path as compressed JSON. It is written to a temporary file that then replaces path, so a
+    crash while saving never leaves a half written snapshot behind.
+    """
+    data = SNAPSHOT_MAGIC + zlib.compress(json.dumps(snapshot, separators=(",", ":")).encode(), 6)
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "wb") as snapshot_file:
+        snapshot_file.write(data)
+        snapshot_file.flush()
+        os.fsync(snapshot_file.fileno())
+    os.replace(temporary_path, path)
+    return len(data)
+
+
+def read_snapshot(path):
+    """Returns the snapshot saved at path. Raises OSError if it cannot be read and ValueError if it is not valid."""
+    with open(path, "rb") as snapshot_file:
+        data = snapshot_file.read()
+    if not data.startswith(SNAPSHOT_MAGIC):
+        raise ValueError(f"{path} is not a monitoring snapshot")
+    try:
+        return json.loads(zlib.decompress(data[len(SNAPSHOT_MAGIC):]))
+    except (zlib.error, UnicodeDecodeError) as e:
+        raise ValueError(f"{path} is damaged: {e}")
+
+
+def load_snapshot(snapshot):
+    """
+    Load the cached host addresses of a snapshot into the resolver cache, and return (monitor id, inactive
+    monitor, saved state or None) for every monitor and an inactive server for every server in it. Addresses
+    are only kept for the time they had left to live when the snapshot was saved.
+    """
+    elapsed = max(0.0, time.time() - snapshot.get("saved_at", time.time()))
+    get_resolver_cache().import_entries((host, addresses, ttl - elapsed)
+                                        for host, addresses, ttl in snapshot.get("resolver", ()))
+    monitors = []
+    for entry in snapshot.get("monitors", ()):
+        spec = entry["spec"]
+        build = _SPEC_BUILDERS.get(spec["class"], monitor_from_spec)
+        monitors.append((entry["id"], build(spec), entry.get("state")))
+    servers = [_SERVER_CLASSES[server["class"]](server["name"], server["port"])
+               for server in snapshot.get("servers", ()) if server["class"] in _SERVER_CLASSES]
+    return monitors, servers
+
+
+class SnapshotWriter:
+    """
+    SnapshotWriter saves a snapshot to a file, from a thread of its own, whenever mark_changed has been called,
+    and no more than once every delay seconds, so adding a thousand monitors writes a handful of snapshots, not a
+    thousand. It also saves every refresh seconds, to keep the cached state recent, and once more when stopped.
+    build is called with no arguments and returns the snapshot to save.
+    """
+    def __init__(self, path, build, delay=2.0, refresh=300.0):
+        """Create a writer saving the snapshots build returns to path. It starts saving when start is called."""
+        self._path = path
+        self._build = build
+        self._delay = delay
+        self._refresh = refresh
+        self._changed = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def get_path(self):
+        """Returns the path of the snapshot file"""
+        return self._path
+
+    def start(self):
+        """Start the thread that saves snapshots"""
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def mark_changed(self):
+        """Note that the configuration changed, so a snapshot is saved soon"""
+        self._changed.set()
+
+    def save(self):
+        """Save a snapshot now. Returns the number of bytes written, or None if it could not be saved."""
+        try:
+            return write_snapshot(self._path, self._build())
+        except (OSError, ValueError, TypeError) as e:
+            print(f"Could not save a snapshot to {self._path}: {e}")
+            return None
+
+    def stop(self):
+        """Ask the thread to save a last snapshot and stop"""
+        self._stop_event.set()
+        self._changed.set()
+
+    def join(self, timeout=None):
+        """Wait up to timeout seconds (forever if None) for the thread to stop. Returns True if it has stopped."""
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self._thread is None or not self._thread.is_alive()
+
+    def _run(self):
+        """Save after changes, at most once every delay seconds, and every refresh seconds regardless"""
+        while not self._stop_event.is_set():
+            self._changed.wait(self._refresh)
+            if self._stop_event.wait(self._delay):
+                break
+            self._changed.clear()
+            self.save()
+        self.save()
@@ -0,0 +1,228 @@
+import collections
+import math
+import os
+import sys
+import threading
+import time
+from Monitoring_Uptime import SlidingWindowCounter
+
+
+RATE_WINDOW = 60
+_HISTOGRAM_GROWTH = 1.25
+_HISTOGRAM_BUCKETS = 96
+
+
+class DurationHistogram:
+    """
+    Counts durations in buckets that grow by a quarter each, from 0.01ms up to about an hour, so percentiles
+    are known to within a few percent from a fixed 96 counters, however many durations were recorded.
+    """
+    def __init__(self):
+        """Create an empty histogram"""
+        self._counts = [0] * _HISTOGRAM_BUCKETS
+        self._count = 0
+        self._total = 0.0
+        self._max = 0.0
+
+    def record(self, milliseconds):
+        """Count one duration, in milliseconds"""
+        index = 0
+        if milliseconds > 0.01:
+            index = min(_HISTOGRAM_BUCKETS - 1, int(math.log(milliseconds / 0.01, _HISTOGRAM_GROWTH)) + 1)
+        self._counts[index] += 1
+        self._count += 1
+        self._total += milliseconds
+        self._max = max(self._max, milliseconds)
+
+    def get_count(self):
+        """Returns the number of durations recorded"""
+        return self._count
+
+    def get_mean(self):
+        """Returns the mean duration, or None if none were recorded"""
+        return self._total / self._count if self._count else None
+
+    def get_max(self):
+        """Returns the longest duration, or None if none were recorded"""
+        return self._max if self._count else None
+
+    def get_percentile(self, percent):
+        """Returns the upper bound of the bucket the given percentile falls in, or None if none were recorded"""
+        if not self._count:
+            return None
+        rank = math.ceil(self._count * percent / 100)
+        seen = 0
+        for index, count in enumerate(self._counts):
+            seen += count
+            if seen >= rank:
+                return min(0.01 * _HISTOGRAM_GROWTH ** index, self._max)
+        return self._max
+
+
+class ServiceStats:
+    """The probe durations, scheduling lag and probe rate of every monitor of one service type"""
+    def __init__(self):
+        """Create empty statistics"""
+        self._durations = DurationHistogram()
+        self._lag = DurationHistogram()
+        self._rate = SlidingWindowCounter(RATE_WINDOW, 1)
+
+    def get_durations(self):
+        """Returns the DurationHistogram of how long probes took"""
+        return self._durations
+
+    def get_lag(self):
+        """Returns the DurationHistogram of how late checks started, compared to when they were due"""
+        return self._lag
+
+    def get_rate(self, now=None):
+        """Returns the probes per second over the last RATE_WINDOW seconds"""
+        return sum(self._rate.get_counts(now)) / RATE_WINDOW
+
+    def record_probe(self, duration, count=1, now=None):
+        """Count count probes, sent together, that took duration milliseconds"""
+        self._durations.record(duration)
+        self._rate.record(True, now, count)
+
+    def record_lag(self, lag):
+        """Count a check that started lag milliseconds after it was due"""
+        self._lag.record(lag)
+
+
+class RuntimeStats:
+    """
+    RuntimeStats measures how the application itself is keeping up: how long probes take, how late checks start
+    compared to when they were due, probes per second, per service type, and the depth of queues registered as
+    gauges. Recording takes a lock and a few additions, so it can stay on in the checking threads.
+    """
+    def __init__(self):
+        """Create empty statistics"""
+        self._services = {}
+        self._gauges = {}
+        self._started = time.time()
+        self._lock = threading.Lock()
+
+    def _get_service(self, service):
+        """Returns the ServiceStats of a service, creating it the first time. Called with the lock held."""
+        stats = self._services.get(service)
+        if stats is None:
+            stats = self._services[service] = ServiceStats()
+        return stats
+
+    def record_probe(self, service, duration, count=1):
+        """Count a probe of the service type that took duration milliseconds, or a batch of count such probes"""
+        with self._lock:
+            self._get_service(service).record_probe(duration, count)
+
+    def record_lag(self, service, lag):
+        """Count a check of the service type that started lag milliseconds after it was due"""
+        with self._lock:
+            self._get_service(service).record_lag(max(0.0, lag))
+
+    def get_services(self):
+        """Returns a copy of the ServiceStats by service type"""
+        with self._lock:
+            return dict(self._services)
+
+    def add_gauge(self, name, read):
+        """Show the value read() returns, such as the length of a queue, under name"""
+        self._gauges[name] = read
+
+    def remove_gauge(self, name):
+        """Stop showing a gauge"""
+        self._gauges.pop(name, None)
+
+    def get_gauges(self):
+        """Returns the current value of every gauge, by name. Gauges that fail to read are left out."""
+        values = {}
+        for name, read in list(self._gauges.items()):
+            try:
+                values[name] = read()
+            except Exception:
+                continue
+        return values
+
+    def get_uptime(self):
+        """Returns the seconds since the statistics were created"""
+        return time.time() - self._started
+
+
+class SamplingProfiler:
+    """
+    SamplingProfiler looks at the stack of every thread interval seconds, from a thread of its own, and counts
+    the functions it finds running. Unlike cProfile, which only sees the thread it was started on, it covers
+    every monitor and server thread, and it costs the same however many calls they make.
+    """
+    def __init__(self, interval=0.005):
+        """Create a profiler sampling every interval seconds. It starts sampling when start is called."""
+        self._interval = interval
+        self._own = collections.Counter()
+        self._total = collections.Counter()
+        self._samples = 0
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start sampling"""
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop sampling"""
+        self._stop_event.set()
+
+    def join(self, timeout=None):
+        """Wait up to timeout seconds (forever if None) for sampling to stop. Returns True if it has stopped."""
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self._thread is None or not self._thread.is_alive()
+
+    def is_running(self):
+        """Returns True while the profiler is sampling"""
+        return self._thread is not None and self._thread.is_alive()
+
+    def get_sample_count(self):
+        """Returns the number of thread stacks sampled"""
+        return self._samples
+
+    def _run(self):
+        """Sample every other thread's stack until stopped"""
+        own_id = threading.get_ident()
+        while not self._stop_event.wait(self._interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                self._samples += 1
+                self._own[_describe_frame(frame)] += 1
+                seen = set()
+                while frame is not None:
+                    function = _describe_frame(frame)
+                    if function not in seen:
+                        seen.add(function)
+                        self._total[function] += 1
+                    frame = frame.f_back
+
+    def get_report(self, limit=20):
+        """Returns the functions seen most often, as lines of text"""
+        if not self._samples:
+            return "No samples were taken"
+        lines = [f"{self._samples} samples. Functions by share of samples running themselves, and including what "
+                 f"they called:", f"{'SELF':>7} {'TOTAL':>7}  FUNCTION"]
+        for function, count in self._own.most_common(limit):
+            lines.append(f"{100 * count / self._samples:6.1f}% {100 * self._total[function] / self._samples:6.1f}%  "
+                         f"{function}")
+        return "\n".join(lines)
+
+
+def _describe_frame(frame):
+    """Returns 'function (file:line)' for the function a frame is running"""
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+_runtime_stats = RuntimeStats()
+
+
+def get_runtime_stats():
+    """Returns the RuntimeStats of this process"""
+    return _runtime_stats
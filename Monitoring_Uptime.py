@@ -0,0 +1,128 @@
+import time
+
+
+UPTIME_WINDOWS = (("1h", 3600, 60), ("24h", 86400, 900), ("30d", 30 * 86400, 6 * 3600))
+DEFAULT_OBJECTIVE = 99.9
+
+
+class SlidingWindowCounter:
+    """
+    Counts the checks that were up and down over the last span seconds. The span is split into buckets of
+    bucket_seconds, kept in a ring, with running totals over the whole ring. Recording a check only touches its
+    bucket and the totals, and buckets that fall out of the window are subtracted from the totals as time moves
+    on, so recording and reading both take constant time, however many checks the window holds. The window
+    moves forward a bucket at a time, so it covers between span - bucket_seconds and span seconds.
+    """
+    def __init__(self, span, bucket_seconds):
+        """Create an empty counter over span seconds, in buckets of bucket_seconds"""
+        self._bucket_seconds = bucket_seconds
+        self._bucket_count = max(1, span // bucket_seconds)
+        self._up = [0] * self._bucket_count
+        self._down = [0] * self._bucket_count
+        self._up_total = 0
+        self._down_total = 0
+        self._current = None
+
+    def _advance(self, now):
+        """Move the window forward to the bucket of now, clearing every bucket it passes over"""
+        bucket = int(now // self._bucket_seconds)
+        if self._current is None:
+            self._current = bucket
+            return
+        if bucket <= self._current:
+            return
+        for passed in range(self._current + 1, min(bucket, self._current + self._bucket_count) + 1):
+            slot = passed % self._bucket_count
+            self._up_total -= self._up[slot]
+            self._down_total -= self._down[slot]
+            self._up[slot] = 0
+            self._down[slot] = 0
+        self._current = bucket
+
+    def record(self, is_up, now=None, count=1):
+        """Count count checks, made at now (seconds since the epoch, default the current time)"""
+        self._advance(time.time() if now is None else now)
+        slot = self._current % self._bucket_count
+        if is_up:
+            self._up[slot] += count
+            self._up_total += count
+        else:
+            self._down[slot] += count
+            self._down_total += count
+
+    def get_counts(self, now=None):
+        """Returns (checks up, checks down) within the window at now"""
+        self._advance(time.time() if now is None else now)
+        return self._up_total, self._down_total
+
+    def get_state(self):
+        """
+        Returns the counts of the counter as a plain dictionary, which set_state can load again. Only buckets
+        with checks in them are listed, as [slot, up, down].
+        """
+        buckets = [[slot, up, down] for slot, (up, down) in enumerate(zip(self._up, self._down)) if up or down]
+        return {"current": self._current, "buckets": self._bucket_count, "counts": buckets}
+
+    def set_state(self, state):
+        """Load counts saved by get_state. They are ignored if the bucket layout has changed since."""
+        if state["buckets"] != self._bucket_count:
+            return
+        self._current = state["current"]
+        self._up = [0] * self._bucket_count
+        self._down = [0] * self._bucket_count
+        for slot, up, down in state["counts"]:
+            self._up[slot] = up
+            self._down[slot] = down
+        self._up_total = sum(self._up)
+        self._down_total = sum(self._down)
+
+
+class UptimeTracker:
+    """The up and down counts of one monitor over each window of UPTIME_WINDOWS, such as the last hour"""
+    def __init__(self, windows=UPTIME_WINDOWS):
+        """Create a tracker with a SlidingWindowCounter for each (name, span, bucket seconds) of windows"""
+        self._counters = {name: SlidingWindowCounter(span, bucket_seconds) for name, span, bucket_seconds in windows}
+
+    def record(self, is_up, now=None):
+        """Count one check in every window"""
+        for counter in self._counters.values():
+            counter.record(is_up, now)
+
+    def get_state(self):
+        """Returns the counts of every window as a plain dictionary, which set_state can load again"""
+        return {name: counter.get_state() for name, counter in self._counters.items()}
+
+    def set_state(self, state):
+        """Load counts saved by get_state, for the windows that still exist"""
+        for name, counter_state in state.items():
+            if name in self._counters:
+                self._counters[name].set_state(counter_state)
+
+    def get_window_names(self):
+        """Returns the names of the windows, shortest first"""
+        return list(self._counters)
+
+    def get_counts(self, window, now=None):
+        """Returns (checks up, checks down) within the named window"""
+        return self._counters[window].get_counts(now)
+
+    def get_uptime(self, window, now=None):
+        """Returns the percentage of checks within the named window that were up, or None if there were none"""
+        up, down = self.get_counts(window, now)
+        if up + down == 0:
+            return None
+        return 100.0 * up / (up + down)
+
+    def get_error_budget(self, window, objective=DEFAULT_OBJECTIVE, now=None):
+        """
+        Returns the percentage of the error budget left within the named window, for an uptime objective in
+        percent. The budget is the number of failed checks the objective allows; it is negative once overspent,
+        and None if there were no checks.
+        """
+        up, down = self.get_counts(window, now)
+        if up + down == 0:
+            return None
+        allowed = (up + down) * (100.0 - objective) / 100.0
+        if allowed <= 0:
+            return 100.0 if down == 0 else float("-inf")
+        return 100.0 * (1 - down / allowed)
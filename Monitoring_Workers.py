@@ -0,0 +1,284 @@
+import bisect
+import hashlib
+import multiprocessing
+import queue
+import signal
+import struct
+import threading
+import time
+from multiprocessing.connection import wait
+from Monitoring_Configuration import monitor_from_spec
+from Monitoring_Shutdown import ShutdownCoordinator, DEFAULT_SHUTDOWN_TIMEOUT
+from Probe_Scheduling import ProbeRateLimiter, ProbeCoalescer, set_probe_rate_limiter, set_probe_coalescer
+
+
+# Monitor id, timestamp, status (1 up, 0 down, -1 unknown), length of the packed metrics and of the message,
+# followed by the metrics (name length, name, value in milliseconds) and the utf-8 encoded message
+RESULT_HEADER = struct.Struct("!IdbHI")
+METRIC_VALUE = struct.Struct("!d")
+
+
+def pack_result(monitor_id, timestamp, is_up, metrics, message):
+    """Pack a single check result into the compact binary record sent from a worker process to the parent"""
+    encoded_metrics = [(name.encode(), value) for name, value in metrics.items()]
+    packed_metrics = b"".join(bytes([len(name)]) + name + METRIC_VALUE.pack(value) for name, value in encoded_metrics)
+    data = message.encode()
+    status = -1 if is_up is None else int(is_up)
+    return RESULT_HEADER.pack(monitor_id, timestamp, status, len(packed_metrics), len(data)) + packed_metrics + data
+
+
+def unpack_results(batch):
+    """Yields (monitor id, timestamp, is up, metrics, message) for every record packed into a batch by pack_result"""
+    offset = 0
+    while offset < len(batch):
+        monitor_id, timestamp, status, metrics_length, length = RESULT_HEADER.unpack_from(batch, offset)
+        offset += RESULT_HEADER.size
+        metrics = {}
+        end = offset + metrics_length
+        while offset < end:
+            name_length = batch[offset]
+            name = batch[offset + 1:offset + 1 + name_length].decode()
+            offset += 1 + name_length
+            metrics[name] = METRIC_VALUE.unpack_from(batch, offset)[0]
+            offset += METRIC_VALUE.size
+        is_up = None if status < 0 else bool(status)
+        yield monitor_id, timestamp, is_up, metrics, batch[offset:offset + length].decode()
+        offset += length
+
+
+def _ring_hash(key):
+    """Returns the 32 bit position of a key on the consistent hash ring"""
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=4).digest(), "big")
+
+
+class ConsistentHashRing:
+    """
+    Maps monitoring targets onto worker shards. Every shard is placed on the ring many times (virtual nodes) so
+    that targets spread evenly, and a target always maps to the same shard, so all probes to a host land together.
+    """
+    def __init__(self, shard_count, virtual_nodes=160):
+        """Create a ring with shard_count shards, each placed virtual_nodes times"""
+        points = sorted((_ring_hash(f"shard-{shard}-{node}"), shard)
+                        for shard in range(shard_count) for node in range(virtual_nodes))
+        self._keys = [point[0] for point in points]
+        self._shards = [point[1] for point in points]
+
+    def get_shard(self, target):
+        """Returns the shard number that the given target belongs to"""
+        index = bisect.bisect(self._keys, _ring_hash(target.lower())) % len(self._keys)
+        return self._shards[index]
+
+
+class ShardedMonitor:
+    """
+    ShardedMonitor stands in for a monitoring configuration that runs on a worker process. All get methods are
+    answered by a local, inactive copy of the configuration, so the CLI can view and delete it like any other.
+    """
+    def __init__(self, pool, monitor):
+        """Wrap the inactive monitor so that activate and deactivate are sent to the worker pool"""
+        self._pool = pool
+        self._monitor = monitor
+        self._monitor_id = None
+        self._shard = None
+
+    def __getattr__(self, attribute):
+        """Answer everything that is not about running the monitor from the local copy"""
+        return getattr(self._monitor, attribute)
+
+    def __str__(self):
+        """Specify how this class should be printed to the CLI"""
+        return str(self._monitor)
+
+    def get_shard(self):
+        """Returns the worker shard this monitor runs on, or None if it is not active"""
+        return self._shard
+
+    def activate(self):
+        """Start the monitor on the worker process its target hashes to"""
+        self._monitor_id, self._shard = self._pool.add(self)
+
+    def deactivate(self):
+        """Stop the monitor on its worker process"""
+        self.stop()
+        return
+
+    def stop(self):
+        """Tell the worker process to stop the monitor. The worker stops it without the parent waiting."""
+        if self._monitor_id is not None:
+            self._pool.remove(self._monitor_id, self._shard)
+            self._monitor_id = None
+
+    def join(self, timeout=None):
+        """The monitor runs on a worker, so there is nothing to wait for here. Returns True."""
+        return True
+
+
+class MonitoringWorkerPool:
+    """
+    MonitoringWorkerPool runs monitoring configurations on worker_count processes, so that checks are not all
+    bound by one interpreter lock. Each worker sends its results back over a pipe in batches of packed records,
+    and a reader thread in the parent hands them to the matching ShardedMonitor. When given a ProbeRateLimiter,
+    each worker gets an equal share of its global rate, and the full rate per destination, since every
+    destination is probed from a single worker. Likewise, monitors with the same probe key always share a worker,
+    so each worker can coalesce their probes with a ProbeCoalescer of the given window.
+    """
+    def __init__(self, worker_count, rate_limiter=None, coalesce_window=0):
+        """Create a pool of worker_count processes. The processes are started by the start method."""
+        self._worker_count = worker_count
+        self._rate_limiter_spec = rate_limiter.get_spec() if rate_limiter is not None else None
+        self._coalesce_window = coalesce_window
+        self._ring = ConsistentHashRing(worker_count)
+        self._context = multiprocessing.get_context("spawn")
+        self._processes = []
+        self._connections = []
+        self._send_lock = threading.Lock()
+        self._monitors = {}
+        self._next_id = 1
+        self._reader_thread = None
+
+    def get_worker_count(self):
+        """Returns the number of worker processes"""
+        return self._worker_count
+
+    def start(self):
+        """Start the worker processes and the thread that reads their results"""
+        for shard in range(self._worker_count):
+            parent_connection, child_connection = self._context.Pipe()
+            process = self._context.Process(target=_worker_main,
+                                            args=(child_connection, self._rate_limiter_spec, self._worker_count,
+                                                  self._coalesce_window),
+                                            name=f"monitoring-shard-{shard}", daemon=True)
+            process.start()
+            child_connection.close()
+            self._processes.append(process)
+            self._connections.append(parent_connection)
+        self._reader_thread = threading.Thread(target=self._read_results, daemon=True)
+        self._reader_thread.start()
+
+    def wrap(self, monitor):
+        """Returns a ShardedMonitor that will run the given inactive monitor on this pool"""
+        return ShardedMonitor(self, monitor)
+
+    def add(self, sharded_monitor):
+        """Send a monitor to the shard its target hashes to. Returns the monitor id and shard number."""
+        shard = self._ring.get_shard(sharded_monitor.get_target_host())
+        with self._send_lock:
+            monitor_id = self._next_id
+            self._next_id += 1
+            self._monitors[monitor_id] = sharded_monitor
+            self._connections[shard].send(("add", monitor_id, sharded_monitor.get_spec()))
+        return monitor_id, shard
+
+    def remove(self, monitor_id, shard):
+        """Stop the monitor with the given id on its shard"""
+        with self._send_lock:
+            self._monitors.pop(monitor_id, None)
+            try:
+                self._connections[shard].send(("remove", monitor_id))
+            except (BrokenPipeError, OSError):
+                pass
+
+    def _read_results(self):
+        """Read batches of results from every worker, and hand each result to its monitor"""
+        connections = list(self._connections)
+        while connections:
+            for connection in wait(connections):
+                try:
+                    batch = connection.recv_bytes()
+                except (EOFError, OSError):
+                    connections.remove(connection)
+                    continue
+                for monitor_id, timestamp, is_up, metrics, message in unpack_results(batch):
+                    sharded_monitor = self._monitors.get(monitor_id)
+                    if sharded_monitor is not None:
+                        sharded_monitor.set_last_result(is_up, metrics)
+                        sharded_monitor.handle_result(message)
+
+    def shutdown(self, timeout=15):
+        """
+        Tell every worker to stop its monitors and exit, and wait up to timeout seconds for them to do so. Workers
+        that are still running after that are terminated.
+        """
+        with self._send_lock:
+            for connection in self._connections:
+                try:
+                    connection.send(("stop", timeout * 0.8))
+                except (BrokenPipeError, OSError):
+                    pass
+        deadline = time.monotonic() + timeout
+        for process in self._processes:
+            process.join(max(0, deadline - time.monotonic()))
+            if process.is_alive():
+                process.terminate()
+        if self._reader_thread is not None:
+            self._reader_thread.join(1)
+        for connection in self._connections:
+            connection.close()
+
+
+def _worker_main(connection, rate_limiter_spec=None, worker_count=1, coalesce_window=0):
+    """
+    Entry point of a worker process. Receives add, remove and stop commands from the parent, runs the monitors it
+    is given, and streams their results back to the parent.
+    """
+    # Ctrl+C reaches every process in the group; only the parent decides when workers stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if rate_limiter_spec is not None:
+        set_probe_rate_limiter(ProbeRateLimiter.from_spec(rate_limiter_spec, worker_count))
+    if coalesce_window > 0:
+        set_probe_coalescer(ProbeCoalescer(coalesce_window))
+    monitors = {}
+    stop_timeout = DEFAULT_SHUTDOWN_TIMEOUT
+    outbox = queue.Queue()
+    sender = threading.Thread(target=_send_results, args=(connection, outbox), daemon=True)
+    sender.start()
+    try:
+        while True:
+            command = connection.recv()
+            if command[0] == "add":
+                monitor_id, spec = command[1], command[2]
+                monitor = monitor_from_spec(spec)
+                monitor.set_result_handler(lambda monitor, response, monitor_id=monitor_id:
+                                           outbox.put(pack_result(monitor_id, time.time(), monitor.is_up(),
+                                                                  monitor.get_metrics(), str(response))))
+                monitors[monitor_id] = monitor
+                monitor.activate()
+            elif command[0] == "remove":
+                monitor = monitors.pop(command[1], None)
+                if monitor is not None:
+                    monitor.stop()
+            elif command[0] == "stop":
+                stop_timeout = command[1]
+                break
+    except EOFError:
+        pass
+    finally:
+        coordinator = ShutdownCoordinator(stop_timeout)
+        coordinator.add_all(monitors.values())
+        coordinator.shutdown()
+        outbox.put(None)
+        sender.join()
+        connection.close()
+
+
+def _send_results(connection, outbox, max_batch=256):
+    """Send queued result records to the parent, joining whatever has queued up into one batch per send"""
+    while True:
+        record = outbox.get()
+        if record is None:
+            return
+        batch = [record]
+        while len(batch) < max_batch:
+            try:
+                record = outbox.get_nowait()
+            except queue.Empty:
+                break
+            if record is None:
+                break
+            batch.append(record)
+        try:
+            connection.send_bytes(b"".join(batch))
+        except (BrokenPipeError, OSError):
+            return
+        if record is None:
+            return
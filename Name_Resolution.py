@@ -0,0 +1,163 @@
+import ipaddress
+import socket
+import threading
+import time
+import dns.resolver
+import dns.exception
+from concurrent.futures import ThreadPoolExecutor
+
+
+class _ResolverEntry:
+    """The cached result of resolving one hostname: its addresses, or the error that resolving it gave"""
+    __slots__ = ("addresses", "error", "expires", "refresh_at")
+
+    def __init__(self, addresses, error, ttl):
+        """Create an entry that expires ttl seconds from now, and should be refreshed at 80% of that"""
+        now = time.monotonic()
+        self.addresses = addresses
+        self.error = error
+        self.expires = now + ttl
+        self.refresh_at = now + ttl * 0.8
+
+
+class HostResolverCache:
+    """
+    HostResolverCache resolves hostnames for every probe in the process, and keeps the addresses for as long as
+    their DNS records allow (clamped between min_ttl and max_ttl). Names that do not resolve are remembered for
+    negative_ttl seconds. Names that are looked up close to expiry are refreshed in the background, so probes of
+    a steadily monitored host never wait on resolution after the first lookup. Names DNS does not know, such as
+    ones in the hosts file, fall back to the system resolver and are kept for default_ttl seconds.
+    """
+    def __init__(self, default_ttl=300, negative_ttl=30, min_ttl=5, max_ttl=3600, lookup_timeout=3,
+                 max_workers=8):
+        """Create an empty cache with given parameters"""
+        self._default_ttl = default_ttl
+        self._negative_ttl = negative_ttl
+        self._min_ttl = min_ttl
+        self._max_ttl = max_ttl
+        self._lookup_timeout = lookup_timeout
+        self._entries = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="resolver")
+
+    def resolve(self, host, family=socket.AF_UNSPEC):
+        """
+        Returns (addresses, seconds spent resolving) for host, where addresses is a list of (family, address)
+        pairs, limited to the given family unless it is AF_UNSPEC. Raises socket.gaierror if the host does not
+        resolve, or has no address of the family.
+        """
+        start = time.perf_counter()
+        literal = _literal_address(host)
+        if literal is not None:
+            entry = _ResolverEntry([literal], None, self._max_ttl)
+        else:
+            now = time.monotonic()
+            with self._lock:
+                entry = self._entries.get(host)
+                if entry is not None and now < entry.expires:
+                    if now >= entry.refresh_at and entry.error is None and host not in self._pending:
+                        self._pending[host] = self._executor.submit(self._refresh, host)
+                    future = None
+                else:
+                    future = self._pending.get(host)
+                    if future is None:
+                        future = self._executor.submit(self._refresh, host)
+                        self._pending[host] = future
+            if future is not None:
+                entry = future.result()
+        elapsed = time.perf_counter() - start
+        if entry.error is not None:
+            raise socket.gaierror(socket.EAI_NONAME, entry.error)
+        addresses = [address for address in entry.addresses if family == socket.AF_UNSPEC or address[0] == family]
+        if not addresses:
+            raise socket.gaierror(socket.EAI_NONAME, f"{host} has no address of the requested family")
+        return addresses, elapsed
+
+    def forget(self, host):
+        """Drop any cached result for host, so the next probe resolves it again"""
+        with self._lock:
+            self._entries.pop(host, None)
+
+    def export_entries(self):
+        """
+        Returns (host, addresses, seconds left to live) for every hostname that resolved and has not expired, so
+        the cache can be saved and loaded by import_entries in a later run
+        """
+        now = time.monotonic()
+        with self._lock:
+            return [(host, list(entry.addresses), entry.expires - now) for host, entry in self._entries.items()
+                    if entry.error is None and entry.expires > now]
+
+    def import_entries(self, entries):
+        """Add entries returned by export_entries. Hosts already in the cache keep their own entry."""
+        with self._lock:
+            for host, addresses, ttl in entries:
+                if ttl > 0 and host not in self._entries:
+                    self._entries[host] = _ResolverEntry([tuple(address) for address in addresses], None, ttl)
+
+    def get_size(self):
+        """Returns the number of hostnames in the cache"""
+        return len(self._entries)
+
+    def _refresh(self, host):
+        """Resolve host, store the result in the cache, and return it"""
+        try:
+            entry = self._lookup(host)
+        finally:
+            with self._lock:
+                self._pending.pop(host, None)
+        with self._lock:
+            self._entries[host] = entry
+        return entry
+
+    def _lookup(self, host):
+        """Resolve host through DNS, and through the system resolver if DNS has no answer"""
+        try:
+            addresses, ttl = self._query_dns(host)
+        except dns.exception.DNSException:
+            try:
+                address_info = socket.getaddrinfo(host, None, proto=socket.IPPROTO_TCP)
+            except (socket.gaierror, UnicodeError) as e:
+                return _ResolverEntry([], f"Could not resolve {host}: {e}", self._negative_ttl)
+            addresses = []
+            for info in address_info:
+                address = (info[0], info[4][0])
+                if address not in addresses:
+                    addresses.append(address)
+            ttl = self._default_ttl
+        return _ResolverEntry(addresses, None, min(max(ttl, self._min_ttl), self._max_ttl))
+
+    def _query_dns(self, host):
+        """Query the A and AAAA records of host. Returns (addresses, lowest record TTL)."""
+        resolver = dns.resolver.Resolver()
+        resolver.lifetime = self._lookup_timeout
+        addresses = []
+        ttls = []
+        for record_type, family in (("A", socket.AF_INET), ("AAAA", socket.AF_INET6)):
+            try:
+                answer = resolver.resolve(host, record_type)
+            except dns.resolver.NoAnswer:
+                continue
+            ttls.append(answer.rrset.ttl)
+            addresses.extend((family, str(rdata)) for rdata in answer)
+        if not addresses:
+            raise dns.resolver.NoAnswer()
+        return addresses, min(ttls)
+
+
+def _literal_address(host):
+    """Returns (family, address) if host is already an ip address, otherwise None"""
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return None
+    return (socket.AF_INET if address.version == 4 else socket.AF_INET6), str(address)
+
+
+_resolver_cache = HostResolverCache()
+
+
+def get_resolver_cache():
+    """Returns the HostResolverCache shared by every probe in this process"""
+    return _resolver_cache
@@ -0,0 +1,160 @@
+import ipaddress
+import time
+from Batch_Probing import icmp_echo_batch, tcp_connect_batch, udp_probe_batch, UDP_OPEN
+from Probe_Scheduling import TokenBucket, get_probe_rate_limiter
+
+
+MAX_DISCOVERY_PROBES = 1 << 24
+
+
+def parse_port_ranges(text):
+    """Returns the sorted port numbers in a list of ports and ranges, such as '22,80,8000-8100'"""
+    ports = set()
+    for part in text.replace(" ", "").split(","):
+        if not part:
+            continue
+        first, dash, last = part.partition("-")
+        if not first.isdigit() or (dash and not last.isdigit()):
+            raise ValueError(f"'{part}' is not a port or range of ports")
+        first = int(first)
+        last = int(last) if last else first
+        if not 0 < first <= last < 65536:
+            raise ValueError(f"'{part}' is not within 1-65535")
+        ports.update(range(first, last + 1))
+    if not ports:
+        raise ValueError("No ports given")
+    return sorted(ports)
+
+
+class DiscoveryResult:
+    """
+    The outcome of a discovery sweep over every address of an IPv4 network, and optionally a list of ports on
+    each. What answered is kept in a bitmap with one bit per address (or per address and port), so even a sweep
+    of a /16 over a thousand ports takes a few megabytes.
+    """
+    def __init__(self, network, ports=None):
+        """Create an empty result for the addresses of network and the ports, or for ICMP if ports is None"""
+        self._network = network
+        self._ports = list(ports) if ports else None
+        self._port_count = len(self._ports) if self._ports else 1
+        self._bitmap = bytearray((self.get_probe_count() + 7) // 8)
+        self._probed = 0
+        self._duration = 0.0
+
+    def get_network(self):
+        """Returns the network that was swept"""
+        return self._network
+
+    def get_ports(self):
+        """Returns the ports that were scanned, or None for an ICMP sweep"""
+        return self._ports
+
+    def get_probe_count(self):
+        """Returns the number of probes the sweep sends: one per address, or one per address and port"""
+        return self._network.num_addresses * self._port_count
+
+    def get_probed_count(self):
+        """Returns the number of probes sent so far"""
+        return self._probed
+
+    def set_probed_count(self, probed):
+        """Record how many probes have been sent so far"""
+        self._probed = probed
+
+    def get_duration(self):
+        """Returns how many seconds the sweep took"""
+        return self._duration
+
+    def set_duration(self, duration):
+        """Record how many seconds the sweep took"""
+        self._duration = duration
+
+    def get_target(self, index):
+        """Returns (address, port) for the probe with the given index. The port is None for an ICMP sweep."""
+        address = str(self._network.network_address + index // self._port_count)
+        return address, self._ports[index % self._port_count] if self._ports else None
+
+    def mark(self, index):
+        """Record that the probe with the given index was answered"""
+        self._bitmap[index >> 3] |= 1 << (index & 7)
+
+    def is_marked(self, index):
+        """Returns True if the probe with the given index was answered"""
+        return bool(self._bitmap[index >> 3] & (1 << (index & 7)))
+
+    def get_found(self):
+        """Returns (address, port) for every probe that was answered, in address order"""
+        found = []
+        for byte_index, byte in enumerate(self._bitmap):
+            if not byte:
+                continue
+            for bit in range(8):
+                if byte & (1 << bit):
+                    found.append(self.get_target(byte_index * 8 + bit))
+        return found
+
+    def get_found_count(self):
+        """Returns the number of probes that were answered"""
+        return sum(bin(byte).count("1") for byte in self._bitmap)
+
+
+def discover(network, ports=None, rate=0, batch_size=256, timeout=1, stop_event=None, progress=None,
+             protocol="tcp"):
+    """
+    Sweep every address of an IPv4 network (such as '192.168.1.0/24') with ICMP Echo Requests, or, when ports
+    is given, scan those ports on every address with non-blocking TCP connects (protocol 'tcp') or with UDP
+    probes that only count a port when its service replies (protocol 'udp'). Probes go out in batches of
+    batch_size, all in flight at once, and no faster than rate probes per second when rate is above 0. The
+    process probe rate limiter, if one is set, is obeyed as well. progress, if given, is called with the
+    DiscoveryResult after every batch. Returns the DiscoveryResult.
+    """
+    network = ipaddress.ip_network(network, strict=False)
+    if network.version != 4:
+        raise ValueError("Discovery supports IPv4 networks only")
+    result = DiscoveryResult(network, ports)
+    if result.get_probe_count() > MAX_DISCOVERY_PROBES:
+        raise ValueError(f"A sweep of {result.get_probe_count()} probes is too large, the most is "
+                         f"{MAX_DISCOVERY_PROBES}")
+    bucket = TokenBucket(rate, max(1.0, rate / 10)) if rate > 0 else None
+    limiter = get_probe_rate_limiter()
+
+    def before_send(address):
+        """Wait for the sweep's own rate and the process rate limiter before each probe"""
+        if stop_event is not None and stop_event.is_set():
+            return False
+        if bucket is not None:
+            bucket.refill(time.monotonic())
+            wait = bucket.wait_time()
+            if wait > 0:
+                if stop_event is not None:
+                    if stop_event.wait(wait):
+                        return False
+                else:
+                    time.sleep(wait)
+                bucket.refill(time.monotonic())
+            bucket.take()
+        if limiter is not None:
+            return limiter.acquire(address, stop_event)
+        return True
+
+    start = time.perf_counter()
+    for first in range(0, result.get_probe_count(), batch_size):
+        if stop_event is not None and stop_event.is_set():
+            break
+        indexes = range(first, min(first + batch_size, result.get_probe_count()))
+        targets = [result.get_target(index) for index in indexes]
+        if ports and protocol == "udp":
+            latencies = [elapsed if state == UDP_OPEN else None
+                         for state, elapsed in udp_probe_batch(targets, timeout, before_send=before_send)]
+        elif ports:
+            latencies = tcp_connect_batch(targets, timeout, before_send)
+        else:
+            latencies = icmp_echo_batch([address for address, _ in targets], timeout, before_send=before_send)
+        for index, latency in zip(indexes, latencies):
+            if latency is not None:
+                result.mark(index)
+        result.set_probed_count(indexes[-1] + 1)
+        if progress is not None:
+            progress(result)
+    result.set_duration(time.perf_counter() - start)
+    return result
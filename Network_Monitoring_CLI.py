@@ -1,10 +1,135 @@
+import argparse
+import socket
+import sys
+import threading
+import time
 from prompt_toolkit import PromptSession
 from prompt_toolkit.completion import WordCompleter
 from prompt_toolkit.patch_stdout import patch_stdout
 from Monitoring_Configuration import MonitoringConfiguration, MonitorDNS, MonitorNTP, \
-    MonitorHTTPS, MonitorTCP, MonitorHTTP, MonitorUDP, MonitorICMP, Server, TCPServer, UDPServer
+    MonitorHTTPS, MonitorTCP, MonitorHTTP, MonitorUDP, MonitorICMP, MonitorTLS, MonitorTraceroute, MonitorResolvers, \
+    Server, TCPServer, UDPServer
+from Monitoring_Workers import MonitoringWorkerPool, ShardedMonitor
+from Network_Discovery import discover, parse_port_ranges
+from Monitoring_Shutdown import ShutdownCoordinator, DEFAULT_SHUTDOWN_TIMEOUT
+from Monitoring_Registry import MonitorRegistry
+from Monitoring_Results import ResultBoard
+from Monitoring_Dashboard import MonitoringDashboard
+from Monitoring_Uptime import UPTIME_WINDOWS, DEFAULT_OBJECTIVE
+from Monitoring_Stats import SamplingProfiler, get_runtime_stats
+from Monitoring_Agents import MonitoringAgent, AgentCollector, RemoteMonitor, parse_address, DEFAULT_COLLECTOR_PORT
+from Monitoring_Snapshot import SnapshotWriter, build_snapshot, read_snapshot, load_snapshot
+from Monitoring_Alerts import AlertManager, ConsoleSink, FileSink, WebhookSink, DEFAULT_FAIL_AFTER, \
+    DEFAULT_RECOVER_AFTER, DEFAULT_DEGRADE_AFTER
+from Monitoring_Commands import CommandError, COMMAND_USAGE, is_command_line, parse_command, parse_interval
+from Monitoring_Configuration import MONITOR_CLASSES, monitor_from_spec
+from HTTP_Probing import DEFAULT_MAX_BODY_BYTES
+from Monitor_Table import MonitorTable
+from Monitoring_History import HistoryStore, DEFAULT_MAX_AGE, history_key
+from Network_Simulation import NetworkModel, Simulation, LATENCY_DISTRIBUTIONS
+from Name_Resolution import get_resolver_cache
+from Probe_Scheduling import AdaptiveInterval, ProbeRateLimiter, ProbeCoalescer, set_probe_rate_limiter, \
+    set_probe_coalescer, get_probe_coalescer
 
 
+def parse_arguments(argv=None):
+    """Parse the command line options the application was started with"""
+    parser = argparse.ArgumentParser(description="Monitor and Configure Network Connections in the CLI")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="run monitoring on this many worker processes, sharded by target host "
+                             "(default: 0, run everything in this process)")
+    parser.add_argument("--max-interval", type=int, default=0,
+                        help="let healthy monitors back off up to this many seconds between checks, and re-check "
+                             "failures quickly (default: 0, always check at the chosen time interval)")
+    parser.add_argument("--recheck-interval", type=int, default=1,
+                        help="seconds to wait before re-checking a failure when --max-interval is set (default: 1)")
+    parser.add_argument("--max-probe-rate", type=float, default=0,
+                        help="the most checks per second sent in total (default: 0, no limit)")
+    parser.add_argument("--max-host-rate", type=float, default=0,
+                        help="the most checks per second sent to any one host (default: 0, no limit)")
+    parser.add_argument("--no-stagger", action="store_true",
+                        help="check new monitors at once, instead of at a random point in their first interval")
+    parser.add_argument("--coalesce-window", type=float, default=1.0,
+                        help="monitors that check the same thing share one check, and reuse its result for this "
+                             "many seconds (default: 1, 0 turns sharing off)")
+    parser.add_argument("--http-timeout", type=float, default=5,
+                        help="seconds each phase of an HTTP or HTTPS check may take (default: 5)")
+    parser.add_argument("--http-max-body", type=int, default=DEFAULT_MAX_BODY_BYTES,
+                        help=f"the most bytes of a response body HTTP and HTTPS checks read "
+                             f"(default: {DEFAULT_MAX_BODY_BYTES})")
+    parser.add_argument("--shutdown-timeout", type=float, default=DEFAULT_SHUTDOWN_TIMEOUT,
+                        help=f"the most seconds to wait on exit for monitors and servers to stop "
+                             f"(default: {DEFAULT_SHUTDOWN_TIMEOUT})")
+    parser.add_argument("--objective", type=float, default=DEFAULT_OBJECTIVE,
+                        help=f"the uptime, in percent, that error budgets in 'status' are worked out for "
+                             f"(default: {DEFAULT_OBJECTIVE})")
+    parser.add_argument("--verbose", action="store_true",
+                        help="print the result of every check, instead of only changes of state")
+    parser.add_argument("--degrade-after", type=int, default=DEFAULT_DEGRADE_AFTER,
+                        help=f"failed checks in a row before an UP monitor is DEGRADED; fewer are not reported "
+                             f"(default: {DEFAULT_DEGRADE_AFTER})")
+    parser.add_argument("--fail-after", type=int, default=DEFAULT_FAIL_AFTER,
+                        help=f"failed checks in a row before a monitor is DOWN (default: {DEFAULT_FAIL_AFTER})")
+    parser.add_argument("--recover-after", type=int, default=DEFAULT_RECOVER_AFTER,
+                        help=f"passed checks in a row before a DOWN monitor is UP again "
+                             f"(default: {DEFAULT_RECOVER_AFTER})")
+    parser.add_argument("--alert-file", metavar="FILE",
+                        help="also append every change of state to FILE, as one JSON object per line")
+    parser.add_argument("--webhook", metavar="URL",
+                        help="also post changes of state to URL as JSON, in batches, retrying failures")
+    parser.add_argument("--agent", metavar="HOST:PORT",
+                        help="run as an agent: run the monitors from --batch without a prompt, and send their "
+                             "results to the collector at HOST:PORT instead of printing them")
+    parser.add_argument("--agent-name", default=socket.gethostname(),
+                        help="the name this agent reports to the collector; every agent needs its own "
+                             "(default: the host name)")
+    parser.add_argument("--collect", metavar="[HOST:]PORT",
+                        help=f"collect the monitors and results of agents connecting to PORT (and HOST, default "
+                             f"every address), and show them with the monitors of this process "
+                             f"(default port: {DEFAULT_COLLECTOR_PORT})")
+    parser.add_argument("--snapshot", metavar="FILE",
+                        help="save every monitor and server, with cached state, to FILE whenever they change and "
+                             "on exit")
+    parser.add_argument("--restore", metavar="FILE",
+                        help="start with the monitors and servers saved in the snapshot FILE")
+    parser.add_argument("--batch", metavar="FILE",
+                        help="run the commands in FILE (one per line, such as 'new tcp example.com:443 every 30s') "
+                             "before the prompt opens. With '-', read them from standard input and monitor without "
+                             "a prompt until Ctrl-C")
+    parser.add_argument("--history", metavar="FILE",
+                        help="keep the result of every check in FILE, packed into compressed blocks, for the "
+                             "'history' command")
+    parser.add_argument("--history-days", type=float, default=DEFAULT_MAX_AGE / 86400,
+                        help=f"how many days of history to keep (default: {DEFAULT_MAX_AGE // 86400})")
+    parser.add_argument("--simulate", metavar="DURATION",
+                        help="run the monitors from --batch or --restore against a simulated network for DURATION "
+                             "(such as 3600, 90m or 6h) of virtual time, as fast as possible, then print their "
+                             "status and how fast the run was, and exit")
+    parser.add_argument("--seed", type=int, default=1,
+                        help="the seed of the simulated network; the same seed gives the same results (default: 1)")
+    parser.add_argument("--sim-latency", type=float, default=20.0,
+                        help="the typical latency of simulated targets, in milliseconds (default: 20)")
+    parser.add_argument("--sim-jitter", type=float, default=0.3,
+                        help="how much simulated latencies vary around each target's typical latency (default: 0.3)")
+    parser.add_argument("--sim-distribution", choices=LATENCY_DISTRIBUTIONS, default="lognormal",
+                        help="the distribution of simulated latencies (default: lognormal)")
+    parser.add_argument("--sim-loss", type=float, default=0.01,
+                        help="the share of simulated probes that are lost (default: 0.01)")
+    parser.add_argument("--sim-outage", metavar="HOST@START+LENGTH", action="append", default=[],
+                        help="make HOST (or * for every host) unreachable from START for LENGTH of virtual time, "
+                             "such as example.com@1h+10m. May be given more than once")
+    return parser.parse_args(argv)
+
+
+_arguments = parse_arguments([])
+_worker_pool = None
+_agent = None
+_snapshot_writer = None
+_profiler = None
+_simulation = None
+_history = None
+_result_board = ResultBoard()
+
 
 def main() -> None:
     """
@@ -14,53 +139,619 @@ def main() -> None:
     Uses prompt-toolkit for handling user input with auto-completion and ensures
     the prompt stays at the bottom of the terminal.
     """
+    global _arguments, _worker_pool, _agent, _snapshot_writer, _history
+    _arguments = parse_arguments()
+    rate_limiter = None
+    if _arguments.max_probe_rate > 0 or _arguments.max_host_rate > 0:
+        rate_limiter = ProbeRateLimiter(_arguments.max_probe_rate, _arguments.max_host_rate)
+        set_probe_rate_limiter(rate_limiter)
+    if _arguments.coalesce_window > 0:
+        set_probe_coalescer(ProbeCoalescer(_arguments.coalesce_window))
+    alert_manager = AlertManager([ConsoleSink(_result_board.is_muted)], _arguments.fail_after,
+                                 _arguments.recover_after, _arguments.degrade_after)
+    if _arguments.alert_file:
+        alert_manager.add_sink(FileSink(_arguments.alert_file))
+    if _arguments.webhook:
+        alert_manager.add_sink(WebhookSink(_arguments.webhook))
+    _result_board.set_alert_manager(alert_manager)
+    _result_board.set_verbose(_arguments.verbose)
+    if _arguments.history:
+        try:
+            _history = HistoryStore(_arguments.history, max_age=_arguments.history_days * 86400)
+            _result_board.set_history(_history)
+        except OSError as e:
+            print(f"Could not open the history file {_arguments.history}: {e}")
+    runtime_stats = get_runtime_stats()
+    if rate_limiter is not None:
+        runtime_stats.add_gauge("probes waiting for the rate limiter", rate_limiter.get_waiting_count)
+    if _arguments.coalesce_window > 0:
+        runtime_stats.add_gauge("shared probes running", get_probe_coalescer().get_running_count)
+    for sink in alert_manager.get_sinks():
+        if isinstance(sink, WebhookSink):
+            runtime_stats.add_gauge("alerts waiting for the webhook", sink.get_pending_count)
+    if _arguments.workers > 0 and not _arguments.simulate:
+        _worker_pool = MonitoringWorkerPool(_arguments.workers, rate_limiter, _arguments.coalesce_window)
+        _worker_pool.start()
 
-    command_completer: WordCompleter = WordCompleter(['exit', 'new', 'create', 'help', 'view'], ignore_case=True)
+    command_completer: WordCompleter = WordCompleter(['exit', 'new', 'bulk', 'create', 'help', 'view',
+                                                      'dashboard', 'status', 'stats', 'stats profile on',
+                                                      'stats profile off', 'history'],
+                                                     ignore_case=True)
 
     session: PromptSession = PromptSession(completer=command_completer)
 
-    monitoring_list = list()
+    monitor_registry = MonitorRegistry()
     server_list = list()
-    command_dict = {"exit": exit_loop, "new": new_config, "create": new_server, "help": get_help, "view": view_all}
-    exit_command = command_dict["help"](monitoring_list, server_list)
+    collector = None
+    if _arguments.simulate:
+        run_simulation(monitor_registry, server_list, alert_manager)
+        return
+    if _arguments.agent:
+        _agent = MonitoringAgent(parse_address(_arguments.agent), _arguments.agent_name)
+        _agent.start()
+        get_runtime_stats().add_gauge("results waiting for the collector", _agent.get_pending_count)
+    if _arguments.collect:
+        collector = AgentCollector(parse_address(_arguments.collect, ""),
+                                   lambda remote_monitor: add_remote_monitor(monitor_registry, remote_monitor),
+                                   lambda remote_monitor: stop_monitor(monitor_registry,
+                                                                       monitor_registry.get_id(remote_monitor)))
+        collector.start()
+        print(f"Collecting from agents on port {collector.get_address()[1]}")
+    if _arguments.restore:
+        restore_snapshot(monitor_registry, server_list, _arguments.restore)
+    if _arguments.snapshot:
+        _snapshot_writer = SnapshotWriter(_arguments.snapshot,
+                                          lambda: build_snapshot(monitor_registry, server_list, _result_board))
+        _snapshot_writer.start()
+        _snapshot_writer.mark_changed()
+    command_dict = {"exit": exit_loop, "new": new_config, "bulk": new_bulk, "create": new_server, "help": get_help,
+                    "view": view_all, "dashboard": open_dashboard,
+                    "status": show_status, "stats": show_stats}
     try:
+        if _arguments.batch is not None:
+            run_batch_file(monitor_registry, _arguments.batch)
+        if _agent is not None:
+            print(f"Running as agent {_agent.get_name()}, sending results to {_arguments.agent}. "
+                  f"Press Ctrl-C to exit.")
+            wait_for_interrupt()
+            return
+        if _arguments.batch == "-":
+            print("Monitoring. Press Ctrl-C to exit.")
+            wait_for_interrupt()
+            return
+        exit_command = command_dict["help"](monitor_registry, server_list)
         with patch_stdout():
             while not exit_command:
                 user_input: str = session.prompt("Enter command: ")
-                if user_input.lower() not in command_dict:
+                if is_command_line(user_input):
+                    run_command(monitor_registry, user_input)
+                elif user_input.lower().startswith("discover "):
+                    run_discovery(monitor_registry, user_input[len("discover "):])
+                elif user_input.lower().startswith("batch "):
+                    run_batch_file(monitor_registry, user_input[len("batch "):].strip())
+                elif user_input.lower().startswith("history "):
+                    show_history(monitor_registry, user_input[len("history "):])
+                elif user_input.lower().startswith("stats profile"):
+                    toggle_profiler(user_input[len("stats profile"):].strip().lower())
+                elif user_input.lower() not in command_dict:
                     print("Invalid command")
-                    exit_command = command_dict["help"](monitoring_list, server_list)
+                    exit_command = command_dict["help"](monitor_registry, server_list)
                 else:
-                    if user_input.lower() != "new":
-                        exit_command = command_dict[user_input.lower()](monitoring_list, server_list)
+                    if user_input.lower() not in ("new", "bulk"):
+                        exit_command = command_dict[user_input.lower()](monitor_registry, server_list)
                     else:
-                        exit_command = command_dict[user_input.lower()](monitoring_list)
+                        exit_command = command_dict[user_input.lower()](monitor_registry)
 
     finally:
-        monitoring_list_length = len(monitoring_list)
         print("Exiting application...")
-        print("Ending all monitoring...")
-        for service in monitoring_list:
-            print(f"Ending monitoring of {service.get_name()}")
-            service.deactivate()
-            monitoring_list_length -= 1
-            print(f"{monitoring_list_length} monitoring services left to terminate")
-
-        print("Shutting down servers...")
-        for server in server_list:
-            print(f"Closing connection to {server.get_name()}")
-            server.deactivate()
+        print(f"Ending all monitoring and shutting down servers (waiting at most {_arguments.shutdown_timeout} "
+              f"second(s))...")
+        coordinator = ShutdownCoordinator(_arguments.shutdown_timeout)
+        # Monitors on worker processes are stopped by the workers themselves when the pool shuts down
+        coordinator.add_all(service for service in monitor_registry if not isinstance(service, ShardedMonitor))
+        coordinator.add_all(server_list)
+        # Alerts still queued for the webhook get one last try
+        coordinator.add_all(alert_manager.get_sinks())
+        if collector is not None:
+            coordinator.add(collector)
+        if _profiler is not None:
+            coordinator.add(_profiler)
+        if _snapshot_writer is not None:
+            # Saves a last snapshot, of every monitor as it was when stopped
+            coordinator.add(_snapshot_writer)
+        still_running = coordinator.shutdown()
+        if still_running:
+            print(f"{len(still_running)} monitoring services or servers were still finishing a check, and were "
+                  f"left to end with the application")
+        if _worker_pool is not None:
+            print("Stopping worker processes...")
+            _worker_pool.shutdown(_arguments.shutdown_timeout + 1)
+        if _agent is not None:
+            # Send the results of the last checks before leaving
+            _agent.stop()
+            _agent.join(_arguments.shutdown_timeout)
+        if _history is not None:
+            # After the monitors, so the results of their last checks are kept too
+            _history.stop()
         print("Finished. Goodbye!")
 
 
-def get_help(monitoring_list, server_list):
+def start_monitor(monitor_registry, monitor, monitor_id=None):
+    """
+    Add a new monitoring configuration to the monitor registry and activate it. When the application was started
+    with worker processes, the configuration runs on the worker its target host is sharded to. When started
+    with --max-interval, the configuration checks at an adaptive interval. Unless started with --no-stagger, the
+    first check happens at a random point in the first time interval.
+    """
+    if _arguments.no_stagger:
+        monitor.set_start_jitter(0)
+    if _arguments.max_interval > 0:
+        monitor.set_interval_policy(AdaptiveInterval(monitor.get_time_interval(), _arguments.max_interval,
+                                                     _arguments.recheck_interval))
+    if _worker_pool is not None:
+        monitor = _worker_pool.wrap(monitor)
+    monitor_id = monitor_registry.add(monitor, monitor_id)
+    if _agent is not None:
+        _agent.add(monitor_id, monitor)
+    else:
+        monitor.set_result_handler(_result_board.get_handler(monitor_id))
+    if _simulation is not None:
+        _simulation.add(monitor_id, monitor)
+    else:
+        monitor.activate()
+    mark_changed()
+    return monitor_id
+
+
+def start_table(monitor_registry, table, monitor_id=None):
+    """
+    Add a MonitorTable to the monitor registry and activate it. Tables always run in this process, however many
+    targets they have. On an agent its results are sent to the collector, like those of other monitors.
+    """
+    monitor_id = monitor_registry.add(table, monitor_id)
+    if _agent is not None:
+        _agent.add(monitor_id, table)
+    else:
+        table.set_result_handler(_result_board.get_handler(monitor_id))
+    if _simulation is not None:
+        _simulation.add(monitor_id, table)
+    else:
+        table.activate()
+    mark_changed()
+    return monitor_id
+
+
+def mark_changed():
+    """Note that the monitors or servers changed, so a snapshot is saved soon, if the application saves them"""
+    if _snapshot_writer is not None:
+        _snapshot_writer.mark_changed()
+
+
+def restore_snapshot(monitor_registry, server_list, path, batch_size=200, pause=0.05):
+    """
+    Start every monitor and server saved in a snapshot, keeping their ids, and load their cached state. Monitors
+    are activated batch_size at a time, with a short pause between batches, and each first checks at a random
+    point of its first interval (unless --no-stagger is given), so restoring thousands of monitors does not
+    send all their checks at once.
+    """
+    start = time.perf_counter()
+    try:
+        monitors, servers = load_snapshot(read_snapshot(path))
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print(f"Could not restore from {path}: {e}")
+        return False
+    for server in servers:
+        server_list.append(server)
+        server.activate()
+    for index, (monitor_id, monitor, state) in enumerate(monitors):
+        if index and index % batch_size == 0:
+            time.sleep(pause)
+        # The state is loaded before the monitor starts, so its first check is recorded on top of it
+        if state is not None and monitor_id not in monitor_registry:
+            _result_board.restore_state(monitor_id, monitor, state)
+        if isinstance(monitor, MonitorTable):
+            started_id = start_table(monitor_registry, monitor, monitor_id)
+        else:
+            started_id = start_monitor(monitor_registry, monitor, monitor_id)
+        if state is not None and started_id != monitor_id:
+            _result_board.restore_state(started_id, monitor, state)
+    print(f"Restored {len(monitors)} monitors and {len(servers)} servers from {path} in "
+          f"{time.perf_counter() - start:.2f} seconds")
+    return True
+
+
+def run_simulation(monitor_registry, server_list, alert_manager):
+    """
+    Run the monitors from --batch or --restore against a simulated network for the --simulate duration of
+    virtual time, then print their status, the runtime statistics, and how many checks ran how fast. Changes of
+    state still go to --alert-file and --webhook, timed by the virtual clock, but are not printed.
+    """
+    global _simulation
+    try:
+        duration = parse_interval(_arguments.simulate)
+        model = NetworkModel(_arguments.seed, _arguments.sim_latency, _arguments.sim_jitter, _arguments.sim_loss,
+                             _arguments.sim_distribution)
+        _simulation = Simulation(model)
+        start = _simulation.get_clock().time()
+        for outage in _arguments.sim_outage:
+            host, _, window = outage.rpartition("@")
+            outage_start, _, length = window.partition("+")
+            if not host or not length:
+                raise CommandError(f"'{outage}' is not an outage, as in example.com@1h+10m")
+            model.add_outage(host, start + parse_interval(outage_start), start + parse_interval(outage_start) +
+                             parse_interval(length))
+    except CommandError as e:
+        print(e)
+        return False
+    # The rate limiter and coalescer pace real time, which a simulation does not take
+    set_probe_rate_limiter(None)
+    set_probe_coalescer(None)
+    _result_board.set_clock(_simulation.get_clock().time)
+    if _arguments.restore:
+        restore_snapshot(monitor_registry, server_list, _arguments.restore, pause=0)
+    if _arguments.batch is not None:
+        run_batch_file(monitor_registry, _arguments.batch)
+    print(f"Simulating {_simulation.get_monitor_count()} monitors for {duration} seconds with seed {_arguments.seed}")
+    _result_board.set_muted(True)
+    try:
+        checks = _simulation.run(duration)
+    finally:
+        _result_board.set_muted(False)
+    show_status(monitor_registry, server_list)
+    show_stats(monitor_registry, server_list)
+    wall_seconds = _simulation.get_wall_seconds()
+    print(f"Ran {checks} checks covering {duration} seconds in {wall_seconds:.2f} seconds "
+          f"({checks / max(wall_seconds, 1e-9):.0f} checks per second, {duration / max(wall_seconds, 1e-9):.0f} "
+          f"times real time)")
+    print(f"Digest of every result: {_simulation.get_digest()}")
+    if _history is not None:
+        _history.stop()
+    coordinator = ShutdownCoordinator(_arguments.shutdown_timeout)
+    coordinator.add_all(alert_manager.get_sinks())
+    coordinator.shutdown()
+    return True
+
+
+def add_remote_monitor(monitor_registry, remote_monitor):
+    """Add a monitor that runs on an agent to the monitor registry, and record its results like any other"""
+    monitor_id = monitor_registry.add(remote_monitor)
+    remote_monitor.set_result_handler(_result_board.get_handler(monitor_id))
+    print(f"#{monitor_id}: agent {remote_monitor.get_agent()} is monitoring {remote_monitor.get_service()} "
+          f"{remote_monitor.get_name()}")
+    return monitor_id
+
+
+def stop_monitor(monitor_registry, monitor_id):
+    """Remove a monitoring configuration from the monitor registry, and stop it"""
+    target_client = monitor_registry.remove(monitor_id)
+    if target_client is None:
+        return
+    print(f"Ending monitoring of {target_client.get_name()}")
+    target_client.deactivate()
+    _result_board.forget(monitor_id)
+    if _agent is not None:
+        _agent.remove(monitor_id)
+    if _simulation is not None:
+        _simulation.remove(monitor_id)
+    mark_changed()
+
+
+def run_command(monitor_registry, line):
+    """
+    Run one line of the command grammar (see Monitoring_Commands) without asking for any confirmation. Prints
+    what was done, or why the line could not be run. Returns True if the command was run.
+    """
+    try:
+        command = parse_command(line)
+    except CommandError as e:
+        print(f"{e}\nUsage:\n{COMMAND_USAGE}")
+        return False
+    if command.get_verb() == "new":
+        monitor = command.build_monitor(_arguments.http_timeout, _arguments.http_max_body)
+        monitor_id = start_monitor(monitor_registry, monitor)
+        print(f"#{monitor_id}: monitoring {monitor.get_service()} {monitor.get_name()} every "
+              f"{monitor.get_time_interval()} second(s)")
+        return True
+    if command.get_verb() == "delete":
+        if command.get_monitor_id() is not None:
+            monitor_ids = [command.get_monitor_id()] if command.get_monitor_id() in monitor_registry else []
+        else:
+            matches = monitor_registry.find(command.get_service(), command.get_target_host(), command.get_port())
+            monitor_ids = [monitor_id for monitor_id, monitor in matches
+                           if monitor.get_name() == command.get_name()]
+        if not monitor_ids:
+            print(f"No monitor matches '{line.strip()}'")
+            return False
+        for monitor_id in monitor_ids:
+            stop_monitor(monitor_registry, monitor_id)
+        return True
+    monitor = monitor_registry.get(command.get_monitor_id())
+    if monitor is None:
+        print(f"There is no monitor #{command.get_monitor_id()}")
+        return False
+    if isinstance(monitor, RemoteMonitor):
+        print(f"Monitor #{command.get_monitor_id()} runs on agent {monitor.get_agent()}, and can only be edited there")
+        return False
+    spec = monitor.get_spec()
+    if spec["class"] not in MONITOR_CLASSES:
+        print(f"Monitor #{command.get_monitor_id()} cannot be edited")
+        return False
+    spec["args"][1] = command.get_interval()
+    spec["policy"] = None
+    stop_monitor(monitor_registry, command.get_monitor_id())
+    start_monitor(monitor_registry, monitor_from_spec(spec), command.get_monitor_id())
+    print(f"#{command.get_monitor_id()}: now checking every {command.get_interval()} second(s)")
+    return True
+
+
+def run_batch_file(monitor_registry, file_name):
+    """
+    Run every line of a file (or of standard input, for '-') as a command, without confirmations. Blank lines
+    and lines starting with '#' are skipped, and a line that fails does not stop the rest.
+    """
+    try:
+        batch_file = sys.stdin if file_name == "-" else open(file_name)
+    except OSError as e:
+        print(f"Could not read {file_name}: {e}")
+        return
+    succeeded = failed = 0
+    with batch_file:
+        for line_number, line in enumerate(batch_file, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            print(f"{file_name}:{line_number}: {line}")
+            if run_command(monitor_registry, line):
+                succeeded += 1
+            else:
+                failed += 1
+    print(f"Ran {succeeded} command(s) from {file_name}, {failed} failed")
+
+
+def run_discovery(monitor_registry, arguments):
+    """
+    Sweep a network for hosts that answer ICMP, or scan it for open TCP or UDP ports, given arguments such as
+    '192.168.1.0/24', '10.0.0.0/24 ports 22,80,443,8000-8100 rate 500' or '10.0.0.0/24 ports 53,123 udp'.
+    Then offer to monitor everything that was found. Ctrl-C stops the sweep early and keeps what was found so
+    far.
+    """
+    words = arguments.split()
+    protocol = "tcp"
+    if words and words[-1].lower() in ("tcp", "udp"):
+        protocol = words.pop().lower()
+    options = dict(zip(words[1::2], words[2::2]))
+    try:
+        if not words or len(words) % 2 == 0 or not set(options) <= {"ports", "rate"}:
+            raise ValueError("Usage: discover <network/prefix> [ports <ports and ranges>] [rate <probes per second>] "
+                             "[tcp|udp]")
+        ports = parse_port_ranges(options["ports"]) if "ports" in options else None
+        rate = float(options.get("rate", 0))
+        print(f"Discovering on {words[0]}... Press Ctrl-C to stop early.")
+        last_printed = [time.monotonic()]
+
+        def progress(result):
+            if time.monotonic() - last_printed[0] >= 2:
+                last_printed[0] = time.monotonic()
+                print(f"{result.get_probed_count()} of {result.get_probe_count()} probes sent, "
+                      f"{result.get_found_count()} found")
+
+        result = run_sweep(words[0], ports, rate, progress, protocol)
+    except ValueError as e:
+        print(e)
+        return False
+    found = result.get_found()
+    print(f"Found {len(found)} in {result.get_duration():.1f} seconds:")
+    for address, port in found[:50]:
+        print(f"  {address}:{port}" if port is not None else f"  {address}")
+    if len(found) > 50:
+        print(f"  ...and {len(found) - 50} more")
+    if not found or not confirm_yes_no(f"that you would like to monitor all {len(found)}"):
+        return False
+    time_interval = get_monitoring_time(f"the {len(found)} discovered")
+    if not time_interval:
+        return False
+    for address, port in found:
+        if port is None:
+            start_monitor(monitor_registry, MonitorICMP(address, time_interval))
+        elif protocol == "udp":
+            start_monitor(monitor_registry, MonitorUDP(address, time_interval, port))
+        else:
+            start_monitor(monitor_registry, MonitorTCP(address, time_interval, port))
+    print(f"Monitoring {len(found)} discovered services")
+    return False
+
+
+def run_sweep(network, ports, rate, progress, protocol):
+    """
+    Run discover on a thread of its own and wait for it, so that Ctrl-C here stops the sweep and the
+    DiscoveryResult of what was found so far is still returned. Raises what discover raises.
+    """
+    stop_event = threading.Event()
+    done_event = threading.Event()
+    outcome = {}
+
+    def sweep():
+        """Run the sweep, keeping its result or the error it raised"""
+        try:
+            outcome["result"] = discover(network, ports, rate, stop_event=stop_event, progress=progress,
+                                         protocol=protocol)
+        except Exception as e:
+            outcome["error"] = e
+        finally:
+            done_event.set()
+
+    threading.Thread(target=sweep, daemon=True).start()
+    # Waits on an event rather than joining, as a join cut short by Ctrl-C can leave the thread looking stopped
+    try:
+        while not done_event.wait(0.2):
+            pass
+    except KeyboardInterrupt:
+        stop_event.set()
+        print("Discovery stopped, keeping what was found so far")
+        done_event.wait()
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome["result"]
+
+
+def wait_for_interrupt():
+    """Wait, with the monitors running, until the user presses Ctrl-C"""
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+
+
+def open_dashboard(monitor_registry, server_list):
+    """Show the full screen dashboard of every monitor until the user exits it"""
+    MonitoringDashboard(monitor_registry, _result_board).run()
+    return False
+
+
+def show_status(monitor_registry, server_list):
+    """
+    Print the state of every monitor with its uptime over each window, and how much of its error budget over the
+    longest window is left for the --objective uptime
+    """
+    windows = [name for name, _, _ in UPTIME_WINDOWS]
+    longest = windows[-1]
+    print(f"{'#':>6} {'STATE':<6} {'SERVICE':<10} {'NAME':<32} " + " ".join(f"{name:>8}" for name in windows) +
+          f" {'BUDGET ' + longest:>12}")
+    for monitor_id, monitor in monitor_registry.items():
+        result = _result_board.get(monitor_id)
+        state = "WAIT" if result is None or result.is_up() is None else "UP" if result.is_up() else "DOWN"
+        columns = []
+        for name in windows:
+            uptime = _result_board.get_uptime(monitor_id, name)
+            columns.append(f"{uptime:7.3f}%" if uptime is not None else f"{'-':>8}")
+        _, budget = _result_board.get_uptime(monitor_id, longest, _arguments.objective)
+        budget = f"{budget:11.1f}%" if budget is not None and budget != float("-inf") else \
+            f"{'spent':>12}" if budget is not None else f"{'-':>12}"
+        name = str(monitor.get_name())
+        if len(name) > 32:
+            name = name[:31] + "…"
+        print(f"{monitor_id:>6} {state:<6} {str(monitor.get_service())[:10]:<10} {name:<32} " + " ".join(columns) +
+              f" {budget}")
+    if not len(monitor_registry):
+        print("No monitors to show")
+    return False
+
+
+def show_stats(monitor_registry, server_list):
+    """
+    Print how the application itself is keeping up: for each service type, the probes per second over the last
+    minute, how long probes take and how late checks start compared to when they were due, then the queues and
+    the traffic of every echo server
+    """
+    runtime_stats = get_runtime_stats()
+    print(f"Up {runtime_stats.get_uptime():.0f}s, {threading.active_count()} threads, {len(monitor_registry)} "
+          f"monitors")
+    services = runtime_stats.get_services()
+    if services:
+        print(f"{'SERVICE':<12} {'PROBES':>9} {'/S':>8} {'P50 MS':>9} {'P95 MS':>9} {'MAX MS':>9} "
+              f"{'LAG P50':>9} {'LAG P95':>9} {'LAG MAX':>9}")
+    for service, stats in sorted(services.items(), key=lambda item: str(item[0])):
+        durations, lag = stats.get_durations(), stats.get_lag()
+        columns = [durations.get_percentile(50), durations.get_percentile(95), durations.get_max(),
+                   lag.get_percentile(50), lag.get_percentile(95), lag.get_max()]
+        print(f"{str(service)[:12]:<12} {durations.get_count():>9} {stats.get_rate():>8.1f} " +
+              " ".join(f"{value:>9.1f}" if value is not None else f"{'-':>9}" for value in columns))
+    if not services:
+        print("No probes have run in this process yet")
+    if _worker_pool is not None:
+        print("Monitors on worker processes are measured in their own process, and not shown here")
+    for name, value in runtime_stats.get_gauges().items():
+        print(f"{name}: {value}")
+    for server in server_list:
+        print(f"{server.get_service()} {server.get_name()}: {server.get_request_count()} messages, "
+              f"{server.get_bytes_received()} bytes received, {server.get_bytes_sent()} bytes sent")
+    if _profiler is not None and _profiler.is_running():
+        print(f"Profiling: {_profiler.get_sample_count()} samples so far. Type 'stats profile off' for the report")
+    return False
+
+
+def toggle_profiler(setting):
+    """Start the sampling profiler for 'on', or stop it and print what it found for 'off'"""
+    global _profiler
+    if setting == "on":
+        if _profiler is not None and _profiler.is_running():
+            print("The profiler is already running")
+            return
+        _profiler = SamplingProfiler()
+        _profiler.start()
+        print("Profiling every thread. Type 'stats profile off' to stop and see the report")
+    elif setting == "off":
+        if _profiler is None or not _profiler.is_running():
+            print("The profiler is not running")
+            return
+        _profiler.stop()
+        _profiler.join()
+        print(_profiler.get_report())
+    else:
+        print("Usage: stats profile on|off")
+
+
+def show_history(monitor_registry, arguments):
+    """
+    Print the checks of a monitor kept in the history over a window, given arguments such as '3' (the last day)
+    or '3 30d': in total, and in twelve periods of the window. Periods wholly within packed blocks are summed
+    from the block index without unpacking them.
+    """
+    if _history is None:
+        print("No history is kept. Start with --history FILE to keep it")
+        return
+    words = arguments.split()
+    try:
+        if not words or not words[0].isdigit() or len(words) > 2:
+            raise CommandError("Usage: history <monitor id> [<window, such as 6h or 30d>]")
+        window = parse_interval(words[1]) if len(words) == 2 else 86400
+    except CommandError as e:
+        print(e)
+        return
+    monitor = monitor_registry.get(int(words[0]))
+    if monitor is None:
+        print(f"There is no monitor #{words[0]}")
+        return
+    key = history_key(monitor)
+    end = _result_board.get_clock()()
+    periods = [(end - window + window * index / 12, end - window + window * (index + 1) / 12) for index in range(12)]
+    blocks_read = _history.get_blocks_read()
+    print(f"#{words[0]} {monitor.get_service()} {monitor.get_name()}, the last "
+          f"{words[1] if len(words) == 2 else '24h'}:")
+    print(f"{'FROM':<19} {'CHECKS':>8} {'UP':>9} {'MIN MS':>9} {'MAX MS':>9}")
+    rows = [(time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(start)), start, period_end)
+            for start, period_end in periods]
+    for label, start, period_end in rows + [("In total", end - window, end)]:
+        up, down, lowest, highest = _history.summarize(key, start, period_end)
+        uptime = f"{100 * up / (up + down):8.3f}%" if up + down else f"{'-':>9}"
+        latencies = " ".join(f"{value:>9.1f}" if value is not None else f"{'-':>9}" for value in (lowest, highest))
+        print(f"{label:<19} {up + down:>8} {uptime} {latencies}")
+    print(f"{_history.get_blocks_read() - blocks_read} blocks unpacked. The history holds "
+          f"{_history.get_sample_count()} checks, {_history.get_block_count()} blocks of them packed into "
+          f"{_history.get_stored_bytes() / 1024:.0f}KB ({_history.get_raw_bytes() / 1024:.0f}KB unpacked)")
+
+
+def get_help(monitor_registry, server_list):
     """Print all valid commands"""
     return_to = "enter the"
-    if len(monitoring_list) or len(server_list) >= 1:
+    if len(monitor_registry) or len(server_list) >= 1:
         return_to = "return to the"
     commands = "The following are valid commands: \nexit: Exit the application\nhelp: Print all valid commands\n" \
-               "new: Configure a new service to monitor\ncreate: Create and monitor a new TCP or UDP Echo Server\n" \
-               "view: View all servers created and services being monitored. Optionally delete servers and services\n"
+               "new: Configure a new service to monitor\n" \
+               "bulk: Monitor a large list of hosts from a file with ICMP or TCP, in one compact table\n" \
+               "create: Create and monitor a new TCP or UDP Echo Server\n" \
+               "view: View all servers created and services being monitored. Optionally delete servers and services\n" \
+               "batch <file>: Run the commands in a file, one per line\n" \
+               "discover <network/prefix> [ports <ports>] [rate <n>] [tcp|udp]: Find hosts that answer ICMP, or open " \
+               "TCP or UDP ports, and optionally monitor them all\n" \
+               "new/delete/edit with arguments: Run a one line command without prompts, for example\n" \
+               "    new tcp example.com:443 every 30s, new dns 8.8.8.8 query=example.com type=A, delete 3, " \
+               "edit 4 every 5m\n" \
+               "dashboard: Show the live state of every monitor on one screen, with sorting and filtering\n" \
+               "status: Print the uptime of every monitor over the last hour, day and 30 days, and its error budget\n" \
+               "stats: Print probe rates, probe durations, scheduling lag, queues and server traffic\n" \
+               "history <id> [<window>]: Print the checks of a monitor kept with --history, such as 'history 3 30d'\n" \
+               "stats profile on|off: Sample what every thread is running, and print the busiest functions at off\n"
     confirmation = None
     while not confirmation:
         confirmation = confirm_yes_no(f"that your ready to {return_to} main loop? Here are the available commands:\n"
@@ -68,68 +759,62 @@ def get_help(monitoring_list, server_list):
     return False
 
 
-def view_all(monitoring_list, server_list):
-    """View all services being monitored one by one, with an option to permanently delete them"""
+def view_all(monitor_registry, server_list):
+    """
+    View all services being monitored one by one, with an option to permanently delete them. Services are listed
+    by their id in the monitor registry.
+    """
     command_completer: WordCompleter = WordCompleter(['CANCEL'], ignore_case=True)
     current_session: PromptSession = PromptSession(completer=command_completer)
 
     count = 0
-    for service in monitoring_list:
+    for monitor_id, service in monitor_registry.items():
         count += 1
         service_type = service.get_service()
-        if service_type == "DNS":
+        if service_type == "DNS" or service_type == "RESOLVERS":
             user_command = current_session.prompt(f"Type cancel to go back to main loop, "
                                                   f"or touch any key to see next item in list: ")
             if user_command.lower() == "cancel":
                 return cancel(count)
-            dns_string = f"\n#{count}. Service type: DNS\nServer: {service.get_name()}\nQuery: {service.get_query()}\n" \
-                         f"Record_type: {service.get_record_type()}\nCheck every: " \
+            dns_string = f"\n#{monitor_id}. Service type: {service_type}\nServer: {service.get_name()}\n" \
+                         f"Query: {service.get_query()}\nRecord_type: {service.get_record_type()}\nCheck every: " \
                          f"{service.get_time_interval()} second(s)"
             first_confirmation = confirm_yes_no("following service" + dns_string + "would you like to delete")
             if first_confirmation:
                 second_confirmation = confirm_yes_no("that you would like to delete" + dns_string)
                 if second_confirmation:
-                    target_client = monitoring_list.pop(count - 1)
-                    print(f"Ending monitoring of {target_client.get_name()}")
-                    target_client.deactivate()
-                    del target_client
-        elif service_type == "TCP" or service_type == "UDP":
+                    stop_monitor(monitor_registry, monitor_id)
+        elif service_type == "TCP" or service_type == "UDP" or service_type == "TLS":
             user_command = current_session.prompt(f"Type cancel to go back to main loop, "
                                                   f"or hit enter to see next item in list: ")
             if user_command.lower() == "cancel":
                 return cancel(count)
-            tcp_udp = f"\n#{count}. Service type: {service_type}\nHost / IP: {service.get_name()}\n" \
+            tcp_udp = f"\n#{monitor_id}. Service type: {service_type}\nHost / IP: {service.get_name()}\n" \
                       f"Port number: {service.get_port()}\nCheck every: {service.get_time_interval()} second(s)"
             first_confirmation = confirm_yes_no("following service" + tcp_udp + "would you like to delete")
             if first_confirmation:
                 second_confirmation = confirm_yes_no("that you would like to delete" + tcp_udp)
                 if second_confirmation:
-                    target_client = monitoring_list.pop(count - 1)
-                    print(f"Ending monitoring of {target_client.get_name()}")
-                    target_client.deactivate()
-                    del target_client
+                    stop_monitor(monitor_registry, monitor_id)
         else:
             user_command = current_session.prompt(f"Type cancel to go back to main loop, "
                                                   f"or hit enter to see next item in list: ")
             if user_command.lower() == "cancel":
                 return cancel(count)
-            service_str = f"\n#{count}. Service type: {service_type}\nHost / IP: {service.get_name()}\n" \
+            service_str = f"\n#{monitor_id}. Service type: {service_type}\nHost / IP: {service.get_name()}\n" \
                           f"Check every: {service.get_time_interval()} second(s)"
             first_confirmation = confirm_yes_no("following service" + service_str + "would you like to delete")
             if first_confirmation:
                 second_confirmation = confirm_yes_no("that you would like to delete" + service_str)
                 if second_confirmation:
-                    target_client = monitoring_list.pop(count - 1)
-                    print(f"Ending monitoring of {target_client.get_name()}")
-                    target_client.deactivate()
-                    del target_client
+                    stop_monitor(monitor_registry, monitor_id)
 
     if len(server_list) == 1:
         user_command = current_session.prompt(f"Type cancel to go back to main loop, "
                                               f"or hit enter to see next item in list")
         if user_command.lower() == "cancel":
             return cancel(count)
-        delete_server(monitoring_list, server_list)
+        delete_server(monitor_registry, server_list)
     return False
 
 
@@ -151,41 +836,42 @@ def confirm_yes_no(operation):
             user_confirmation = None
 
 
-def exit_loop(monitoring_list, server_list):
+def exit_loop(monitor_registry, server_list):
     """
     This function is called if user enters 'create' in the main loop.
     This function ends the main loop. Returning True will break the while loop in the main function.
     """
     confirmation = confirm_yes_no("exit")
     if confirmation:
-        print("Exiting application might take some time as app finishes closing all processes")
         return True
     else:
         print("Cancelling exit. Going back to main loop...")
         return False
 
 
-def new_config(monitor_list):
+def new_config(monitor_registry):
     """
     This function is called if user enters 'new' in the main loop. It confirms the type of service the user
     would like to monitor, and then calls the appropriate corresponding function.
     """
-    command_completer: WordCompleter = WordCompleter(['HTTP', 'HTTPS', 'ICMP', 'DNS',
-                                                      'NTP', 'TCP', 'UDP', 'CANCEL'], ignore_case=True)
+    command_completer: WordCompleter = WordCompleter(['HTTP', 'HTTPS', 'TLS', 'ICMP', 'TRACEROUTE', 'DNS',
+                                                      'RESOLVERS', 'NTP', 'TCP', 'UDP', 'CANCEL'], ignore_case=True)
     current_session: PromptSession = PromptSession(completer=command_completer)
-    valid_choices = {"HTTP": new_http, "HTTPS": new_https, "ICMP": new_icmp, "DNS": new_dns, "NTP": new_ntp,
+    valid_choices = {"HTTP": new_http, "HTTPS": new_https, "TLS": new_tls, "ICMP": new_icmp,
+                     "TRACEROUTE": new_traceroute, "DNS": new_dns, "RESOLVERS": new_resolvers, "NTP": new_ntp,
                      "TCP": new_tcp, "UDP": new_udp, "CANCEL": cancel}
     user_service_choice = None
     while user_service_choice is None:
-        print("Choose a service from HTTP, HTTPS, ICMP, DNS, NTP, TCP, UDP, or type cancel to go back to main loop")
+        print("Choose a service from HTTP, HTTPS, TLS, ICMP, TRACEROUTE, DNS, RESOLVERS, NTP, TCP, UDP, or type cancel "
+              "to go back to main loop")
         user_service_choice = current_session.prompt("Enter choice: ")
         if user_service_choice.upper() not in valid_choices:
             print("Invalid choice")
             user_service_choice = None
-    return valid_choices[user_service_choice.upper()](monitor_list)
+    return valid_choices[user_service_choice.upper()](monitor_registry)
 
 
-def new_server(monitor_list, server_list):
+def new_server(monitor_registry, server_list):
     """
     This function is called if user enters 'create' in the main loop. It confirms the type of server the user
     would like to create, and then calls the appropriate corresponding function.
@@ -200,7 +886,7 @@ def new_server(monitor_list, server_list):
         if user_server_choice.upper() not in valid_choices:
             print("Invalid choice")
             user_server_choice = None
-    return valid_choices[user_server_choice.upper()](monitor_list, server_list)
+    return valid_choices[user_server_choice.upper()](monitor_registry, server_list)
 
 
 def echo_message():
@@ -239,7 +925,7 @@ def server_name():
             name = None
 
 
-def delete_server(monitor_list, server_list):
+def delete_server(monitor_registry, server_list):
     """This function ends the running of the current existing server, and then deletes it."""
     name = server_list[0].get_name()
     local = "127.0.0.1"
@@ -250,33 +936,30 @@ def delete_server(monitor_list, server_list):
                                   f"(This app currently only can host one server at a time)")
     if not confirmation:
         return False
-    target_client = None
-    count = 0
-    for service in monitor_list:
+    client_id = None
+    for monitor_id, service in monitor_registry.find(host=local, port=port):
         if service.get_service() == "TCP" or service.get_service() == "UDP":
             if service.get_message():
-                target_client = monitor_list.pop(count)
+                client_id = monitor_id
                 break
-        count += 1
-    if target_client:
-        print(f"Ending monitoring of {target_client.get_name()}")
-        target_client.deactivate()
-        del target_client
+    if client_id is not None:
+        stop_monitor(monitor_registry, client_id)
 
     server = server_list.pop()
     print(f"Closing connection to {name}")
     server.deactivate()
     del server
+    mark_changed()
     return True
 
 
-def new_tcp_server(monitor_list, server_list):
+def new_tcp_server(monitor_registry, server_list):
     """
     Create a new tcp server with user inputted name, and port number. Also create a corresponding client that
     will monitor the created server.
     """
     if len(server_list) == 1:
-        confirm_del = delete_server(monitor_list, server_list)
+        confirm_del = delete_server(monitor_registry, server_list)
         if not confirm_del:
             return False
     server_address = '127.0.0.1'
@@ -294,20 +977,20 @@ def new_tcp_server(monitor_list, server_list):
         return False
     server_list.append(TCPServer(tcp_server_name, tcp_server_port))
     server_list[-1].activate()
-    monitor_list.append(MonitorTCP(server_address, tcp_time_interval, tcp_server_port))
-    monitor_list[-1].switch_to_client()
-    monitor_list[-1].set_message(user_message)
-    monitor_list[-1].activate()
+    tcp_client = MonitorTCP(server_address, tcp_time_interval, tcp_server_port)
+    tcp_client.switch_to_client()
+    tcp_client.set_message(user_message)
+    start_monitor(monitor_registry, tcp_client)
     return False
 
 
-def new_udp_server(monitor_list, server_list):
+def new_udp_server(monitor_registry, server_list):
     """
     Create a new udp server with user inputted name, and port number. Also create a corresponding client that
     will monitor the created server.
     """
     if len(server_list) == 1:
-        confirm_del = delete_server(monitor_list, server_list)
+        confirm_del = delete_server(monitor_registry, server_list)
         if not confirm_del:
             return False
     server_address = '127.0.0.1'
@@ -325,14 +1008,66 @@ def new_udp_server(monitor_list, server_list):
         return False
     server_list.append(UDPServer(udp_server_name, udp_server_port))
     server_list[-1].activate()
-    monitor_list.append(MonitorUDP(server_address, udp_time_interval, udp_server_port))
-    monitor_list[-1].switch_to_client()
-    monitor_list[-1].set_message(user_message)
-    monitor_list[-1].activate()
+    udp_client = MonitorUDP(server_address, udp_time_interval, udp_server_port)
+    udp_client.switch_to_client()
+    udp_client.set_message(user_message)
+    start_monitor(monitor_registry, udp_client)
     return False
 
 
-def cancel(monitor_list):
+def new_bulk(monitor_registry):
+    """
+    Create a MonitorTable from a file listing one target per line ('host' for ICMP, 'host:port' for TCP), add it
+    to the monitor registry, and activate monitoring. The table runs in this process on a single thread, however
+    many targets the file lists.
+    """
+    command_completer: WordCompleter = WordCompleter(["ICMP", "TCP", "cancel"], ignore_case=True)
+    current_session: PromptSession = PromptSession(completer=command_completer)
+    table_service = None
+    while table_service is None:
+        table_service = current_session.prompt("Check the targets with ICMP or TCP? Or type cancel: ").upper()
+        if table_service == "CANCEL":
+            return cancel(monitor_registry)
+        if table_service not in ("ICMP", "TCP"):
+            print("Invalid choice")
+            table_service = None
+    file_name = get_name_or_ip("file listing the targets")
+    if not file_name:
+        return False
+    try:
+        with open(file_name) as target_file:
+            lines = [line.strip() for line in target_file if line.strip() and not line.startswith("#")]
+    except OSError as e:
+        print(f"Could not read {file_name}: {e}")
+        return False
+    table_time_interval = get_monitoring_time(file_name)
+    if not table_time_interval:
+        return False
+    table = MonitorTable(file_name, table_service, table_time_interval)
+    if _arguments.no_stagger:
+        table.set_start_jitter(0)
+    skipped = 0
+    for line in lines:
+        host, port = line, 0
+        if table_service == "TCP":
+            host, _, port = line.rpartition(":")
+            if not port.isdigit():
+                skipped += 1
+                continue
+            port = int(port)
+        try:
+            addresses, _ = get_resolver_cache().resolve(host, socket.AF_INET)
+        except OSError:
+            skipped += 1
+            continue
+        table.add_target(addresses[0][1], port)
+    print(f"Monitoring {table.get_target_count()} targets from {file_name}, skipped {skipped} that could not be "
+          f"read or resolved")
+    start_table(monitor_registry, table)
+    return False
+
+
+def cancel(monitor_registry):
     """This function is used to allow users to stop current input at any time, and go back to the main loop"""
     print("Cancelling. Going back to main loop...")
     return False
@@ -370,9 +1105,8 @@ def get_monitoring_time(name):
     monitoring_interval = None
     while monitoring_interval is None:
         print(pre_prompt)
-        monitoring_interval = current_session.prompt("WARNING! Integer size affects time it takes to shut down "
-                                                     "application!\nEnter an integer (time interval for monitoring "
-                                                     "service in seconds): ")
+        monitoring_interval = current_session.prompt("Enter an integer (time interval for monitoring service in "
+                                                     "seconds): ")
         if monitoring_interval.lower() == "cancel":
             return cancel(name)
         try:
@@ -386,7 +1120,7 @@ def get_monitoring_time(name):
             monitoring_interval = None
 
 
-def new_http(monitor_list):
+def new_http(monitor_registry):
     """
     Create a MonitorHTTP object with the required user inputted information, add it to monitoring list, and
     activate monitoring
@@ -397,12 +1131,13 @@ def new_http(monitor_list):
     http_time_interval = get_monitoring_time(http_url)
     if not http_time_interval:
         return False
-    monitor_list.append(MonitorHTTP(http_url, http_time_interval))
-    monitor_list[-1].activate()
+    http_check_content = confirm_yes_no("that you would like to watch the content of this page for changes")
+    start_monitor(monitor_registry, MonitorHTTP(http_url, http_time_interval, _arguments.http_timeout,
+                                           _arguments.http_max_body, http_check_content))
     return False
 
 
-def new_https(monitor_list):
+def new_https(monitor_registry):
     """
     Create a MonitorHTTPS object with the required user inputted information, add it to monitoring list, and
     activate monitoring
@@ -413,8 +1148,27 @@ def new_https(monitor_list):
     https_time_interval = get_monitoring_time(https_url)
     if not https_time_interval:
         return False
-    monitor_list.append(MonitorHTTPS(https_url, https_time_interval))
-    monitor_list[-1].activate()
+    https_check_content = confirm_yes_no("that you would like to watch the content of this page for changes")
+    start_monitor(monitor_registry, MonitorHTTPS(https_url, https_time_interval, _arguments.http_timeout,
+                                            _arguments.http_max_body, https_check_content))
+    return False
+
+
+def new_tls(monitor_registry):
+    """
+    Create a MonitorTLS object with the required user inputted information, add it to monitoring list, and
+    activate monitoring
+    """
+    tls_name = get_name_or_ip("hostname")
+    if not tls_name:
+        return False
+    tls_port = get_port_number(tls_name + " (usually 443)", False)
+    if not tls_port:
+        return False
+    tls_time_interval = get_monitoring_time(tls_name)
+    if not tls_time_interval:
+        return False
+    start_monitor(monitor_registry, MonitorTLS(tls_name, tls_time_interval, tls_port))
     return False
 
 
@@ -436,7 +1190,7 @@ def get_name_or_ip(name_type):
             name_or_ip = None
 
 
-def new_icmp(monitor_list):
+def new_icmp(monitor_registry):
     """
     Create a MonitorICMP object with the required user inputted information, add it to monitoring list, and
     activate monitoring
@@ -447,8 +1201,22 @@ def new_icmp(monitor_list):
     icmp_time_interval = get_monitoring_time(icmp_name)
     if not icmp_time_interval:
         return False
-    monitor_list.append(MonitorICMP(icmp_name, icmp_time_interval))
-    monitor_list[-1].activate()
+    start_monitor(monitor_registry, MonitorICMP(icmp_name, icmp_time_interval))
+    return False
+
+
+def new_traceroute(monitor_registry):
+    """
+    Create a MonitorTraceroute object with the required user inputted information, add it to monitoring list, and
+    activate monitoring
+    """
+    traceroute_name = get_name_or_ip("hostname or ip address")
+    if not traceroute_name:
+        return False
+    traceroute_time_interval = get_monitoring_time(traceroute_name)
+    if not traceroute_time_interval:
+        return False
+    start_monitor(monitor_registry, MonitorTraceroute(traceroute_name, traceroute_time_interval))
     return False
 
 
@@ -470,7 +1238,7 @@ def get_record_type():
             dns_record = None
 
 
-def new_dns(monitor_list):
+def new_dns(monitor_registry):
     """
     Create a MonitorDNS object with the required user inputted information, add it to monitoring list, and
     activate monitoring
@@ -487,12 +1255,32 @@ def new_dns(monitor_list):
     dns_time_interval = get_monitoring_time(dns_server)
     if not dns_time_interval:
         return False
-    monitor_list.append(MonitorDNS(dns_server, dns_time_interval, dns_query, dns_record_type))
-    monitor_list[-1].activate()
+    start_monitor(monitor_registry, MonitorDNS(dns_server, dns_time_interval, dns_query, dns_record_type))
+    return False
+
+
+def new_resolvers(monitor_registry):
+    """
+    Create a MonitorResolvers object with the required user inputted information, add it to monitoring list, and
+    activate monitoring
+    """
+    resolvers = get_name_or_ip("comma separated list of DNS resolvers")
+    if not resolvers:
+        return False
+    dns_query = get_name_or_ip("DNS query")
+    if not dns_query:
+        return False
+    dns_record_type = get_record_type()
+    if not dns_record_type:
+        return False
+    dns_time_interval = get_monitoring_time(resolvers)
+    if not dns_time_interval:
+        return False
+    start_monitor(monitor_registry, MonitorResolvers(resolvers, dns_time_interval, dns_query, dns_record_type))
     return False
 
 
-def new_ntp(monitor_list):
+def new_ntp(monitor_registry):
     """
     Create a MonitorNTP object with the required user inputted information, add it to monitoring list, and
     activate monitoring
@@ -503,8 +1291,7 @@ def new_ntp(monitor_list):
     ntp_time_interval = get_monitoring_time(ntp_name)
     if not ntp_time_interval:
         return False
-    monitor_list.append(MonitorNTP(ntp_name, ntp_time_interval))
-    monitor_list[-1].activate()
+    start_monitor(monitor_registry, MonitorNTP(ntp_name, ntp_time_interval))
     return False
 
 
@@ -547,7 +1334,7 @@ def get_port_number(name, custom_server):
                 port_number = None
 
 
-def new_tcp(monitor_list):
+def new_tcp(monitor_registry):
     """
     Create a MonitorTCP object with the required user inputted information, add it to monitoring list, and
     activate monitoring
@@ -561,12 +1348,11 @@ def new_tcp(monitor_list):
     tcp_time_interval = get_monitoring_time(tcp_name)
     if not tcp_time_interval:
         return False
-    monitor_list.append(MonitorTCP(tcp_name, tcp_time_interval, tcp_port))
-    monitor_list[-1].activate()
+    start_monitor(monitor_registry, MonitorTCP(tcp_name, tcp_time_interval, tcp_port))
     return False
 
 
-def new_udp(monitor_list):
+def new_udp(monitor_registry):
     """
     Create a MonitorUDP object with the required user inputted information, add it to monitoring list, and
     activate monitoring
@@ -580,8 +1366,7 @@ def new_udp(monitor_list):
     udp_time_interval = get_monitoring_time(udp_name)
     if not udp_time_interval:
         return False
-    monitor_list.append(MonitorUDP(udp_name, udp_time_interval, udp_port))
-    monitor_list[-1].activate()
+    start_monitor(monitor_registry, MonitorUDP(udp_name, udp_time_interval, udp_port))
     return False
 
 
@@ -0,0 +1,257 @@
+import hashlib
+import heapq
+import math
+import random
+import struct
+import time
+import zlib
+from Monitor_Table import MonitorTable
+
+
+SIMULATION_EPOCH = 1704067200.0
+LATENCY_DISTRIBUTIONS = ("lognormal", "uniform", "exponential")
+
+
+class VirtualClock:
+    """A clock that only moves when it is told to, so a simulation can replay hours of checks in seconds"""
+    def __init__(self, start=SIMULATION_EPOCH):
+        """Create a clock reading start, in seconds since the epoch"""
+        self._now = start
+
+    def time(self):
+        """Returns the virtual time, in seconds since the epoch"""
+        return self._now
+
+    def advance_to(self, now):
+        """Move the clock forward to now. It never moves back."""
+        self._now = max(self._now, now)
+
+
+class NetworkModel:
+    """
+    NetworkModel stands in for the network in a simulation. Every target gets a typical latency of its own,
+    drawn around latency milliseconds, and each probe of it takes that typical latency varied by the chosen
+    distribution ('lognormal', 'uniform' or 'exponential', spread by jitter). A probe is lost with probability
+    loss, takes longer than timeout milliseconds and is counted lost, or falls in an outage of its target.
+
+    Everything is drawn from one generator seeded with seed, so the same seed and the same order of probes
+    always give the same results. Typical latencies only depend on the seed and the target.
+    """
+    def __init__(self, seed=1, latency=20.0, jitter=0.3, loss=0.01, distribution="lognormal", timeout=1000.0):
+        """Create a model of the network. Raises ValueError for an unknown distribution."""
+        if distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution {distribution}, expected one of "
+                             f"{', '.join(LATENCY_DISTRIBUTIONS)}")
+        self._seed = seed
+        self._latency = latency
+        self._jitter = jitter
+        self._loss = loss
+        self._distribution = distribution
+        self._timeout = timeout
+        self._random = random.Random(seed)
+        self._typical = {}
+        self._overrides = {}
+        self._outages = []
+
+    def get_seed(self):
+        """Returns the seed the model was created with"""
+        return self._seed
+
+    def set_target(self, target, latency=None, loss=None):
+        """Give one target its own typical latency in milliseconds, or its own loss, instead of drawn ones"""
+        self._overrides[target] = (latency, loss)
+        self._typical.pop(target, None)
+
+    def add_outage(self, target, start, end):
+        """
+        Make every probe of target (a host, or '*' for all) between the virtual times start and end, in seconds
+        since the epoch, go unanswered
+        """
+        self._outages.append((target, start, end))
+
+    def get_outages(self):
+        """Returns the outages as (target, start, end)"""
+        return list(self._outages)
+
+    def _get_typical(self, target):
+        """Returns the typical latency of a target, drawn from the seed and the target the first time"""
+        typical = self._typical.get(target)
+        if typical is None:
+            latency, _ = self._overrides.get(target, (None, None))
+            if latency is None:
+                # Seeded by the target rather than the shared generator, so adding a target changes no other
+                target_random = random.Random(zlib.crc32(f"{self._seed}|{target}".encode()))
+                latency = self._latency * math.exp(0.5 * target_random.gauss(0, 1))
+            typical = self._typical[target] = latency
+        return typical
+
+    def _is_in_outage(self, target, now):
+        """Returns True if target is in an outage at now"""
+        for outage_target, start, end in self._outages:
+            if start <= now < end and (outage_target == "*" or outage_target == target):
+                return True
+        return False
+
+    def sample(self, target, now):
+        """Returns the latency of a probe of target at virtual time now, in milliseconds, or None if it is lost"""
+        draw = self._random.random()
+        loss = self._overrides.get(target, (None, None))[1]
+        if draw < (self._loss if loss is None else loss) or self._is_in_outage(target, now):
+            return None
+        typical = self._get_typical(target)
+        if self._distribution == "lognormal":
+            latency = typical * math.exp(self._jitter * self._random.gauss(0, 1))
+        elif self._distribution == "uniform":
+            latency = typical * (1 + self._jitter * (2 * self._random.random() - 1))
+        else:
+            latency = self._random.expovariate(1 / typical)
+        if latency > self._timeout:
+            return None
+        return max(0.0, latency)
+
+
+def simulated_check(monitor, model, clock):
+    """
+    Returns a monitoring function for monitor, to set with set_function, that asks model about the monitor's
+    target at the time of clock instead of sending a probe, and records the result on the monitor
+    """
+    def check():
+        """Probe the simulated network"""
+        latency = model.sample(monitor.get_target_host(), clock.time())
+        if latency is None:
+            monitor.set_last_result(False, {})
+            return f"{monitor.get_service()} {monitor.get_name()} did not answer (simulated)"
+        monitor.set_last_result(True, {"total": latency})
+        return f"{monitor.get_service()} {monitor.get_name()} answered in {latency:.2f}ms (simulated)"
+    return check
+
+
+def simulated_batch(model, clock):
+    """Returns a batch function, for MonitorTable.set_batch_function, that asks model about every target"""
+    def probe_batch(targets, timeout):
+        """Probe a batch of targets on the simulated network"""
+        now = clock.time()
+        return [model.sample(target if isinstance(target, str) else target[0], now) for target in targets]
+    return probe_batch
+
+
+class Simulation:
+    """
+    Simulation runs monitors against a NetworkModel on a VirtualClock, one check at a time on the calling
+    thread, instead of on threads of their own against the network. Checks happen in order of their due time,
+    and each goes through the monitor's usual check and result handling (result handler, interval policy), so
+    the results, uptime and alerts are recorded as they would be, only timed by the virtual clock. Hours of
+    monitoring replay in seconds, and the same seed gives the same results, summed up by get_digest.
+
+    The probe rate limiter and coalescer pace real time, so they are not used in a simulation.
+    """
+    def __init__(self, model, clock=None):
+        """Create a simulation of model, timed by clock (a new VirtualClock if None)"""
+        self._model = model
+        self._clock = clock if clock is not None else VirtualClock()
+        self._random = random.Random(model.get_seed())
+        self._queue = []
+        self._monitors = {}
+        self._sequence = 0
+        self._check_count = 0
+        self._wall_seconds = 0.0
+        self._digest = hashlib.blake2b(digest_size=16)
+
+    def get_clock(self):
+        """Returns the VirtualClock of the simulation"""
+        return self._clock
+
+    def get_model(self):
+        """Returns the NetworkModel of the simulation"""
+        return self._model
+
+    def _push(self, due, monitor_id):
+        """Schedule the next check of a monitor"""
+        self._sequence += 1
+        heapq.heappush(self._queue, (due, self._sequence, monitor_id))
+
+    def add(self, monitor_id, monitor):
+        """
+        Run monitor in the simulation under monitor_id. Its monitoring function is replaced by one that probes
+        the model, and its first check is due at a random point of its first interval, as it would be when
+        activated. Tables also keep time by the virtual clock, and have their targets spread over their first
+        interval again from the seed.
+        """
+        self._monitors[monitor_id] = monitor
+        if isinstance(monitor, MonitorTable):
+            monitor.set_clock(self._clock.time)
+            monitor.stagger(self._random)
+            monitor.set_batch_function(simulated_batch(self._model, self._clock))
+            due = monitor.get_next_due()
+            self._push(due if due is not None else self._clock.time(), monitor_id)
+            return
+        monitor.set_function(simulated_check(monitor, self._model, self._clock))
+        jitter = self._random.uniform(0, monitor.get_time_interval() * monitor.get_start_jitter())
+        self._push(self._clock.time() + jitter, monitor_id)
+
+    def remove(self, monitor_id):
+        """Stop simulating a monitor. Its checks still queued are skipped."""
+        self._monitors.pop(monitor_id, None)
+
+    def get_monitor_count(self):
+        """Returns the number of monitors in the simulation"""
+        return len(self._monitors)
+
+    def get_check_count(self):
+        """Returns the number of checks run so far (a batch of a table counts once per target)"""
+        return self._check_count
+
+    def get_wall_seconds(self):
+        """Returns the real seconds spent running checks so far"""
+        return self._wall_seconds
+
+    def get_digest(self):
+        """
+        Returns a hex digest of every check run so far (monitor, virtual time, result and latency). Two runs
+        with the same seed, monitors and duration have the same digest.
+        """
+        return self._digest.hexdigest()
+
+    def run(self, duration):
+        """
+        Run every check due within the next duration virtual seconds, then leave the clock at the end of them.
+        Returns the number of checks run.
+        """
+        end = self._clock.time() + duration
+        checks_before = self._check_count
+        started = time.perf_counter()
+        while self._queue and self._queue[0][0] <= end:
+            due, _, monitor_id = heapq.heappop(self._queue)
+            monitor = self._monitors.get(monitor_id)
+            if monitor is None:
+                continue
+            self._clock.advance_to(due)
+            if isinstance(monitor, MonitorTable):
+                self._run_table(monitor_id, monitor, due)
+            else:
+                self._run_monitor(monitor_id, monitor, due)
+        self._clock.advance_to(end)
+        self._wall_seconds += time.perf_counter() - started
+        return self._check_count - checks_before
+
+    def _run_monitor(self, monitor_id, monitor, due):
+        """Run one check of a monitor, hand over its result and schedule the next"""
+        outcome = monitor.run_check()
+        if outcome is not None:
+            function_response, is_up, metrics = outcome
+            monitor.set_last_result(is_up, metrics)
+            monitor.handle_result(function_response)
+            latency = metrics.get("total", -1.0) if is_up else -1.0
+            self._digest.update(struct.pack("!Id?d", monitor_id, due, bool(is_up), latency))
+            self._check_count += 1
+        policy = monitor.get_interval_policy()
+        wait = policy.next_interval(monitor.is_up()) if policy is not None else monitor.get_time_interval()
+        self._push(due + wait, monitor_id)
+
+    def _run_table(self, monitor_id, table, due):
+        """Run the due targets of a table and schedule it again for its next due targets"""
+        self._check_count += table.run_due(due)
+        up, down, _ = table.get_status_counts()
+        self._digest.update(struct.pack("!IdII", monitor_id, due, up, down))
+        next_due = table.get_next_due()
+        self._push(max(next_due, due + 1e-6) if next_due is not None else due + 1.0, monitor_id)
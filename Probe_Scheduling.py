@@ -0,0 +1,312 @@
+import threading
+import time
+
+
+class AdaptiveInterval:
+    """
+    AdaptiveInterval decides how long a monitor waits before its next check. While a target stays healthy, the
+    wait grows by backoff_factor after every healthy_streak successful checks, up to max_interval. When a check
+    fails, the target is re-checked after recheck_interval, and the wait doubles after each further failure until
+    it is back at the base interval. Outages are confirmed quickly without hammering a host that is down.
+    """
+    def __init__(self, base_interval, max_interval, recheck_interval=1, backoff_factor=1.5, healthy_streak=3):
+        """Create an instance of AdaptiveInterval with given parameters"""
+        self._base_interval = base_interval
+        self._max_interval = max(max_interval, base_interval)
+        self._recheck_interval = min(recheck_interval, base_interval)
+        self._backoff_factor = backoff_factor
+        self._healthy_streak = healthy_streak
+        self._current_interval = base_interval
+        self._successes = 0
+        self._failures = 0
+
+    def get_spec(self):
+        """Returns a plain dictionary of the settings of this policy, for use by from_spec"""
+        return {"base_interval": self._base_interval, "max_interval": self._max_interval,
+                "recheck_interval": self._recheck_interval, "backoff_factor": self._backoff_factor,
+                "healthy_streak": self._healthy_streak}
+
+    @classmethod
+    def from_spec(cls, spec):
+        """Build a new policy from the settings returned by get_spec"""
+        return cls(**spec)
+
+    def get_current_interval(self):
+        """Returns the wait, in seconds, that the last result called for"""
+        return self._current_interval
+
+    def set_base_interval(self, base_interval):
+        """Change the interval the policy starts from and recovers to, and start again from it"""
+        self._base_interval = base_interval
+        self._max_interval = max(self._max_interval, base_interval)
+        self._recheck_interval = min(self._recheck_interval, base_interval)
+        self.reset()
+
+    def reset(self):
+        """Forget the history of results and go back to the base interval"""
+        self._current_interval = self._base_interval
+        self._successes = 0
+        self._failures = 0
+
+    def next_interval(self, is_up):
+        """Record the result of a check, and return how many seconds to wait before the next one"""
+        if is_up:
+            self._failures = 0
+            if self._current_interval < self._base_interval:
+                self._current_interval = self._base_interval
+                self._successes = 0
+            else:
+                self._successes += 1
+                if self._successes >= self._healthy_streak:
+                    self._current_interval = min(self._current_interval * self._backoff_factor, self._max_interval)
+                    self._successes = 0
+        else:
+            self._successes = 0
+            self._failures += 1
+            if self._failures == 1:
+                self._current_interval = self._recheck_interval
+            else:
+                self._current_interval = min(self._current_interval * 2, self._base_interval)
+        return self._current_interval
+
+
+class TokenBucket:
+    """
+    A token bucket that refills at rate tokens per second and holds at most burst tokens. Each probe takes one
+    token, so over time no more than rate probes per second get through.
+    """
+    def __init__(self, rate, burst=None):
+        """Create a full bucket with the given refill rate and size. The size defaults to one second of tokens."""
+        self._rate = rate
+        self._burst = burst if burst is not None else max(1.0, rate)
+        self._tokens = self._burst
+        self._updated = time.monotonic()
+
+    def get_rate(self):
+        """Returns the refill rate in tokens per second"""
+        return self._rate
+
+    def refill(self, now):
+        """Add the tokens earned since the last refill. A time before the last refill adds nothing."""
+        if now > self._updated:
+            self._tokens = min(self._burst, self._tokens + (now - self._updated) * self._rate)
+            self._updated = now
+
+    def is_full(self):
+        """Returns True if the bucket was full at its last refill"""
+        return self._tokens >= self._burst
+
+    def wait_time(self):
+        """Returns how many seconds until a token is available, 0 if one is available now"""
+        if self._tokens >= 1:
+            return 0
+        return (1 - self._tokens) / self._rate
+
+    def take(self):
+        """Take one token. Callers check wait_time first."""
+        self._tokens -= 1
+
+
+class ProbeRateLimiter:
+    """
+    ProbeRateLimiter limits how fast probes are sent, both in total (global_rate probes per second) and to any one
+    destination host (destination_rate probes per second). Either rate can be 0 for no limit. Every monitor in the
+    process goes through the same limiter, set with set_probe_rate_limiter.
+    """
+    def __init__(self, global_rate=0, destination_rate=0, idle_bucket_limit=10000):
+        """Create a limiter with given rates. Full, idle destination buckets are dropped past idle_bucket_limit."""
+        self._global_rate = global_rate
+        self._destination_rate = destination_rate
+        self._global_bucket = TokenBucket(global_rate) if global_rate > 0 else None
+        self._destination_buckets = {}
+        self._idle_bucket_limit = idle_bucket_limit
+        self._waiting = 0
+        self._lock = threading.Lock()
+
+    def get_spec(self):
+        """Returns a plain dictionary of the settings of this limiter, for use by from_spec"""
+        return {"global_rate": self._global_rate, "destination_rate": self._destination_rate}
+
+    @classmethod
+    def from_spec(cls, spec, share=1):
+        """Build a limiter from the settings returned by get_spec, allowing share of the global rate"""
+        return cls(spec["global_rate"] / share, spec["destination_rate"])
+
+    def _reserve(self, destination):
+        """Take a token from every bucket that applies if all have one. Returns seconds to wait otherwise."""
+        now = time.monotonic()
+        buckets = []
+        if self._global_bucket is not None:
+            buckets.append(self._global_bucket)
+        if self._destination_rate > 0:
+            bucket = self._destination_buckets.get(destination)
+            if bucket is None:
+                if len(self._destination_buckets) >= self._idle_bucket_limit:
+                    self._drop_idle_buckets(now)
+                bucket = TokenBucket(self._destination_rate)
+                self._destination_buckets[destination] = bucket
+            buckets.append(bucket)
+        for bucket in buckets:
+            bucket.refill(now)
+        wait = max([bucket.wait_time() for bucket in buckets], default=0)
+        if wait == 0:
+            for bucket in buckets:
+                bucket.take()
+        return wait
+
+    def _drop_idle_buckets(self, now):
+        """Forget destinations whose buckets have refilled completely, they behave the same as new ones"""
+        for destination, bucket in list(self._destination_buckets.items()):
+            bucket.refill(now)
+            if bucket.is_full():
+                del self._destination_buckets[destination]
+
+    def acquire(self, destination, stop_event=None):
+        """
+        Wait until a probe to destination is allowed. Returns True when it is, or False if stop_event was set
+        while waiting.
+        """
+        with self._lock:
+            self._waiting += 1
+        try:
+            while True:
+                with self._lock:
+                    wait = self._reserve(destination)
+                if wait == 0:
+                    return True
+                if stop_event is not None:
+                    if stop_event.wait(wait):
+                        return False
+                else:
+                    time.sleep(wait)
+        finally:
+            with self._lock:
+                self._waiting -= 1
+
+    def get_waiting_count(self):
+        """Returns the number of probes waiting for the limiter, or being let through, right now"""
+        return self._waiting
+
+
+class _CoalescedProbe:
+    """The shared state of one probe run on behalf of every monitor with the same probe key"""
+    def __init__(self):
+        """Create a probe that has not finished yet"""
+        self.done = threading.Event()
+        self.finished = None
+        self.outcome = None
+        self.error = None
+        self.forgotten = False
+
+
+class ProbeCoalescer:
+    """
+    ProbeCoalescer makes monitors that probe the same thing (the same probe key) share one probe. While a probe for
+    a key is running, other monitors with that key wait for it and get its outcome, and the outcome is reused for
+    cache_time seconds after it finishes, for monitors whose intervals differ. Monitors that start on a key that is
+    already being probed are given the same phase, so they keep landing on the shared probe.
+    """
+    def __init__(self, cache_time=1.0):
+        """Create a coalescer that reuses outcomes for cache_time seconds"""
+        self._cache_time = cache_time
+        self._probes = {}
+        self._phases = {}
+        self._lock = threading.Lock()
+
+    def get_cache_time(self):
+        """Returns how many seconds a finished probe is reused for"""
+        return self._cache_time
+
+    def get_running_count(self):
+        """Returns the number of shared probes running right now"""
+        with self._lock:
+            return sum(not entry.done.is_set() for entry in self._probes.values())
+
+    def get_start_delay(self, key, interval, delay):
+        """
+        Returns the delay before a monitor's first check. If the key already has a phase, the delay lines the
+        monitor up with it, otherwise the given delay becomes the phase of the key.
+        """
+        now = time.monotonic()
+        with self._lock:
+            anchor = self._phases.get(key)
+            if anchor is None or interval <= 0:
+                self._phases[key] = now + delay
+                return delay
+            return (anchor - now) % interval
+
+    def forget(self, key):
+        """
+        Drop the phase of key, and its probe, when a monitor using it stops. A probe still running is dropped when
+        it finishes. Monitors still using the key lose nothing but the cached outcome, and the next probe of the
+        key sets its phase again.
+        """
+        with self._lock:
+            self._phases.pop(key, None)
+            entry = self._probes.get(key)
+            if entry is not None:
+                if entry.done.is_set():
+                    del self._probes[key]
+                else:
+                    entry.forgotten = True
+
+    def run(self, key, probe):
+        """
+        Returns the outcome of probe, which is only called if no probe for key is running or recently finished.
+        Outcomes of None are not shared.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._probes.get(key)
+            leader = entry is None or (entry.done.is_set() and now - entry.finished >= self._cache_time)
+            if leader:
+                entry = _CoalescedProbe()
+                self._probes[key] = entry
+                self._phases[key] = now
+        if not leader:
+            entry.done.wait()
+            if entry.error is not None:
+                raise entry.error
+            if entry.outcome is None:
+                return probe()
+            return entry.outcome
+        try:
+            entry.outcome = probe()
+            return entry.outcome
+        except Exception as e:
+            entry.error = e
+            raise
+        finally:
+            entry.finished = time.monotonic()
+            # Under the lock, so forget either sees the probe done or marks it before it is checked here
+            with self._lock:
+                entry.done.set()
+                if (entry.outcome is None or self._cache_time <= 0 or entry.forgotten) and \
+                        self._probes.get(key) is entry:
+                    del self._probes[key]
+
+
+_probe_rate_limiter = None
+_probe_coalescer = None
+
+
+def set_probe_rate_limiter(limiter):
+    """Set the ProbeRateLimiter every monitor in this process goes through, or None for no limit"""
+    global _probe_rate_limiter
+    _probe_rate_limiter = limiter
+
+
+def get_probe_rate_limiter():
+    """Returns the ProbeRateLimiter every monitor in this process goes through, or None"""
+    return _probe_rate_limiter
+
+
+def set_probe_coalescer(coalescer):
+    """Set the ProbeCoalescer every monitor in this process shares probes through, or None to not share"""
+    global _probe_coalescer
+    _probe_coalescer = coalescer
+
+
+def get_probe_coalescer():
+    """Returns the ProbeCoalescer every monitor in this process shares probes through, or None"""
+    return _probe_coalescer
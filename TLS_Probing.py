@@ -0,0 +1,139 @@
+import select
+import socket
+import ssl
+import threading
+import time
+
+
+_tls_contexts = {}
+_tls_contexts_lock = threading.Lock()
+
+
+def get_tls_context(verify=True, minimum_version=None, ciphers=None):
+    """
+    Returns the SSL context for the given configuration. Contexts are created once and shared by every probe with
+    the same configuration, so certificates are loaded once and sessions can be resumed across probes.
+    """
+    key = (verify, minimum_version, ciphers)
+    with _tls_contexts_lock:
+        context = _tls_contexts.get(key)
+        if context is None:
+            context = ssl.create_default_context()
+            if not verify:
+                context.check_hostname = False
+                context.verify_mode = ssl.CERT_NONE
+            if minimum_version is not None:
+                context.minimum_version = minimum_version
+            if ciphers is not None:
+                context.set_ciphers(ciphers)
+            _tls_contexts[key] = context
+        return context
+
+
+class TLSHandshake:
+    """The outcome of one TLS handshake: how long it took, what was negotiated and the certificate chain"""
+    def __init__(self, connect_time, handshake_time, version, cipher, session, resumed, chain):
+        """Create an instance of TLSHandshake with given parameters. Times are in milliseconds."""
+        self._connect_time = connect_time
+        self._handshake_time = handshake_time
+        self._version = version
+        self._cipher = cipher
+        self._session = session
+        self._resumed = resumed
+        self._chain = chain
+
+    def get_connect_time(self):
+        """Returns the time the TCP connect took, in milliseconds"""
+        return self._connect_time
+
+    def get_handshake_time(self):
+        """Returns the time the TLS handshake took, in milliseconds"""
+        return self._handshake_time
+
+    def get_version(self):
+        """Returns the negotiated protocol version, such as 'TLSv1.3'"""
+        return self._version
+
+    def get_cipher(self):
+        """Returns the name of the negotiated cipher"""
+        return self._cipher
+
+    def get_session(self):
+        """Returns the session, which a later handshake can resume, or None if the server sent none"""
+        return self._session
+
+    def is_resumed(self):
+        """Returns True if this handshake resumed an earlier session"""
+        return self._resumed
+
+    def get_chain(self):
+        """Returns the certificate chain sent by the server, leaf first, as dictionaries like getpeercert"""
+        return self._chain
+
+    def get_chain_expiry(self):
+        """Returns the time, in seconds since the epoch, at which the first certificate in the chain expires"""
+        expiry_times = [ssl.cert_time_to_seconds(certificate["notAfter"])
+                        for certificate in self._chain if "notAfter" in certificate]
+        return min(expiry_times) if expiry_times else None
+
+
+def timed_tls_handshake(address, port, server_name, context, session=None, timeout=5):
+    """
+    Connect to an already resolved address and perform a TLS handshake, resuming session if one is given.
+    Returns a TLSHandshake. Raises OSError (including ssl.SSLError) if the connect or handshake fails.
+    """
+    start = time.perf_counter()
+    raw_sock = socket.create_connection((address, port), timeout=timeout)
+    connect_time = (time.perf_counter() - start) * 1000
+    try:
+        start = time.perf_counter()
+        sock = context.wrap_socket(raw_sock, server_hostname=server_name, session=session)
+    except BaseException:
+        raw_sock.close()
+        raise
+    with sock:
+        handshake_time = (time.perf_counter() - start) * 1000
+        chain = _certificate_chain(sock, context.verify_mode != ssl.CERT_NONE)
+        _read_session_tickets(sock, min(timeout, max(0.05, 2 * (connect_time + handshake_time) / 1000)))
+        cipher = sock.cipher()
+        return TLSHandshake(connect_time, handshake_time, sock.version(), cipher[0] if cipher else None,
+                            sock.session, sock.session_reused, chain)
+
+
+def _read_session_tickets(sock, wait):
+    """
+    With TLS 1.3, servers send session tickets after the handshake, and they are only taken in when the client
+    reads. Wait briefly for them so that sock.session can be resumed.
+    """
+    if sock.version() != "TLSv1.3":
+        return
+    readable, _, _ = select.select([sock], [], [], wait)
+    if not readable:
+        return
+    sock.setblocking(False)
+    try:
+        sock.recv(1)
+    except (ssl.SSLError, OSError):
+        # Nothing to read but the tickets (SSLWantReadError), or a closed connection: the session is as it is
+        pass
+
+
+def _certificate_chain(sock, verified):
+    """
+    Returns the certificate chain of sock as a list of dictionaries, leaf first. The chain comes from the
+    certificate objects of the connection where the ssl module has them, and otherwise falls back to just the
+    leaf from getpeercert. Without verification getpeercert has no details, and the leaf is only given as
+    {'der': <bytes>}, with no expiry.
+    """
+    try:
+        get_chain = getattr(sock._sslobj, "get_verified_chain" if verified else "get_unverified_chain")
+        chain = [certificate.get_info() for certificate in (get_chain() or [])]
+    except (AttributeError, ValueError, ssl.SSLError):
+        chain = []
+    if chain:
+        return chain
+    peer_certificate = sock.getpeercert()
+    if peer_certificate:
+        return [peer_certificate]
+    der_certificate = sock.getpeercert(binary_form=True)
+    return [{"der": der_certificate}] if der_certificate else []
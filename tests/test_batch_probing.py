@@ -0,0 +1,92 @@
+import socket
+import threading
+from Batch_Probing import udp_probe_batch, tcp_connect_batch, get_udp_payload, icmp_checksum, \
+    build_echo_request, UDP_OPEN, UDP_CLOSED, UDP_NO_REPLY
+
+
+def udp_socket(address="127.0.0.1"):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind((address, 0))
+    return sock
+
+
+def echo_once(sock, received):
+    sock.settimeout(5)
+    try:
+        data, peer = sock.recvfrom(2048)
+        received.append(data)
+        sock.sendto(data, peer)
+    except OSError:
+        pass
+
+
+def test_udp_states():
+    echo = udp_socket()
+    silent = udp_socket()
+    closed = udp_socket()
+    closed_port = closed.getsockname()[1]
+    closed.close()
+    received = []
+    threading.Thread(target=echo_once, args=(echo, received), daemon=True).start()
+    targets = [echo.getsockname(), silent.getsockname(), ("127.0.0.1", closed_port)]
+    try:
+        results = udp_probe_batch(targets, timeout=0.5, payloads=[b"ping", b"ping", b"ping"])
+    finally:
+        echo.close()
+        silent.close()
+    assert [state for state, _ in results] == [UDP_OPEN, UDP_NO_REPLY, UDP_CLOSED]
+    assert results[0][1] is not None and results[2][1] is not None
+    assert results[1][1] is None
+    assert received == [b"ping"]
+
+
+def test_udp_payloads_follow_the_port():
+    echo = udp_socket()
+    address = echo.getsockname()
+    received = []
+    threading.Thread(target=echo_once, args=(echo, received), daemon=True).start()
+    try:
+        udp_probe_batch([address], timeout=1)
+    finally:
+        echo.close()
+    assert received == [get_udp_payload(address[1])]
+    assert get_udp_payload(53).startswith(b"\x4e\x4d")
+    assert len(get_udp_payload(123)) == 48
+    assert get_udp_payload(9999) == b""
+
+
+def test_udp_batch_stops_when_before_send_says_so():
+    silent = udp_socket()
+    sent = []
+
+    def before_send(address):
+        sent.append(address)
+        return len(sent) < 2
+
+    try:
+        results = udp_probe_batch([silent.getsockname()] * 3, timeout=0.2, before_send=before_send)
+    finally:
+        silent.close()
+    assert len(sent) == 2
+    assert results == [(UDP_NO_REPLY, None)] * 3
+
+
+def test_tcp_connect_batch():
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(4)
+    closed = socket.socket()
+    closed.bind(("127.0.0.1", 0))
+    closed_port = closed.getsockname()[1]
+    closed.close()
+    try:
+        results = tcp_connect_batch([listener.getsockname(), ("127.0.0.1", closed_port)], timeout=1)
+    finally:
+        listener.close()
+    assert results[0] is not None
+    assert results[1] is None
+
+
+def test_echo_request_checksum():
+    request = build_echo_request(0x1234, 7)
+    assert icmp_checksum(request) == 0
@@ -0,0 +1,133 @@
+import errno
+import socket
+import threading
+import time
+import dns.flags
+import dns.message
+import dns.rrset
+from DNS_Probing import query_resolvers, answers_agree, ResolverAnswer, ResolverWindow
+
+
+class LocalResolver:
+    """Answers A queries over UDP, and over TCP on the same port, with a fixed address"""
+    def __init__(self, address="192.0.2.1", truncate=False):
+        self.address = address
+        self.truncate = truncate
+        self.udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.udp.bind(("127.0.0.1", 0))
+        self.port = self.udp.getsockname()[1]
+        self.tcp = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.tcp.bind(("127.0.0.1", self.port))
+        self.tcp.listen(4)
+        self.udp.settimeout(5)
+        self.tcp.settimeout(5)
+        threading.Thread(target=self._serve_udp, daemon=True).start()
+        threading.Thread(target=self._serve_tcp, daemon=True).start()
+
+    def _answer(self, query, truncate):
+        response = dns.message.make_response(query)
+        if truncate:
+            response.flags |= dns.flags.TC
+        else:
+            response.answer.append(dns.rrset.from_text(query.question[0].name, 60, "IN", "A", self.address))
+        return response.to_wire()
+
+    def _serve_udp(self):
+        try:
+            data, peer = self.udp.recvfrom(512)
+            self.udp.sendto(self._answer(dns.message.from_wire(data), self.truncate), peer)
+        except OSError:
+            pass
+
+    def _serve_tcp(self):
+        try:
+            connection, _ = self.tcp.accept()
+            with connection:
+                length = int.from_bytes(connection.recv(2), "big")
+                data = connection.recv(length)
+                wire = self._answer(dns.message.from_wire(data), False)
+                connection.sendall(len(wire).to_bytes(2, "big") + wire)
+        except OSError:
+            pass
+
+    def close(self):
+        self.udp.close()
+        self.tcp.close()
+
+
+def test_answers_come_back_in_the_order_given():
+    resolver = LocalResolver()
+    try:
+        answers = query_resolvers([(socket.AF_INET, "127.0.0.1")], "example.com", "A", 2, resolver.port)
+    finally:
+        resolver.close()
+    assert len(answers) == 1
+    answer = answers[0]
+    assert answer.get_resolver() == "127.0.0.1"
+    assert answer.is_answered()
+    assert answer.get_answers() == ("192.0.2.1",)
+    assert not answer.is_tcp()
+    assert answer.get_response_time() is not None
+
+
+def test_truncated_answers_are_fetched_over_tcp():
+    resolver = LocalResolver(truncate=True)
+    try:
+        answer = query_resolvers([(socket.AF_INET, "127.0.0.1")], "example.com", "A", 2, resolver.port)[0]
+    finally:
+        resolver.close()
+    assert answer.is_tcp()
+    assert answer.get_answers() == ("192.0.2.1",)
+
+
+def test_closed_ports_and_silent_resolvers():
+    silent = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    silent.bind(("127.0.0.2", 0))
+    port = silent.getsockname()[1]
+    try:
+        # Nothing listens on 127.0.0.3 at that port, so the query comes back as port unreachable at once
+        answers = query_resolvers([(socket.AF_INET, "127.0.0.2"), (socket.AF_INET, "127.0.0.3")], "example.com",
+                                  "A", 0.5, port)
+    finally:
+        silent.close()
+    assert [answer.get_resolver() for answer in answers] == ["127.0.0.2", "127.0.0.3"]
+    assert answers[0].get_error() == "no reply within 0.5 seconds"
+    assert answers[1].get_error() == "port unreachable"
+    assert not any(answer.is_answered() for answer in answers)
+
+
+def test_a_socket_that_errors_is_given_up_at_once(monkeypatch):
+    class UnreachableSocket(socket.socket):
+        def recv(self, size):
+            raise OSError(errno.EHOSTUNREACH, "No route to host")
+
+    resolver = LocalResolver()
+    monkeypatch.setattr(socket, "socket", UnreachableSocket)
+    start = time.perf_counter()
+    try:
+        answer = query_resolvers([(socket.AF_INET, "127.0.0.1")], "example.com", "A", 3, resolver.port)[0]
+    finally:
+        resolver.close()
+    assert time.perf_counter() - start < 1
+    assert answer.get_error() == "[Errno 113] No route to host"
+
+
+def test_answers_agree_ignores_failed_resolvers():
+    first = ResolverAnswer("192.0.2.53", 10, "NOERROR", ["192.0.2.2", "192.0.2.1"])
+    same = ResolverAnswer("198.51.100.53", 12, "NOERROR", ["192.0.2.1", "192.0.2.2"])
+    other = ResolverAnswer("203.0.113.53", 9, "NOERROR", ["192.0.2.9"])
+    failed = ResolverAnswer("203.0.113.54", error="no reply")
+    assert answers_agree([first, same, failed])
+    assert not answers_agree([first, other])
+
+
+def test_window_prefers_the_resolver_that_loses_least():
+    window = ResolverWindow(window=4)
+    for check in range(6):
+        window.record([ResolverAnswer("fast", 5, "NOERROR") if check % 2 else ResolverAnswer("fast", error="lost"),
+                       ResolverAnswer("steady", 20 + check, "NOERROR")])
+    assert window.get_check_count("fast") == 4
+    assert window.get_loss("fast") == 0.5
+    assert window.get_median("fast") == 5
+    assert window.get_fastest() == ("steady", 23.5)
+    assert ResolverWindow().get_fastest() is None
@@ -0,0 +1,77 @@
+import socket
+import pytest
+from Dual_Stack import interleave_addresses, race_connect, get_address_family, get_family_name
+
+
+def listen(family, address):
+    listener = socket.socket(family, socket.SOCK_STREAM)
+    listener.bind((address, 0))
+    listener.listen(4)
+    return listener
+
+
+def closed_port(family, address):
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.bind((address, 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def test_interleave_puts_ipv6_first_and_alternates():
+    addresses = [(socket.AF_INET, "192.0.2.1"), (socket.AF_INET, "192.0.2.2"), (socket.AF_INET6, "2001:db8::1")]
+    assert interleave_addresses(addresses) == [(socket.AF_INET6, "2001:db8::1"), (socket.AF_INET, "192.0.2.1"),
+                                               (socket.AF_INET, "192.0.2.2")]
+    assert interleave_addresses([]) == []
+
+
+def test_families():
+    assert get_address_family("2001:db8::1") == socket.AF_INET6
+    assert get_address_family("192.0.2.1") == socket.AF_INET
+    assert get_family_name(socket.AF_INET6) == "IPv6"
+    assert get_family_name(socket.AF_INET) == "IPv4"
+
+
+def test_race_prefers_ipv6_when_both_accept():
+    listener = listen(socket.AF_INET6, "::1")
+    port = listener.getsockname()[1]
+    ipv4_listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        ipv4_listener.bind(("127.0.0.1", port))
+    except OSError:
+        pytest.skip("the IPv6 listener's port is taken on IPv4")
+    ipv4_listener.listen(4)
+    try:
+        connection = race_connect([(socket.AF_INET, "127.0.0.1"), (socket.AF_INET6, "::1")], port, timeout=2)
+        with connection.get_socket():
+            assert connection.get_family_name() == "IPv6"
+            assert connection.get_address() == "::1"
+            assert connection.get_attempts() == 1
+            assert connection.get_connect_time() < 2000
+            assert connection.get_socket().gettimeout() == 2
+    finally:
+        listener.close()
+        ipv4_listener.close()
+
+
+def test_race_falls_back_at_once_when_an_attempt_fails():
+    listener = listen(socket.AF_INET, "127.0.0.1")
+    port = listener.getsockname()[1]
+    try:
+        # Nothing listens on ::1 at this port, and the refusal starts the IPv4 attempt without waiting out the delay
+        connection = race_connect([(socket.AF_INET6, "::1"), (socket.AF_INET, "127.0.0.1")], port, timeout=2,
+                                  delay=1.5)
+        with connection.get_socket():
+            assert connection.get_address() == "127.0.0.1"
+            assert connection.get_attempts() == 2
+            assert connection.get_connect_time() < 1000
+    finally:
+        listener.close()
+
+
+def test_race_raises_when_every_attempt_fails():
+    port = closed_port(socket.AF_INET, "127.0.0.1")
+    with pytest.raises(OSError):
+        race_connect([(socket.AF_INET, "127.0.0.1"), (socket.AF_INET6, "::1")], port, timeout=1)
+    with pytest.raises(socket.gaierror):
+        race_connect([], 80)
@@ -0,0 +1,132 @@
+import json
+import time
+import pytest
+import Monitoring_Agents
+from Monitoring_Agents import pack_frame, unpack_frames, parse_address, MonitoringAgent, AgentCollector, \
+    RemoteMonitor, FRAME_HEADER, FRAME_HELLO, FRAME_MONITOR, FRAME_RESULTS, MAX_FRAME_BYTES, DEFAULT_COLLECTOR_PORT
+from Monitoring_Configuration import MonitorTCP
+from Monitor_Table import MonitorTable
+from Monitoring_Workers import unpack_results
+
+
+def test_frames_round_trip():
+    buffer = bytearray(pack_frame(FRAME_HELLO, {"agent": "edge-1"}) + pack_frame(FRAME_RESULTS, b"\x00\x01"))
+    frames = list(unpack_frames(buffer))
+    assert frames == [(FRAME_HELLO, b'{"agent": "edge-1"}'), (FRAME_RESULTS, b"\x00\x01")]
+    assert json.loads(frames[0][1]) == {"agent": "edge-1"}
+    assert buffer == bytearray()
+
+
+def test_partial_frames_stay_in_the_buffer():
+    data = pack_frame(FRAME_RESULTS, b"x" * 100) + pack_frame(FRAME_RESULTS, b"y" * 50)
+    buffer = bytearray()
+    frames = []
+    # Arriving a few bytes at a time, with frame headers split too
+    for start in range(0, len(data), 7):
+        buffer.extend(data[start:start + 7])
+        frames.extend(unpack_frames(buffer))
+    assert frames == [(FRAME_RESULTS, b"x" * 100), (FRAME_RESULTS, b"y" * 50)]
+    assert buffer == bytearray()
+    buffer = bytearray(data[:FRAME_HEADER.size - 1])
+    assert list(unpack_frames(buffer)) == []
+    assert len(buffer) == FRAME_HEADER.size - 1
+
+
+def test_empty_frame():
+    buffer = bytearray(pack_frame(FRAME_RESULTS, b""))
+    assert list(unpack_frames(buffer)) == [(FRAME_RESULTS, b"")]
+
+
+def test_oversized_frames_are_refused():
+    buffer = bytearray(FRAME_HEADER.pack(FRAME_RESULTS, MAX_FRAME_BYTES + 1))
+    with pytest.raises(ValueError):
+        list(unpack_frames(buffer))
+    buffer = bytearray(FRAME_HEADER.pack(FRAME_RESULTS, MAX_FRAME_BYTES))
+    assert list(unpack_frames(buffer)) == []
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("collector.example:9000", ("collector.example", 9000)),
+    ("collector.example", ("collector.example", DEFAULT_COLLECTOR_PORT)),
+    ("9000", ("127.0.0.1", 9000)),
+    ("[2001:db8::1]:9000", ("2001:db8::1", 9000)),
+])
+def test_parse_address(text, expected):
+    assert parse_address(text) == expected
+
+
+def test_agent_drops_old_results_but_not_announcements():
+    agent = MonitoringAgent(("127.0.0.1", DEFAULT_COLLECTOR_PORT), "edge-1", max_pending=3)
+    monitor = MonitorTCP("192.0.2.1", 60, 22)
+    agent.add(5, monitor)
+    for number in range(10):
+        agent.send_result(5, monitor, f"check {number}")
+    assert agent.get_dropped_count() == 7
+    assert agent.get_pending_count() == 4
+    frames, announcements, results = agent._take_frames()
+    assert len(announcements) == 1 and len(results) == 3
+    unpacked = list(unpack_frames(bytearray(b"".join(frames))))
+    assert [kind for kind, _ in unpacked] == [FRAME_MONITOR, FRAME_RESULTS]
+    assert json.loads(unpacked[0][1])["id"] == 5
+    assert [record[4] for record in unpack_results(unpacked[1][1])] == ["check 7", "check 8", "check 9"]
+    # Nothing leaves the queues until it is sent
+    assert agent.get_pending_count() == 4
+    agent._remove_sent(announcements, results)
+    assert agent.get_pending_count() == 0
+    assert agent.get_sent_count() == 3
+
+
+def test_results_frames_stay_under_the_frame_limit(monkeypatch):
+    monkeypatch.setattr(Monitoring_Agents, "MAX_FRAME_BYTES", 200)
+    agent = MonitoringAgent(("127.0.0.1", DEFAULT_COLLECTOR_PORT), "edge-1")
+    monitor = MonitorTCP("192.0.2.1", 60, 22)
+    for number in range(10):
+        agent.send_result(5, monitor, f"check {number}")
+    agent.send_result(5, monitor, "x" * 300)
+    assert agent.get_dropped_count() == 1
+    messages = []
+    while agent.get_pending_count():
+        frames, announcements, results = agent._take_frames()
+        (kind, payload), = unpack_frames(bytearray(b"".join(frames)))
+        assert kind == FRAME_RESULTS and len(payload) <= 200
+        messages.extend(record[4] for record in unpack_results(payload))
+        agent._remove_sent(announcements, results)
+    assert messages == [f"check {number}" for number in range(10)]
+
+
+def test_results_dropped_during_a_send_are_not_removed_twice():
+    agent = MonitoringAgent(("127.0.0.1", DEFAULT_COLLECTOR_PORT), "edge-1", max_pending=4)
+    monitor = MonitorTCP("192.0.2.1", 60, 22)
+    for number in range(4):
+        agent.send_result(5, monitor, f"check {number}")
+    frames, announcements, results = agent._take_frames()
+    # The queue is full, so these push out the first two results while they are being sent
+    agent.send_result(5, monitor, "check 4")
+    agent.send_result(5, monitor, "check 5")
+    agent._remove_sent(announcements, results)
+    frames, announcements, results = agent._take_frames()
+    (_, payload), = unpack_frames(bytearray(b"".join(frames)))
+    assert [record[4] for record in unpack_results(payload)] == ["check 4", "check 5"]
+
+
+def test_agent_tables_reach_the_collector():
+    added = []
+    collector = AgentCollector(("127.0.0.1", 0), added.append, lambda monitor: None)
+    collector.start()
+    agent = MonitoringAgent(collector.get_address(), "edge-1")
+    table = MonitorTable("targets.txt", "ICMP", 60)
+    table.add_target("192.0.2.1")
+    agent.add(3, table)
+    agent.start()
+    try:
+        deadline = time.monotonic() + 5
+        while not added and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        agent.stop()
+        agent.join(5)
+        collector.stop()
+        collector.join(5)
+    assert len(added) == 1
+    assert isinstance(added[0], RemoteMonitor) and added[0].get_agent() == "edge-1"
+    assert added[0].get_spec() == table.get_spec()
@@ -0,0 +1,92 @@
+import pytest
+from Monitoring_Alerts import AlertManager, MonitorStateMachine, STATE_UP, STATE_DEGRADED, STATE_DOWN
+
+
+def run(machine, results):
+    return [machine.update(is_up) for is_up in results]
+
+
+class RecordingSink:
+    def __init__(self):
+        self.changes = []
+
+    def send(self, change):
+        self.changes.append(change)
+
+
+def test_first_check_sets_the_state():
+    assert MonitorStateMachine().update(True) == ("state", None, STATE_UP)
+    assert MonitorStateMachine().update(False) == ("state", None, STATE_DEGRADED)
+
+
+def test_one_lost_probe_is_not_reported():
+    machine = MonitorStateMachine(fail_after=3, recover_after=2)
+    assert run(machine, [True, False, True, True, False, True]) == [("state", None, STATE_UP)] + [None] * 5
+    assert machine.get_state() == STATE_UP
+
+
+def test_one_lost_probe_sends_no_alert():
+    sink = RecordingSink()
+    manager = AlertManager([sink])
+    for is_up in [True, False, True, True]:
+        manager.record(1, "example.com", "ICMP", is_up, "summary")
+    assert [(change.get_previous(), change.get_state()) for change in sink.changes] == [(None, STATE_UP)]
+
+
+def test_degrade_after_sets_the_failures_before_degraded():
+    machine = MonitorStateMachine(fail_after=3, recover_after=2, degrade_after=1)
+    assert run(machine, [True, False, True, True]) == [
+        ("state", None, STATE_UP), ("state", STATE_UP, STATE_DEGRADED), None, ("state", STATE_DEGRADED, STATE_UP)]
+
+
+def test_failures_in_a_row_go_down_and_passes_in_a_row_recover():
+    machine = MonitorStateMachine(fail_after=3, recover_after=2)
+    reports = run(machine, [True, False, False, False, False, True, True])
+    assert [report for report in reports if report is not None] == [
+        ("state", None, STATE_UP), ("state", STATE_UP, STATE_DEGRADED), ("state", STATE_DEGRADED, STATE_DOWN),
+        ("state", STATE_DOWN, STATE_DEGRADED), ("state", STATE_DEGRADED, STATE_UP)]
+    assert machine.get_state() == STATE_UP
+
+
+def test_one_answered_probe_is_not_a_recovery():
+    machine = MonitorStateMachine(fail_after=2, recover_after=3)
+    run(machine, [False, False])
+    assert machine.get_state() == STATE_DOWN
+    run(machine, [True, True, False])
+    assert machine.get_state() == STATE_DEGRADED
+    run(machine, [False])
+    assert machine.get_state() == STATE_DOWN
+
+
+def test_flapping_holds_back_changes_and_reports_the_settled_state():
+    machine = MonitorStateMachine(fail_after=1, recover_after=1, flap_window=10, flap_start=0.5, flap_stop=0.25)
+    reports = run(machine, [True, False] * 5)
+    # The previous state is the last one reported, from the check before
+    assert reports[-1] == ("flapping", STATE_UP, STATE_DOWN)
+    assert machine.is_flapping()
+    assert machine.get_flap_rate() == pytest.approx(1.0)
+    # Still changing state every check, but nothing is reported while flapping
+    assert run(machine, [True, False] * 2) == [None] * 4
+    reports = run(machine, [True] * 10)
+    settled = [report for report in reports if report is not None]
+    assert settled == [("stable", STATE_UP, STATE_UP)]
+    assert not machine.is_flapping()
+    assert machine.get_flap_rate() < 0.25
+
+
+def test_flap_rate_counts_only_the_window():
+    machine = MonitorStateMachine(flap_window=5)
+    run(machine, [True, False, True, False, True])
+    assert machine.get_flap_rate() == pytest.approx(1.0)
+    run(machine, [True, True, True])
+    assert machine.get_flap_rate() == pytest.approx(0.25)
+    run(machine, [True])
+    assert machine.get_flap_rate() == 0.0
+
+
+def test_flapping_monitor_that_settles_down_reports_down_once():
+    machine = MonitorStateMachine(fail_after=1, recover_after=1, flap_window=10, flap_start=0.5, flap_stop=0.25)
+    run(machine, [False, True] * 5)
+    assert machine.is_flapping()
+    reports = [report for report in run(machine, [False] * 10) if report is not None]
+    assert reports == [("stable", STATE_DOWN, STATE_DOWN)]
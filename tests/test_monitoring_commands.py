@@ -0,0 +1,95 @@
+import pytest
+from Monitoring_Commands import CommandError, parse_command, parse_interval, split_host_port, is_command_line
+
+
+@pytest.mark.parametrize("text, seconds", [("30", 30), ("30s", 30), ("5m", 300), ("1h", 3600), ("7d", 604800),
+                                           (" 2H ", 7200)])
+def test_interval(text, seconds):
+    assert parse_interval(text) == seconds
+
+
+@pytest.mark.parametrize("text", ["", "m", "0", "-5", "1.5h", "5w", "five"])
+def test_interval_rejects(text):
+    with pytest.raises(CommandError):
+        parse_interval(text)
+
+
+@pytest.mark.parametrize("target, default_port, expected", [
+    ("example.com:80", None, ("example.com", 80)),
+    ("192.0.2.1:65535", None, ("192.0.2.1", 65535)),
+    ("[2001:db8::1]:53", None, ("2001:db8::1", 53)),
+    ("example.com", 443, ("example.com", 443)),
+    ("[2001:db8::1]", 443, ("2001:db8::1", 443)),
+    ("2001:db8::1", 443, ("2001:db8::1", 443)),
+])
+def test_split_host_port(target, default_port, expected):
+    assert split_host_port(target, default_port) == expected
+
+
+@pytest.mark.parametrize("target", ["example.com", "example.com:0", "example.com:65536", "example.com:http",
+                                    "[2001:db8::1]"])
+def test_split_host_port_rejects(target):
+    with pytest.raises(CommandError):
+        split_host_port(target)
+
+
+def test_new_command():
+    command = parse_command("new https example.com/status every 5m content=yes")
+    assert command.get_verb() == "new"
+    assert command.get_service() == "HTTPS"
+    assert command.get_name() == "https://example.com/status"
+    assert command.get_target_host() == "example.com"
+    assert command.get_interval() == 300
+    assert command._is_option_on("content")
+
+
+def test_new_command_with_port_and_comment():
+    command = parse_command("NEW tcp [2001:db8::1]:22 every 30  # ssh")
+    assert (command.get_service(), command.get_name(), command.get_port()) == ("TCP", "2001:db8::1", 22)
+    assert command.get_interval() == 30
+    assert parse_command("new tls example.com").get_port() == 443
+
+
+def test_new_dns_command():
+    command = parse_command("new dns 192.0.2.53 query=example.com type=mx")
+    assert command.get_interval() is None
+    monitor = command.build_monitor()
+    assert monitor.get_spec()["class"] == "MonitorDNS"
+
+
+@pytest.mark.parametrize("line", [
+    "",
+    "# only a comment",
+    "start http example.com",
+    "new",
+    "new gopher example.com",
+    "new http ftp://example.com",
+    "new tcp example.com",
+    "new icmp example.com every",
+    "new icmp example.com sometimes",
+    "new icmp example.com content=yes",
+    "new dns 192.0.2.53",
+    "new dns 192.0.2.53 query=example.com type=FOO",
+    "new resolvers 192.0.2.53 query=example.com type=",
+    "new http 'example.com",
+])
+def test_new_command_rejects(line):
+    with pytest.raises(CommandError):
+        parse_command(line)
+
+
+def test_delete_and_edit_commands():
+    assert parse_command("delete 12").get_monitor_id() == 12
+    command = parse_command("delete udp example.com:123")
+    assert (command.get_verb(), command.get_service(), command.get_port()) == ("delete", "UDP", 123)
+    command = parse_command("edit 3 every 1h")
+    assert (command.get_verb(), command.get_monitor_id(), command.get_interval()) == ("edit", 3, 3600)
+    for line in ("delete twelve", "delete icmp", "edit 3 1h", "edit x every 1h"):
+        with pytest.raises(CommandError):
+            parse_command(line)
+
+
+def test_is_command_line():
+    assert is_command_line("new icmp example.com")
+    assert not is_command_line("new")
+    assert not is_command_line("list servers")
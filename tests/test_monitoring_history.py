@@ -0,0 +1,158 @@
+import os
+import time
+import pytest
+from Monitoring_History import encode_block, decode_block, history_key, HistoryStore, HISTORY_MAGIC, LATENCY_STEP
+from Monitoring_Agents import RemoteMonitor
+from Monitoring_Configuration import MonitorICMP, MonitorTCP
+
+
+# Recent enough that the blocks of the history files have not expired
+START = float(round(time.time()) - 86400)
+
+
+def make_samples(count, start=START, interval=30):
+    return [(start + index * interval, index % 10 != 3, None if index % 10 == 3 else 10 + index % 7 * 1.25)
+            for index in range(count)]
+
+
+def assert_same_samples(decoded, samples):
+    assert len(decoded) == len(samples)
+    for (checked_at, is_up, latency), (expected_at, expected_up, expected_latency) in zip(decoded, samples):
+        assert checked_at == pytest.approx(expected_at, abs=0.0005)
+        assert is_up == expected_up
+        if expected_latency is None:
+            assert latency is None
+        else:
+            assert latency == pytest.approx(expected_latency, abs=LATENCY_STEP / 2 + 1e-9)
+
+
+def test_block_round_trip():
+    samples = make_samples(1000)
+    data = encode_block(samples)
+    assert_same_samples(decode_block(data), samples)
+    # A steady monitor packs into far less than a byte per check
+    assert len(data) < len(samples)
+
+
+def test_block_round_trip_of_irregular_samples():
+    samples = [(START, True, 0.04), (START + 0.001, False, None), (START + 61.5, True, None),
+               (START + 30, True, 2500.0), (START + 10 ** 6 + 0.123, False, None)]
+    assert_same_samples(decode_block(encode_block(samples)), samples)
+    assert decode_block(encode_block(samples[:1]))[0][0] == START
+
+
+def test_damaged_blocks_are_refused():
+    data = encode_block(make_samples(100))
+    with pytest.raises(ValueError):
+        decode_block(data[:len(data) // 2])
+    with pytest.raises(ValueError):
+        decode_block(b"not a block")
+
+
+def test_store_in_memory_queries_and_summaries():
+    store = HistoryStore(block_size=100)
+    samples = make_samples(250)
+    for checked_at, is_up, latency in samples:
+        store.record("ICMP example.com", checked_at, is_up, latency)
+    assert store.get_block_count() == 2
+    assert store.get_sample_count() == 250
+    assert_same_samples(store.query("ICMP example.com"), samples)
+    assert_same_samples(store.query("ICMP example.com", START + 30 * 90, START + 30 * 110), samples[90:110])
+    assert store.summarize("ICMP example.com") == (225, 25, 10.0, 17.5)
+    blocks_read = store.get_blocks_read()
+    assert store.summarize("ICMP example.com", START, START + 30 * 100)[:2] == (90, 10)
+    assert store.get_blocks_read() == blocks_read
+    assert store.query("ICMP other.example") == []
+
+
+def test_periods_that_follow_each_other_count_every_check_once():
+    store = HistoryStore(block_size=100)
+    samples = make_samples(250)
+    for checked_at, is_up, latency in samples:
+        store.record("ICMP example.com", checked_at, is_up, latency)
+    # Period bounds on block bounds, inside blocks and inside the latest results
+    bounds = [START, START + 30 * 100, START + 30 * 150, START + 30 * 200, START + 30 * 230, START + 30 * 250]
+    counts = [sum(store.summarize("ICMP example.com", start, end)[:2]) for start, end in zip(bounds, bounds[1:])]
+    assert counts == [100, 50, 50, 30, 20]
+    assert sum(len(store.query("ICMP example.com", start, end)) for start, end in zip(bounds, bounds[1:])) == 250
+
+
+def test_results_are_packed_once_the_oldest_is_old_enough():
+    store = HistoryStore(block_size=1000, seal_after=3600)
+    for checked_at, is_up, latency in make_samples(130, interval=60):
+        store.record("TCP example.com", checked_at, is_up, latency)
+    # One block per hour, however few checks that is
+    assert store.get_block_count() == 2
+    assert store.get_sample_count() == 130
+    # A monitor that stopped checking is packed by the checks of others
+    store.record("ICMP other.example", START, True, 1.0)
+    for checked_at, is_up, latency in make_samples(150, START + 130 * 60, 60):
+        store.record("TCP example.com", checked_at, is_up, latency)
+    assert store.query("ICMP other.example") == [(START, True, 1.0)]
+    assert store.get_block_count() >= 5
+    assert "ICMP other.example" not in store._recent
+
+
+def test_history_keys_tell_monitors_of_one_host_apart():
+    ssh, https = MonitorTCP("example.com", 60, 22), MonitorTCP("example.com", 60, 443)
+    assert history_key(ssh) != history_key(https)
+    assert history_key(MonitorICMP("example.com", 60)) not in (history_key(ssh), history_key(https))
+    # The interval can be edited without losing the history
+    assert history_key(MonitorTCP("example.com", 300, 22)) == history_key(ssh)
+    assert history_key(RemoteMonitor("edge-1", 7, MonitorTCP("example.com", 60, 22))) != history_key(ssh)
+
+
+def test_store_reopens_its_file(tmp_path):
+    path = str(tmp_path / "history.bin")
+    store = HistoryStore(path, block_size=100)
+    samples = make_samples(250)
+    for checked_at, is_up, latency in samples:
+        store.record("TCP example.com", checked_at, is_up, latency)
+        store.record("ICMP example.com", checked_at + 1, True, 1.0)
+    store.stop()
+    reopened = HistoryStore(path, block_size=100)
+    assert reopened.get_block_count() == 6
+    assert reopened.get_sample_count() == 500
+    assert reopened.get_stored_bytes() == os.path.getsize(path) - len(HISTORY_MAGIC)
+    assert_same_samples(reopened.query("TCP example.com"), samples)
+    reopened.stop()
+
+
+def test_store_drops_a_truncated_tail(tmp_path):
+    path = str(tmp_path / "history.bin")
+    store = HistoryStore(path, block_size=100)
+    samples = make_samples(300)
+    for checked_at, is_up, latency in samples:
+        store.record("TCP example.com", checked_at, is_up, latency)
+    store.stop()
+    with open(path, "r+b") as history_file:
+        history_file.truncate(os.path.getsize(path) - 5)
+
+    reopened = HistoryStore(path, block_size=100)
+    assert reopened.get_block_count() == 2
+    assert_same_samples(reopened.query("TCP example.com"), samples[:200])
+    # What is recorded after the damaged block follows the last whole one
+    more = make_samples(100, START + 30 * 300)
+    for checked_at, is_up, latency in more:
+        reopened.record("TCP example.com", checked_at, is_up, latency)
+    reopened.stop()
+    assert_same_samples(HistoryStore(path, block_size=100).query("TCP example.com"), samples[:200] + more)
+
+
+def test_store_drops_expired_blocks(tmp_path):
+    path = str(tmp_path / "history.bin")
+    store = HistoryStore(path, block_size=10, max_age=3600)
+    for checked_at, is_up, latency in make_samples(100, START - 10 ** 6, 60):
+        store.record("TCP example.com", checked_at, is_up, latency)
+    assert store.get_block_count() < 10
+    store.stop()
+    # Every block is long expired by now, so opening the file again leaves it empty
+    assert HistoryStore(path, block_size=10, max_age=3600).get_block_count() == 0
+    assert os.path.getsize(path) == len(HISTORY_MAGIC)
+
+
+def test_store_refuses_other_files(tmp_path):
+    path = tmp_path / "other.bin"
+    path.write_bytes(b"something else entirely")
+    with pytest.raises(OSError):
+        HistoryStore(str(path))
@@ -0,0 +1,52 @@
+from Monitoring_Configuration import MonitorTCP, MonitorICMP, MonitorHTTPS
+from Monitoring_Registry import MonitorRegistry
+
+
+def make_registry():
+    registry = MonitorRegistry()
+    monitors = [MonitorTCP("Example.com", 30, 22), MonitorTCP("example.com", 30, 443),
+                MonitorICMP("example.com", 60), MonitorHTTPS("https://example.com/", 60),
+                MonitorTCP("192.0.2.1", 30, 22)]
+    ids = [registry.add(monitor) for monitor in monitors]
+    return registry, monitors, ids
+
+
+def test_ids_are_stable_and_given_in_order():
+    registry, monitors, ids = make_registry()
+    assert ids == [1, 2, 3, 4, 5]
+    assert len(registry) == 5
+    assert list(registry) == monitors
+    assert registry.get(3) is monitors[2]
+    assert registry.get_id(monitors[4]) == 5
+    assert 5 in registry and 6 not in registry
+
+
+def test_ids_can_be_kept_from_elsewhere():
+    registry = MonitorRegistry()
+    assert registry.add(MonitorICMP("192.0.2.1", 60), 40) == 40
+    assert registry.add(MonitorICMP("192.0.2.2", 60)) == 41
+    # An id already in use is not reused
+    assert registry.add(MonitorICMP("192.0.2.3", 60), 40) == 42
+
+
+def test_find_by_service_host_and_port():
+    registry, monitors, _ = make_registry()
+    assert [monitor_id for monitor_id, _ in registry.find(service="tcp")] == [1, 2, 5]
+    assert [monitor_id for monitor_id, _ in registry.find(host="EXAMPLE.COM")] == [1, 2, 3, 4]
+    assert [monitor_id for monitor_id, _ in registry.find(port=22)] == [1, 5]
+    assert registry.find(service="TCP", host="example.com", port=443) == [(2, monitors[1])]
+    assert registry.find(service="NTP") == []
+    assert len(registry.find()) == 5
+    assert registry.count_by_service() == {"TCP": 3, "ICMP": 1, "HTTPS": 1}
+
+
+def test_remove_updates_the_indexes():
+    registry, monitors, _ = make_registry()
+    assert registry.remove(2) is monitors[1]
+    assert registry.remove(2) is None
+    assert registry.get_id(monitors[1]) is None
+    assert registry.find(port=443) == []
+    assert [monitor_id for monitor_id, _ in registry.find(service="TCP")] == [1, 5]
+    registry.remove(3)
+    assert "ICMP" not in registry.count_by_service()
+    assert [monitor_id for monitor_id, _ in registry.items()] == [1, 4, 5]
@@ -0,0 +1,66 @@
+import pytest
+from Monitoring_Configuration import MonitorTCP, MonitorDNS, TCPServer, UDPServer
+from Monitoring_Registry import MonitorRegistry
+from Monitoring_Snapshot import build_snapshot, write_snapshot, read_snapshot, load_snapshot, SNAPSHOT_MAGIC
+from Monitor_Table import MonitorTable
+
+
+class FixedResultBoard:
+    """Hands out a saved state for one monitor id"""
+    def __init__(self, monitor_id, state):
+        self.monitor_id = monitor_id
+        self.state = state
+
+    def get_state(self, monitor_id):
+        return self.state if monitor_id == self.monitor_id else None
+
+
+def make_registry():
+    registry = MonitorRegistry()
+    registry.add(MonitorTCP("192.0.2.1", 30, 22))
+    registry.add(MonitorDNS("192.0.2.53", 60, "example.com", "MX"), 7)
+    table = MonitorTable("lab", "ICMP", 60)
+    table.add_target("198.51.100.1")
+    table.add_target("198.51.100.2", interval=120)
+    registry.add(table)
+    return registry
+
+
+def test_snapshot_round_trip(tmp_path):
+    registry = make_registry()
+    servers = [TCPServer("127.0.0.1", 9000), UDPServer("127.0.0.1", 9001)]
+    state = {"last": [True, {"total": 1.5}]}
+    snapshot = build_snapshot(registry, servers, FixedResultBoard(7, state))
+    path = tmp_path / "monitors.snapshot"
+    assert write_snapshot(path, snapshot) == path.stat().st_size
+    assert not (tmp_path / "monitors.snapshot.tmp").exists()
+    assert read_snapshot(path) == snapshot
+
+    monitors, loaded_servers = load_snapshot(read_snapshot(path))
+    assert [monitor_id for monitor_id, _, _ in monitors] == [1, 7, 8]
+    for (monitor_id, monitor, saved_state), (original_id, original) in zip(monitors, registry.items()):
+        assert monitor_id == original_id
+        assert monitor.get_spec() == original.get_spec()
+        assert saved_state == (state if monitor_id == 7 else None)
+    assert monitors[2][1].get_target_count() == 2
+    assert [(type(server), server.get_name(), server.get_port()) for server in loaded_servers] == \
+        [(TCPServer, "127.0.0.1", 9000), (UDPServer, "127.0.0.1", 9001)]
+
+
+def test_snapshot_replaces_the_previous_one(tmp_path):
+    path = tmp_path / "monitors.snapshot"
+    write_snapshot(path, build_snapshot(make_registry(), []))
+    write_snapshot(path, build_snapshot(MonitorRegistry(), []))
+    assert load_snapshot(read_snapshot(path)) == ([], [])
+
+
+def test_damaged_snapshots_are_refused(tmp_path):
+    path = tmp_path / "monitors.snapshot"
+    path.write_bytes(b"not a snapshot")
+    with pytest.raises(ValueError):
+        read_snapshot(path)
+    path.write_bytes(SNAPSHOT_MAGIC + b"\x78\x9c garbage")
+    with pytest.raises(ValueError):
+        read_snapshot(path)
+    with pytest.raises(OSError):
+        read_snapshot(tmp_path / "missing.snapshot")
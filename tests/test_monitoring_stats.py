@@ -0,0 +1,56 @@
+import random
+import pytest
+from Monitoring_Stats import DurationHistogram, ServiceStats
+
+
+def test_empty_histogram():
+    histogram = DurationHistogram()
+    assert histogram.get_count() == 0
+    assert histogram.get_mean() is None
+    assert histogram.get_max() is None
+    assert histogram.get_percentile(50) is None
+
+
+def test_percentiles_are_within_a_bucket():
+    histogram = DurationHistogram()
+    for milliseconds in range(1, 1001):
+        histogram.record(float(milliseconds))
+    assert histogram.get_count() == 1000
+    assert histogram.get_mean() == pytest.approx(500.5)
+    assert histogram.get_max() == 1000
+    for percent in (1, 10, 50, 90, 99):
+        exact = percent * 10
+        assert exact <= histogram.get_percentile(percent) <= exact * 1.25
+    assert histogram.get_percentile(100) == 1000
+
+
+def test_percentiles_of_a_skewed_distribution():
+    generator = random.Random(7)
+    durations = sorted(generator.lognormvariate(3, 1) for _ in range(20000))
+    histogram = DurationHistogram()
+    for milliseconds in durations:
+        histogram.record(milliseconds)
+    for percent in (50, 95, 99, 99.9):
+        exact = durations[int(len(durations) * percent / 100) - 1]
+        assert exact <= histogram.get_percentile(percent) <= exact * 1.25 + 1e-9
+
+
+def test_percentiles_never_pass_the_max():
+    histogram = DurationHistogram()
+    for milliseconds in (0, 0.001, 0.5):
+        histogram.record(milliseconds)
+    assert histogram.get_percentile(10) == 0.01
+    assert histogram.get_percentile(100) == 0.5
+    histogram.record(10 ** 9)
+    assert histogram.get_percentile(100) <= 10 ** 9
+    assert histogram.get_max() == 10 ** 9
+
+
+def test_service_stats_rate():
+    stats = ServiceStats()
+    stats.record_probe(5.0, count=10, now=1000.5)
+    stats.record_probe(7.0, now=1001.5)
+    stats.record_lag(2.0)
+    assert stats.get_durations().get_count() == 2
+    assert stats.get_lag().get_max() == 2.0
+    assert stats.get_rate(now=1002) == pytest.approx(11 / 60)
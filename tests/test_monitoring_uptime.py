@@ -0,0 +1,64 @@
+import pytest
+from Monitoring_Uptime import SlidingWindowCounter, UptimeTracker
+
+
+START = 1704067200
+
+
+def test_counter_counts_within_the_window():
+    counter = SlidingWindowCounter(60, 10)
+    assert counter.get_counts(START) == (0, 0)
+    counter.record(True, START)
+    counter.record(True, START + 5, count=2)
+    counter.record(False, START + 25)
+    assert counter.get_counts(START + 30) == (3, 1)
+
+
+def test_counter_drops_buckets_that_leave_the_window():
+    counter = SlidingWindowCounter(60, 10)
+    counter.record(True, START)
+    counter.record(False, START + 10)
+    assert counter.get_counts(START + 59) == (1, 1)
+    assert counter.get_counts(START + 60) == (0, 1)
+    assert counter.get_counts(START + 70) == (0, 0)
+
+
+def test_counter_skips_a_long_gap():
+    counter = SlidingWindowCounter(60, 10)
+    counter.record(True, START)
+    counter.record(False, START + 10 ** 6)
+    assert counter.get_counts(START + 10 ** 6) == (0, 1)
+
+
+def test_counter_matches_a_plain_count():
+    counter = SlidingWindowCounter(100, 10)
+    checks = [(START + second * 3, second % 7 != 0) for second in range(200)]
+    for now, is_up in checks:
+        counter.record(is_up, now)
+        bucket = now // 10
+        window = [up for then, up in checks if then <= now and then // 10 > bucket - 10]
+        assert counter.get_counts(now) == (window.count(True), window.count(False))
+
+
+def test_counter_state_round_trip():
+    counter = SlidingWindowCounter(60, 10)
+    counter.record(True, START)
+    counter.record(False, START + 20)
+    copy = SlidingWindowCounter(60, 10)
+    copy.set_state(counter.get_state())
+    assert copy.get_counts(START + 30) == (1, 1)
+    other_layout = SlidingWindowCounter(60, 20)
+    other_layout.set_state(counter.get_state())
+    assert other_layout.get_counts(START + 30) == (0, 0)
+
+
+def test_tracker_uptime_and_error_budget():
+    tracker = UptimeTracker()
+    assert tracker.get_uptime("1h", START) is None
+    for second in range(1000):
+        tracker.record(second != 500, START + second)
+    assert tracker.get_window_names() == ["1h", "24h", "30d"]
+    assert tracker.get_uptime("1h", START + 1000) == pytest.approx(99.9)
+    assert tracker.get_error_budget("1h", 99.9, START + 1000) == pytest.approx(0, abs=1e-9)
+    assert tracker.get_error_budget("1h", 99.0, START + 1000) == pytest.approx(90)
+    assert tracker.get_error_budget("1h", 100.0, START + 1000) == float("-inf")
@@ -0,0 +1,45 @@
+import collections
+from Monitoring_Workers import pack_result, unpack_results, ConsistentHashRing
+
+
+def test_results_round_trip():
+    batch = pack_result(7, 1700000000.5, True, {"total": 12.5, "connect": 3.25}, "answered in 12.50ms") + \
+        pack_result(8, 1700000001.0, False, {}, "did not answer") + \
+        pack_result(9, 1700000002.0, None, {}, "")
+    assert list(unpack_results(batch)) == [
+        (7, 1700000000.5, True, {"total": 12.5, "connect": 3.25}, "answered in 12.50ms"),
+        (8, 1700000001.0, False, {}, "did not answer"),
+        (9, 1700000002.0, None, {}, ""),
+    ]
+
+
+def test_results_keep_non_ascii_messages():
+    batch = pack_result(1, 0.0, True, {"täl": 1.0}, "réponse en 1ms ✓")
+    assert list(unpack_results(batch)) == [(1, 0.0, True, {"täl": 1.0}, "réponse en 1ms ✓")]
+
+
+def test_empty_batch_has_no_results():
+    assert list(unpack_results(b"")) == []
+
+
+def test_ring_maps_a_target_to_the_same_shard():
+    ring = ConsistentHashRing(4)
+    assert ring.get_shard("example.com") == ring.get_shard("EXAMPLE.com")
+    assert ring.get_shard("example.com") == ConsistentHashRing(4).get_shard("example.com")
+
+
+def test_ring_spreads_targets_evenly():
+    ring = ConsistentHashRing(4)
+    counts = collections.Counter(ring.get_shard(f"host-{number}.example.com") for number in range(8000))
+    assert set(counts) == {0, 1, 2, 3}
+    assert all(1200 < count < 2800 for count in counts.values())
+
+
+def test_ring_remaps_few_targets_when_a_shard_is_added():
+    targets = [f"host-{number}.example.com" for number in range(4000)]
+    before = ConsistentHashRing(4)
+    after = ConsistentHashRing(5)
+    moved = [target for target in targets if before.get_shard(target) != after.get_shard(target)]
+    # Ideally a fifth of the targets move, all of them to the new shard
+    assert len(moved) < len(targets) * 0.3
+    assert all(after.get_shard(target) == 4 for target in moved)
@@ -0,0 +1,83 @@
+import socket
+import dns.exception
+import pytest
+from Name_Resolution import HostResolverCache
+
+
+class CountingResolverCache(HostResolverCache):
+    """A cache whose DNS answers come from a table instead of the network, counting the queries"""
+    def __init__(self, answers, **kwargs):
+        super().__init__(**kwargs)
+        self.answers = answers
+        self.queries = []
+
+    def _query_dns(self, host):
+        self.queries.append(host)
+        if host not in self.answers:
+            raise dns.exception.Timeout()
+        return self.answers[host]
+
+
+def get_ttls(cache):
+    return {host: ttl for host, _, ttl in cache.export_entries()}
+
+
+def test_ttl_is_clamped():
+    answers = {"short.example": ([(socket.AF_INET, "192.0.2.1")], 1),
+               "long.example": ([(socket.AF_INET, "192.0.2.2")], 86400),
+               "usual.example": ([(socket.AF_INET6, "2001:db8::1")], 60)}
+    cache = CountingResolverCache(answers, min_ttl=5, max_ttl=3600)
+    for host in answers:
+        cache.resolve(host)
+    ttls = get_ttls(cache)
+    assert ttls["short.example"] == pytest.approx(5, abs=1)
+    assert ttls["long.example"] == pytest.approx(3600, abs=1)
+    assert ttls["usual.example"] == pytest.approx(60, abs=1)
+
+
+def test_answers_are_cached_and_filtered_by_family():
+    answers = {"dual.example": ([(socket.AF_INET, "192.0.2.1"), (socket.AF_INET6, "2001:db8::1")], 300)}
+    cache = CountingResolverCache(answers)
+    addresses, _ = cache.resolve("dual.example")
+    assert addresses == answers["dual.example"][0]
+    assert cache.resolve("dual.example", socket.AF_INET6)[0] == [(socket.AF_INET6, "2001:db8::1")]
+    assert cache.queries == ["dual.example"]
+    cache.forget("dual.example")
+    cache.resolve("dual.example")
+    assert cache.queries == ["dual.example", "dual.example"]
+
+
+def test_missing_family_raises():
+    cache = CountingResolverCache({"v4.example": ([(socket.AF_INET, "192.0.2.1")], 300)})
+    with pytest.raises(socket.gaierror):
+        cache.resolve("v4.example", socket.AF_INET6)
+
+
+def test_failures_are_cached_for_negative_ttl(monkeypatch):
+    def no_address(*args, **kwargs):
+        raise socket.gaierror(socket.EAI_NONAME, "Name or service not known")
+
+    monkeypatch.setattr(socket, "getaddrinfo", no_address)
+    cache = CountingResolverCache({}, negative_ttl=30)
+    for _ in range(3):
+        with pytest.raises(socket.gaierror):
+            cache.resolve("missing.example")
+    assert cache.queries == ["missing.example"]
+    assert cache.get_size() == 1
+    assert get_ttls(cache) == {}
+
+
+def test_literal_addresses_skip_the_cache():
+    cache = CountingResolverCache({})
+    assert cache.resolve("192.0.2.7")[0] == [(socket.AF_INET, "192.0.2.7")]
+    assert cache.resolve("2001:db8::7")[0] == [(socket.AF_INET6, "2001:db8::7")]
+    assert cache.queries == []
+    assert cache.get_size() == 0
+
+
+def test_imported_entries_are_used_without_a_query():
+    cache = CountingResolverCache({})
+    cache.import_entries([("saved.example", [[socket.AF_INET, "192.0.2.9"]], 100), ("gone.example", [], -1)])
+    assert cache.resolve("saved.example")[0] == [(socket.AF_INET, "192.0.2.9")]
+    assert cache.queries == []
+    assert cache.get_size() == 1
@@ -0,0 +1,75 @@
+import ipaddress
+import os
+import signal
+import socket
+import time
+import pytest
+from Network_Discovery import parse_port_ranges, DiscoveryResult
+from Network_Monitoring_CLI import run_sweep
+
+
+def test_port_ranges():
+    assert parse_port_ranges("22") == [22]
+    assert parse_port_ranges("80, 22,8000-8002,22,,8001") == [22, 80, 8000, 8001, 8002]
+    assert parse_port_ranges("1-3,65535") == [1, 2, 3, 65535]
+
+
+@pytest.mark.parametrize("text", ["", ",", "0", "65536", "80-22", "http", "22-", "-22", "1-2-3", "22,x"])
+def test_port_ranges_reject(text):
+    with pytest.raises(ValueError):
+        parse_port_ranges(text)
+
+
+def test_icmp_result_bitmap():
+    result = DiscoveryResult(ipaddress.ip_network("192.0.2.0/24"))
+    assert result.get_probe_count() == 256
+    assert result.get_ports() is None
+    assert result.get_found() == []
+    for index in (255, 0, 9, 9):
+        result.mark(index)
+    assert result.is_marked(9) and not result.is_marked(8)
+    assert result.get_found_count() == 3
+    assert result.get_found() == [("192.0.2.0", None), ("192.0.2.9", None), ("192.0.2.255", None)]
+
+
+def test_port_result_bitmap():
+    result = DiscoveryResult(ipaddress.ip_network("198.51.100.0/30"), [22, 80, 443])
+    assert result.get_probe_count() == 12
+    assert result.get_target(0) == ("198.51.100.0", 22)
+    assert result.get_target(5) == ("198.51.100.1", 443)
+    assert result.get_target(11) == ("198.51.100.3", 443)
+    result.mark(4)
+    result.mark(11)
+    assert result.get_found() == [("198.51.100.1", 80), ("198.51.100.3", 443)]
+    assert result.get_found_count() == 2
+
+
+def test_bitmap_holds_a_bit_per_probe():
+    result = DiscoveryResult(ipaddress.ip_network("10.0.0.0/16"), list(range(1, 1001)))
+    assert result.get_probe_count() == 65536 * 1000
+    assert len(result._bitmap) == 65536 * 1000 // 8
+    result.mark(result.get_probe_count() - 1)
+    assert result.get_found() == [("10.0.255.255", 1000)]
+
+
+def test_interrupted_sweep_keeps_what_was_found():
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(16)
+    port = listener.getsockname()[1]
+    batches = []
+
+    def progress(result):
+        # Ctrl-C in the middle of the sweep, once the first batch found the listener, and time to act on it
+        batches.append(result.get_probed_count())
+        if len(batches) == 1:
+            os.kill(os.getpid(), signal.SIGINT)
+            time.sleep(1)
+
+    try:
+        result = run_sweep("127.0.0.0/22", [port], 0, progress, "tcp")
+    finally:
+        listener.close()
+    assert batches == [256]
+    assert result.get_probed_count() < result.get_probe_count()
+    assert ("127.0.0.1", port) in result.get_found()
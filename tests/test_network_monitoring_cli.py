@@ -0,0 +1,14 @@
+from Monitoring_Agents import RemoteMonitor
+from Monitoring_Configuration import MonitorTCP
+from Monitoring_Registry import MonitorRegistry
+from Network_Monitoring_CLI import run_command
+
+
+def test_monitors_of_agents_cannot_be_edited(capsys):
+    registry = MonitorRegistry()
+    remote_monitor = RemoteMonitor("edge-1", 4, MonitorTCP("192.0.2.1", 60, 22))
+    monitor_id = registry.add(remote_monitor)
+    assert not run_command(registry, f"edit {monitor_id} every 30")
+    assert "agent edge-1" in capsys.readouterr().out
+    assert registry.get(monitor_id) is remote_monitor
+    assert remote_monitor.get_time_interval() == 60
@@ -0,0 +1,75 @@
+import pytest
+from Monitoring_Configuration import MonitorTCP, MonitorICMP
+from Monitor_Table import MonitorTable
+from Network_Simulation import NetworkModel, Simulation, VirtualClock, SIMULATION_EPOCH
+
+
+def run_simulation(seed, duration=3600, outage=None):
+    model = NetworkModel(seed=seed, loss=0.05)
+    if outage is not None:
+        model.add_outage(*outage)
+    simulation = Simulation(model)
+    simulation.add(1, MonitorTCP("192.0.2.1", 30, 22))
+    simulation.add(2, MonitorICMP("192.0.2.2", 60))
+    table = MonitorTable("lab", "ICMP", 60)
+    for host in range(1, 21):
+        table.add_target(f"198.51.100.{host}")
+    simulation.add(3, table)
+    checks = simulation.run(duration)
+    return simulation, checks
+
+
+def test_same_seed_gives_the_same_digest():
+    first, first_checks = run_simulation(11)
+    second, second_checks = run_simulation(11)
+    assert first_checks == second_checks > 0
+    assert first.get_digest() == second.get_digest()
+
+
+def test_other_seed_gives_another_digest():
+    assert run_simulation(11)[0].get_digest() != run_simulation(12)[0].get_digest()
+
+
+def test_outages_change_the_digest():
+    outage = ("192.0.2.1", SIMULATION_EPOCH + 600, SIMULATION_EPOCH + 1200)
+    assert run_simulation(11)[0].get_digest() != run_simulation(11, outage=outage)[0].get_digest()
+
+
+def test_runs_in_steps_match_one_run():
+    whole, _ = run_simulation(11, duration=3600)
+    stepped, _ = run_simulation(11, duration=1800)
+    stepped.run(1800)
+    assert stepped.get_check_count() == whole.get_check_count()
+    assert stepped.get_digest() == whole.get_digest()
+    assert stepped.get_clock().time() == SIMULATION_EPOCH + 3600
+
+
+def test_check_counts_follow_the_intervals():
+    simulation, checks = run_simulation(11)
+    # About 120 checks of the TCP monitor, 60 of the ICMP one and 60 of each of the table's 20 targets
+    assert 1300 <= checks <= 1400
+    assert simulation.get_check_count() == checks
+
+
+def test_model_is_deterministic_and_honours_outages():
+    model = NetworkModel(seed=3, loss=0, timeout=5000)
+    model.set_target("slow.example", latency=500)
+    model.add_outage("*", 100, 200)
+    assert model.sample("slow.example", 150) is None
+    latencies = [model.sample("slow.example", 300) for _ in range(100)]
+    assert all(latency is not None for latency in latencies)
+    assert 250 < sorted(latencies)[50] < 1000
+    other = NetworkModel(seed=3, loss=0, timeout=5000)
+    other.set_target("slow.example", latency=500)
+    other.add_outage("*", 100, 200)
+    other.sample("slow.example", 150)
+    assert [other.sample("slow.example", 300) for _ in range(100)] == latencies
+    with pytest.raises(ValueError):
+        NetworkModel(distribution="normal")
+
+
+def test_virtual_clock_only_moves_forward():
+    clock = VirtualClock(100)
+    clock.advance_to(150)
+    clock.advance_to(120)
+    assert clock.time() == 150
@@ -0,0 +1,178 @@
+import threading
+import time
+import pytest
+from Probe_Scheduling import AdaptiveInterval, TokenBucket, ProbeRateLimiter, ProbeCoalescer
+
+
+def test_interval_backs_off_while_healthy():
+    policy = AdaptiveInterval(10, 40, backoff_factor=2, healthy_streak=2)
+    assert [policy.next_interval(True) for _ in range(8)] == [10, 20, 20, 40, 40, 40, 40, 40]
+
+
+def test_interval_rechecks_quickly_then_doubles_back_to_base():
+    policy = AdaptiveInterval(10, 40, recheck_interval=1)
+    assert [policy.next_interval(False) for _ in range(6)] == [1, 2, 4, 8, 10, 10]
+
+
+def test_interval_recovers_to_base_after_an_outage():
+    policy = AdaptiveInterval(10, 40, backoff_factor=2, healthy_streak=1)
+    policy.next_interval(True)
+    policy.next_interval(False)
+    assert policy.next_interval(True) == 10
+    assert policy.next_interval(True) == 20
+
+
+def test_interval_limits_and_spec():
+    policy = AdaptiveInterval(10, 5, recheck_interval=30)
+    assert policy.get_spec()["max_interval"] == 10
+    assert policy.get_spec()["recheck_interval"] == 10
+    copy = AdaptiveInterval.from_spec(policy.get_spec())
+    assert copy.get_spec() == policy.get_spec()
+
+
+def test_interval_set_base_interval_starts_again():
+    policy = AdaptiveInterval(10, 40, healthy_streak=1, backoff_factor=2)
+    policy.next_interval(True)
+    policy.set_base_interval(30)
+    assert policy.get_current_interval() == 30
+    assert policy.next_interval(True) == pytest.approx(40)
+
+
+def test_bucket_starts_full_and_empties():
+    bucket = TokenBucket(2, burst=2)
+    now = time.monotonic()
+    bucket.refill(now)
+    assert bucket.is_full()
+    for _ in range(2):
+        assert bucket.wait_time() == 0
+        bucket.take()
+    assert not bucket.is_full()
+    assert bucket.wait_time() == pytest.approx(0.5)
+
+
+def test_bucket_refills_at_its_rate_up_to_burst():
+    bucket = TokenBucket(4, burst=2)
+    now = time.monotonic()
+    bucket.refill(now)
+    bucket.take()
+    bucket.take()
+    bucket.refill(now + 0.125)
+    assert bucket.wait_time() == pytest.approx(0.125)
+    bucket.refill(now + 10)
+    assert bucket.is_full()
+    bucket.take()
+    bucket.take()
+    assert bucket.wait_time() > 0
+
+
+def test_bucket_size_defaults_to_one_second_of_tokens():
+    assert TokenBucket(0.5).wait_time() == 0
+    bucket = TokenBucket(5)
+    for _ in range(5):
+        bucket.take()
+    assert bucket.wait_time() > 0
+
+
+def test_bucket_ignores_a_refill_from_before_its_last():
+    bucket = TokenBucket(1)
+    bucket.refill(time.monotonic() - 1)
+    assert bucket.is_full()
+    assert bucket.wait_time() == 0
+
+
+def test_rate_limiter_holds_back_one_destination_only():
+    limiter = ProbeRateLimiter(destination_rate=1)
+    stop_event = threading.Event()
+    stop_event.set()
+    assert limiter.acquire("a.example.com", stop_event)
+    assert not limiter.acquire("a.example.com", stop_event)
+    assert limiter.acquire("b.example.com", stop_event)
+    assert limiter.get_waiting_count() == 0
+
+
+def test_coalescer_shares_a_running_probe():
+    # Cached long enough that the follower shares the outcome however late it gets to run
+    coalescer = ProbeCoalescer(cache_time=60)
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def slow_probe():
+        calls.append("slow")
+        started.set()
+        release.wait(5)
+        return "slow outcome"
+
+    outcomes = []
+    leader = threading.Thread(target=lambda: outcomes.append(coalescer.run("key", slow_probe)))
+    leader.start()
+    started.wait(5)
+    follower = threading.Thread(target=lambda: outcomes.append(coalescer.run("key", lambda: calls.append("x"))))
+    follower.start()
+    assert coalescer.get_running_count() == 1
+    time.sleep(0.05)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+    assert calls == ["slow"]
+    assert outcomes == ["slow outcome", "slow outcome"]
+    assert coalescer.get_running_count() == 0
+
+
+def test_coalescer_reuses_outcomes_for_cache_time():
+    coalescer = ProbeCoalescer(cache_time=60)
+    assert coalescer.run("key", lambda: 1) == 1
+    assert coalescer.run("key", lambda: 2) == 1
+    assert coalescer.run("other", lambda: 3) == 3
+
+
+def test_coalescer_does_not_share_none_or_errors_later():
+    coalescer = ProbeCoalescer(cache_time=60)
+    assert coalescer.run("key", lambda: None) is None
+    assert coalescer.run("key", lambda: 2) == 2
+
+    def failing_probe():
+        raise OSError("unreachable")
+
+    with pytest.raises(OSError):
+        coalescer.run("failing", failing_probe)
+
+
+def test_coalescer_lines_up_phases():
+    coalescer = ProbeCoalescer()
+    assert coalescer.get_start_delay("key", 10, 4) == 4
+    assert coalescer.get_start_delay("key", 10, 7) == pytest.approx(4, abs=0.1)
+    assert coalescer.get_start_delay("key", 3, 7) == pytest.approx(1, abs=0.1)
+
+
+def test_coalescer_forgets_stopped_keys():
+    coalescer = ProbeCoalescer(cache_time=60)
+    coalescer.get_start_delay("key", 10, 4)
+    coalescer.run("key", lambda: 1)
+    coalescer.forget("key")
+    assert coalescer.run("key", lambda: 2) == 2
+    coalescer.forget("key")
+    assert coalescer.get_start_delay("key", 10, 6) == 6
+    assert coalescer._probes == {}
+    coalescer.forget("unknown")
+
+
+def test_coalescer_drops_a_forgotten_key_once_its_probe_finishes():
+    coalescer = ProbeCoalescer(cache_time=60)
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow_probe():
+        started.set()
+        release.wait(5)
+        return "outcome"
+
+    leader = threading.Thread(target=coalescer.run, args=("key", slow_probe))
+    leader.start()
+    started.wait(5)
+    coalescer.forget("key")
+    assert coalescer.get_running_count() == 1
+    release.set()
+    leader.join(5)
+    assert coalescer._probes == {}
+    assert coalescer._phases == {}